@@ -0,0 +1,153 @@
+# API Response Cache
+################################################################################
+
+# This file contains a two level cache for the Booking.com RapidAPI calls made in `functions.py`.
+# An in-memory LRU sits in front of an on-disk SQLite store, so a Streamlit rerun is answered from memory
+# and a new process (another Streamlit worker or a batch job) still reuses what was already fetched.
+
+################################################################################
+# Imports
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+# Location ids almost never change, prices do
+LOCATION_CACHE_TTL = float(os.getenv("LOCATION_CACHE_TTL", 7 * 24 * 60 * 60))
+HOTEL_CACHE_TTL = float(os.getenv("HOTEL_CACHE_TTL", 5 * 60))
+
+API_CACHE_PATH = os.getenv("API_CACHE_PATH", ".cache/api_cache.sqlite3")
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", 1024))
+
+# Returned by `get` when nothing usable is cached, so that falsy values can be cached too
+MISSING = object()
+
+################################################################################
+# Cache functionality
+
+def make_key(**query):
+    """Build a normalized cache key so that equivalent queries share one entry."""
+    normalized = {}
+    for name, value in query.items():
+        if value is None:
+            continue
+        # Dates, numbers and strings are all compared on their trimmed, lower case text
+        normalized[name] = str(value).strip().lower()
+    return json.dumps(normalized, sort_keys=True)
+
+
+class TTLCache:
+    """In-memory LRU in front of a SQLite store, with a time to live per entry."""
+
+    def __init__(self, path=API_CACHE_PATH, max_entries=API_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "writes": 0}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _connection(self):
+        # SQLite connections cannot be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, memory_key, value, expires_at):
+        self._memory[memory_key] = (value, expires_at)
+        self._memory.move_to_end(memory_key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, namespace, key):
+        """Return the cached value, or MISSING when it is absent or expired."""
+        memory_key = (namespace, key)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(memory_key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(memory_key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[memory_key]
+
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM api_cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+
+        with self._lock:
+            if row is None:
+                self._stats["misses"] += 1
+                return MISSING
+            if row[1] <= now:
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return MISSING
+            value = json.loads(row[0])
+            self._remember(memory_key, value, row[1])
+            self._stats["disk_hits"] += 1
+            return value
+
+    def set(self, namespace, key, value, ttl):
+        """Store a JSON serializable value for `ttl` seconds."""
+        expires_at = time.time() + ttl
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO api_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at),
+            )
+        with self._lock:
+            self._remember((namespace, key), value, expires_at)
+            self._stats["writes"] += 1
+
+    def purge_expired(self):
+        """Delete expired rows from disk and return how many were removed."""
+        with self._connection() as conn:
+            removed = conn.execute("DELETE FROM api_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        return removed
+
+    def clear(self):
+        """Drop every cached entry, in memory and on disk."""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM api_cache")
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the overall hit rate for this process."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+
+# Single cache shared by the Streamlit app and any batch job importing `functions.py`
+api_cache = TTLCache()
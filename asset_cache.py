@@ -0,0 +1,150 @@
+# Image Asset Cache
+################################################################################
+
+# This file makes the small image variants the pages display - a thumbnail for hotel lists and a hero size for
+# banners - instead of shipping the full resolution photos from `Images/` on every rerun. Each variant is resized
+# and recompressed once and stored in an on-disk cache under a name derived from the source's content hash, so
+# a variant never changes once written and can be served (and cached by the browser) as is.
+#
+# Source files are only re-read when their size or modification time changes. Pre-generate every variant for a
+# folder with:
+#
+#     python asset_cache.py Images
+
+################################################################################
+# Imports
+import io
+import os
+import sys
+import hashlib
+import threading
+from pathlib import Path
+from metrics import record_cache
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", ".cache/assets")
+ASSET_QUALITY = int(os.getenv("ASSET_QUALITY", 80))
+IMAGES_DIR = Path("Images")
+
+# Longest side in pixels of each variant: twice the width the pages show it at, for high-DPI screens
+VARIANTS = {
+    "thumbnail": 400,
+    "hero": 800,
+}
+
+IMAGE_SUFFIXES = (".jpeg", ".jpg", ".png", ".webp")
+
+################################################################################
+# Cache
+
+class AssetCache:
+    """Content-addressed store of resized, recompressed image variants."""
+
+    def __init__(self, directory=ASSET_CACHE_DIR, quality=ASSET_QUALITY):
+        self.directory = Path(directory)
+        self.quality = quality
+        self._hashes = {}  # (path, size, mtime) -> content hash
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read(source):
+        """Bytes of a path, bytes, or file-like object (such as a Streamlit upload)."""
+        if isinstance(source, (bytes, bytearray)):
+            return bytes(source)
+        if hasattr(source, "getvalue"):
+            return source.getvalue()
+        if hasattr(source, "read"):
+            data = source.read()
+            if hasattr(source, "seek"):
+                source.seek(0)
+            return data
+        return Path(source).read_bytes()
+
+    def content_hash(self, source):
+        """Return (hash, bytes); bytes is None when a file's hash was known from its size and mtime."""
+        if isinstance(source, (str, Path)):
+            stat = os.stat(source)
+            key = (str(source), stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                digest = self._hashes.get(key)
+            if digest is not None:
+                return digest, None
+            data = self._read(source)
+            digest = hashlib.sha256(data).hexdigest()[:32]
+            with self._lock:
+                self._hashes[key] = digest
+            return digest, data
+        data = self._read(source)
+        return hashlib.sha256(data).hexdigest()[:32], data
+
+    def _cached(self, digest, variant):
+        for suffix in (".jpg", ".png"):
+            path = self.directory / f"{digest}-{variant}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def _render(self, data, size):
+        """Resize to fit `size` and recompress; returns (bytes, suffix)."""
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size), Image.LANCZOS)
+            out = io.BytesIO()
+            # Keep transparency as PNG, everything else becomes a progressive JPEG
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                image.save(out, "PNG", optimize=True)
+                return out.getvalue(), ".png"
+            image.convert("RGB").save(out, "JPEG", quality=self.quality, optimize=True, progressive=True)
+            return out.getvalue(), ".jpg"
+
+    def variant(self, source, variant="thumbnail"):
+        """Path of the cached `variant` of an image, generating it on first use."""
+        digest, data = self.content_hash(source)
+        path = self._cached(digest, variant)
+        record_cache("assets", path is not None)
+        if path is not None:
+            return path
+
+        rendered, suffix = self._render(data if data is not None else self._read(source), VARIANTS[variant])
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{digest}-{variant}{suffix}"
+        # Write then rename, so another process never reads a half written variant
+        temporary = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+        temporary.write_bytes(rendered)
+        os.replace(temporary, path)
+        return path
+
+    def variants(self, source):
+        """Generate every variant of an image; returns {variant: path}."""
+        data = self._read(source) if not isinstance(source, (str, Path)) else source
+        return {variant: self.variant(data, variant) for variant in VARIANTS}
+
+    def pregenerate(self, directory=IMAGES_DIR):
+        """Generate every variant of every image in a folder; returns how many images were processed."""
+        images = [path for path in sorted(Path(directory).iterdir()) if path.suffix.lower() in IMAGE_SUFFIXES]
+        for path in images:
+            self.variants(path)
+        return len(images)
+
+
+asset_cache = AssetCache()
+
+
+def hotel_image(hotel_name, variant="thumbnail", directory=IMAGES_DIR):
+    """Cached variant of a hotel's photo, found in `Images/` by hotel name; None if there is no photo."""
+    for suffix in IMAGE_SUFFIXES:
+        path = Path(directory) / f"{hotel_name}{suffix}"
+        if path.exists():
+            return asset_cache.variant(path, variant)
+    return None
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else IMAGES_DIR
+    print(f"Generated variants of {asset_cache.pregenerate(folder)} images in {asset_cache.directory}")
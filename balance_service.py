@@ -0,0 +1,104 @@
+# Balance Service
+################################################################################
+
+# This file caches Ether balances by (address, block number) and fetches missing balances in batches.
+# A balance cannot change until a new block is mined, so every render in the same block is answered from memory,
+# and a portfolio or leaderboard over hundreds of wallets costs one batched round trip per block.
+
+################################################################################
+# Imports
+import os
+import time
+import threading
+from batch_rpc import batch_get_balance
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+# How long a block number is trusted before asking the node again
+BLOCK_POLL_INTERVAL = float(os.getenv("BLOCK_POLL_INTERVAL", 1))
+
+################################################################################
+# Service
+
+class BalanceService:
+    """Block-keyed balance cache for one web3 connection."""
+
+    def __init__(self, w3, block_poll_interval=BLOCK_POLL_INTERVAL):
+        self.w3 = w3
+        self.block_poll_interval = block_poll_interval
+        self._block = None
+        self._block_checked_at = 0.0
+        self._balances = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "round_trips": 0, "blocks": 0}
+
+    def current_block(self):
+        """Return the latest block number, asking the node at most once per poll interval."""
+        now = time.monotonic()
+        with self._lock:
+            if self._block is not None and now - self._block_checked_at < self.block_poll_interval:
+                return self._block
+
+        block = self.w3.eth.block_number
+        with self._lock:
+            self._block_checked_at = now
+            if block != self._block:
+                # A new block may have changed any balance, so everything cached is dropped
+                self._block = block
+                self._balances = {}
+                self._stats["blocks"] += 1
+            return self._block
+
+    def get_balances(self, addresses):
+        """Return the wei balance of every address at the current block, in order."""
+        addresses = list(addresses)
+        block = self.current_block()
+
+        with self._lock:
+            cached = self._balances if self._block == block else {}
+            missing = list(dict.fromkeys(address for address in addresses if address not in cached))
+            self._stats["hits"] += len(addresses) - len(missing)
+            self._stats["misses"] += len(missing)
+
+        if missing:
+            # Read every missing balance at the same block so the snapshot is consistent
+            fetched = dict(zip(missing, batch_get_balance(self.w3, missing, block_identifier=block)))
+            with self._lock:
+                self._stats["round_trips"] += 1
+                if self._block == block:
+                    self._balances.update(fetched)
+                cached = dict(cached, **fetched)
+
+        return [cached[address] for address in addresses]
+
+    def get_balance(self, address):
+        return self.get_balances([address])[0]
+
+    def invalidate(self, address=None):
+        """Forget one address (e.g. right after paying from it) or everything."""
+        with self._lock:
+            # The payment's block is likely newer than the one we trust, so the next read asks the node again
+            self._block_checked_at = 0.0
+            if address is None:
+                self._balances = {}
+            else:
+                self._balances.pop(address, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, block=self._block, cached=len(self._balances))
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_balance_service(w3):
+    """Return the shared balance service for a web3 instance."""
+    with _services_lock:
+        if id(w3) not in _services:
+            _services[id(w3)] = BalanceService(w3)
+        return _services[id(w3)]
@@ -0,0 +1,119 @@
+# Batched JSON-RPC
+################################################################################
+
+# This file combines many read-only JSON-RPC calls (`eth_call`, `eth_getBalance`, ...) into JSON-RPC batch requests,
+# so reading a thousand reservations costs a handful of HTTP round trips instead of a thousand.
+# Providers that cannot batch (such as the in-process eth-tester provider) fall back to one call at a time,
+# which keeps the same API usable in local tests.
+
+################################################################################
+# Imports
+import os
+import itertools
+from hexbytes import HexBytes
+from web3 import HTTPProvider
+from web3._utils.abi import get_abi_output_types
+from http_client import http
+from metrics import timed
+
+################################################################################
+# Configuration
+
+# Most nodes cap the number of calls per batch; stay well below the common limits
+RPC_BATCH_SIZE = int(os.getenv("RPC_BATCH_SIZE", 100))
+
+################################################################################
+# Provider
+
+class BatchHTTPProvider(HTTPProvider):
+    """HTTPProvider that can also send a list of calls as one JSON-RPC batch over the shared connection pool."""
+
+    _ids = itertools.count(1)
+
+    @timed("rpc.batch")
+    def make_batch_request(self, calls):
+        """Send [(method, params), ...] in one HTTP request and return the responses in call order."""
+        payload = [
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": next(self._ids)}
+            for method, params in calls
+        ]
+        response = http.post(self.endpoint_uri, endpoint="rpc", json=payload)
+        response.raise_for_status()
+        replies = response.json()
+        if isinstance(replies, dict):
+            # A node without batch support answers with a single error object
+            raise ValueError(replies.get("error", replies))
+
+        # Batch replies may come back in any order
+        by_id = {reply["id"]: reply for reply in replies}
+        return [by_id[request["id"]] for request in payload]
+
+################################################################################
+# Batch helpers
+
+def _format_block(block_identifier):
+    return hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+
+
+def batch_request(w3, calls, batch_size=RPC_BATCH_SIZE):
+    """Run [(method, params), ...] with as few round trips as the provider allows; results keep call order."""
+    calls = list(calls)
+    provider = w3.provider
+    results = []
+
+    if hasattr(provider, "make_batch_request"):
+        for offset in range(0, len(calls), batch_size):
+            replies = provider.make_batch_request(calls[offset:offset + batch_size])
+            results.extend(replies)
+    else:
+        # Go through the manager so the provider's own request/response middlewares still apply
+        results = [{"result": w3.manager.request_blocking(method, params)} for method, params in calls]
+
+    values = []
+    for reply in results:
+        if "error" in reply:
+            raise ValueError(reply["error"])
+        values.append(reply["result"])
+    return values
+
+
+def batch_call(w3, contract_calls, block_identifier="latest", batch_size=RPC_BATCH_SIZE):
+    """Run many bound contract view calls, e.g. `contract.functions.roomconfirmation(i)`, in batches.
+
+    Returns the decoded results in the same order; single-output functions return the bare value.
+    """
+    contract_calls = list(contract_calls)
+    block = _format_block(block_identifier)
+    raw_results = batch_request(
+        w3,
+        [
+            ("eth_call", [{"to": call.address, "data": call._encode_transaction_data()}, block])
+            for call in contract_calls
+        ],
+        batch_size=batch_size,
+    )
+
+    decoded = []
+    for call, raw in zip(contract_calls, raw_results):
+        output_types = get_abi_output_types(call.abi)
+        values = w3.codec.decode_abi(output_types, HexBytes(raw))
+        decoded.append(values[0] if len(values) == 1 else list(values))
+    return decoded
+
+
+def batch_get_balance(w3, addresses, block_identifier="latest", batch_size=RPC_BATCH_SIZE):
+    """Return the wei balance of every address, in order."""
+    block = _format_block(block_identifier)
+    raw_results = batch_request(
+        w3, [("eth_getBalance", [address, block]) for address in addresses], batch_size=batch_size
+    )
+    return [int(raw, 16) if isinstance(raw, str) else int(raw) for raw in raw_results]
+
+
+def batch_get_transaction_count(w3, addresses, block_identifier="pending", batch_size=RPC_BATCH_SIZE):
+    """Return the transaction count (next nonce) of every address, in order."""
+    block = _format_block(block_identifier)
+    raw_results = batch_request(
+        w3, [("eth_getTransactionCount", [address, block]) for address in addresses], batch_size=batch_size
+    )
+    return [int(raw, 16) if isinstance(raw, str) else int(raw) for raw in raw_results]
@@ -0,0 +1,82 @@
+# Bulk Mint Benchmark
+################################################################################
+
+# Mints the same block of reservations on a local py-evm chain twice: one `registerHotelReservation` transaction
+# per reservation, then through `bulk_mint.BulkMinter`. Checks that the bulk path returns token IDs in input
+# order and reports gas per reservation for both.
+#
+# Run from the project root with:  python benchmarks/bulk_mint_benchmark.py  (see local_chain.py for requirements)
+
+################################################################################
+# Imports
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from local_chain import deploy_registry, locked_provider
+from bulk_mint import BulkMinter, Reservation, gas_report
+from reservation_codec import encode_reservation, decode_reservation
+
+RESERVATIONS = int(os.getenv("RESERVATIONS", 500))
+
+
+def make_reservations(owners, count):
+    return [
+        Reservation(
+            owner=owners[i % len(owners)],
+            hotel_name=f"Hotel {i % 25}",
+            start_date="2022-09-01",
+            end_date="2022-09-03",
+            confirmation=str(uuid.uuid4()),
+            hotel_room_value=100 + i,
+        )
+        for i in range(count)
+    ]
+
+
+def mint_one_by_one(w3, contract, reservations):
+    sender = w3.eth.accounts[0]
+    gas_used = 0
+    for reservation in reservations:
+        tx_hash = contract.functions.registerHotelReservation(
+            reservation.owner,
+            *encode_reservation(reservation.hotel_name, reservation.start_date, reservation.end_date,
+                                reservation.confirmation, reservation.hotel_room_value),
+            "ipfs://placeholder",
+        ).transact({"from": sender, "gas": 1000000})
+        gas_used += w3.eth.wait_for_transaction_receipt(tx_hash)["gasUsed"]
+    return gas_used / len(reservations)
+
+
+if __name__ == "__main__":
+    w3, contract = deploy_registry()
+    # The bulk minter sends from worker threads, so py-evm is driven one request at a time as in e2e_benchmark.py
+    locked_provider(w3)
+    owners = w3.eth.accounts[1:]
+
+    start = time.perf_counter()
+    single_gas = mint_one_by_one(w3, contract, make_reservations(owners, RESERVATIONS))
+    single_seconds = time.perf_counter() - start
+
+    reservations = make_reservations(owners, RESERVATIONS)
+    start = time.perf_counter()
+    results = BulkMinter(w3, contract, w3.eth.accounts[0]).mint(reservations, pin_metadata=False)
+    bulk_seconds = time.perf_counter() - start
+    report = gas_report(results)
+
+    # Token IDs must follow the input order and match what was stored on chain
+    assert [result.index for result in results] == list(range(RESERVATIONS))
+    assert report["failed"] == 0, [result.error for result in results if result.error]
+    for result, reservation in zip(results, reservations):
+        stored = decode_reservation(contract.functions.roomconfirmation(result.token_id).call())
+        assert stored[3] == reservation.confirmation
+
+    print(f"{RESERVATIONS} reservations")
+    print(f"  one per transaction: {single_gas:10.0f} gas/reservation, {RESERVATIONS} transactions, {single_seconds:.2f}s")
+    print(f"  bulk:                {report['gas_per_reservation']:10.0f} gas/reservation, "
+          f"{report['transactions']} transactions, {bulk_seconds:.2f}s")
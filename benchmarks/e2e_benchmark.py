@@ -0,0 +1,278 @@
+# End-to-End Benchmark
+################################################################################
+
+# Runs the booking flow of `hotel_reservation_app.py` (search -> parse -> pin -> registerHotelReservation ->
+# receipt) and the secondary market flow of `pages/1_Secondary_Market.py` (list -> transfer -> pay) for N
+# concurrent users against local stand-ins: fake Booking.com and Pinata servers (fake_services.py) and the
+# compiled contract on an in-process py-evm chain (local_chain.py). Prints latency percentiles per stage and
+# overall throughput, and appends every run to a results file so runs can be compared over time.
+#
+# Run from the project root with:  python benchmarks/e2e_benchmark.py  (see local_chain.py for requirements)
+#
+# Settings (environment variables):
+#   USERS              concurrent users                                       (default 8)
+#   FLOWS_PER_USER     booking + resale flows each user runs                  (default 5)
+#   SEARCH_PAGES       result pages fetched per search                        (default 3)
+#   DISTINCT_CITIES    cities searched; fewer than USERS x FLOWS_PER_USER lets the API cache hit (default: no repeats)
+#   FAKE_LATENCY       mean delay of every fake API response, seconds         (default 0.05)
+#   FAKE_JITTER        +/- spread around FAKE_LATENCY, seconds                (default 0.02)
+#   FAKE_ERROR_RATE    share of fake API responses that are 429/5xx errors    (default 0)
+#   RESULTS_PATH       JSON lines file the run is appended to                 (default .cache/benchmarks/e2e_results.jsonl)
+
+################################################################################
+# Imports
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import datetime
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_services import FakeBookingServer, FakePinataServer
+
+USERS = int(os.getenv("USERS", 8))
+FLOWS_PER_USER = int(os.getenv("FLOWS_PER_USER", 5))
+SEARCH_PAGES = int(os.getenv("SEARCH_PAGES", 3))
+DISTINCT_CITIES = int(os.getenv("DISTINCT_CITIES", USERS * FLOWS_PER_USER))
+FAKE_LATENCY = float(os.getenv("FAKE_LATENCY", 0.05))
+FAKE_JITTER = float(os.getenv("FAKE_JITTER", 0.02))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", 0))
+RESULTS_PATH = Path(os.getenv("RESULTS_PATH", PROJECT_ROOT / ".cache" / "benchmarks" / "e2e_results.jsonl"))
+
+BOOKING_STAGES = ["location", "search", "parse", "pin", "mint"]
+RESALE_STAGES = ["list", "transfer", "pay"]
+
+################################################################################
+# Local stand-ins
+#
+# The app modules read their endpoints and store paths at import time, so everything is pointed at the fakes
+# and a scratch directory before they are imported.
+
+booking_server = FakeBookingServer(latency=FAKE_LATENCY, jitter=FAKE_JITTER, error_rate=FAKE_ERROR_RATE).start()
+pinata_server = FakePinataServer(latency=FAKE_LATENCY, jitter=FAKE_JITTER, error_rate=FAKE_ERROR_RATE).start()
+scratch = tempfile.mkdtemp(prefix="e2e-benchmark-")
+
+os.environ["BOOKING_API_URL"] = booking_server.url
+os.environ["PINATA_API_URL"] = pinata_server.url
+os.environ["API_CACHE_PATH"] = os.path.join(scratch, "api_cache.sqlite3")
+os.environ["PIN_INDEX_PATH"] = os.path.join(scratch, "pins.sqlite3")
+os.environ["PRICE_HISTORY_PATH"] = os.path.join(scratch, "price_history.sqlite3")
+os.environ.setdefault("HTTP_BACKOFF_BASE", "0.05")
+# The stand-in has no quota to respect
+os.environ.setdefault("BOOKING_RATE_LIMIT", "0")
+os.environ.setdefault("RECEIPT_POLL_INTERVAL", "0.02")
+
+from web3 import Account
+from local_chain import deploy_registry, locked_provider
+from functions import get_location, search_all_hotels
+from hotel_table import parse_hotels
+from pin_cache import pin_json
+from listing_store import ListingStore
+from reservation_codec import encode_reservation
+from tx_pipeline import get_pipeline
+
+################################################################################
+# Measurements
+
+class StageTimer:
+    """Collects wall-clock durations and failures per stage from many threads."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.errors[name] += 1
+            raise
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.durations[name].append(elapsed)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(timer, stages):
+    summary = {}
+    for name in stages:
+        values = timer.durations.get(name, [])
+        summary[name] = {
+            "count": len(values),
+            "errors": timer.errors.get(name, 0),
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p90_ms": percentile(values, 0.90) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "max_ms": max(values) * 1000 if values else float("nan"),
+        }
+    return summary
+
+################################################################################
+# Chain
+
+def fund_buyers(w3, count, ether=100):
+    """Create locally signing buyer accounts, like the app's keyring accounts, and fund them."""
+    buyers = [Account.create() for _ in range(count)]
+    for buyer in buyers:
+        tx_hash = w3.eth.send_transaction({"from": w3.eth.accounts[0], "to": buyer.address,
+                                           "value": w3.toWei(ether, "ether")})
+        w3.eth.wait_for_transaction_receipt(tx_hash)
+    return buyers
+
+################################################################################
+# User flows
+
+def booking_flow(timer, w3, contract, owner, city):
+    """Search, pick, pin and tokenize one reservation; returns the minted token ID."""
+    checkin = datetime.date(2022, 9, 1)
+    checkout = checkin + datetime.timedelta(days=3)
+
+    with timer.stage("location"):
+        destination_id = get_location(city)
+
+    with timer.stage("search"):
+        pages = dict(search_all_hotels(destination_id, str(checkin), str(checkout), "2", "1", max_pages=SEARCH_PAGES))
+
+    with timer.stage("parse"):
+        hotels = parse_hotels([pages[page_number] for page_number in sorted(pages)])
+        hotel = hotels.iloc[0]
+
+    confirmation_code = uuid.uuid4()
+    with timer.stage("pin"):
+        ipfs_hash = pin_json({"name": hotel["Hotel Name"], "confirmation": str(confirmation_code)}, wait=True)
+
+    with timer.stage("mint"):
+        pending = get_pipeline(w3).submit_transact(contract.functions.registerHotelReservation(
+            owner,
+            *encode_reservation(hotel["Hotel Name"], checkin, checkout, confirmation_code, hotel["Total Price"]),
+            f"ipfs://{ipfs_hash}",
+        ), {"from": owner, "gas": 1000000})
+        receipt = pending.receipt()
+        if receipt["status"] != 1:
+            raise RuntimeError(f"registerHotelReservation {receipt['transactionHash'].hex()} reverted")
+    return contract.events.Transfer().processReceipt(receipt)[0]["args"]["tokenId"], hotel
+
+
+def resale_flow(timer, w3, contract, listing_store, token_id, hotel, seller, buyer):
+    """List a freshly minted reservation, transfer it to the buyer and pay the seller."""
+    with timer.stage("list"):
+        listing_store.add_listing(token_id, hotel["Hotel Name"], "2022-09-01", "2022-09-04", str(uuid.uuid4()),
+                                  int(hotel["Total Price"]), 0.01, seller)
+
+    with timer.stage("transfer"):
+        if listing_store.remove_listing(token_id) is None:
+            raise RuntimeError(f"Listing for token {token_id} was already claimed")
+        pending = get_pipeline(w3).submit_transact(contract.functions.transferFrom(seller, buyer.address, token_id),
+                                                   {"from": seller, "gas": 3000000})
+        pending.receipt()
+
+    with timer.stage("pay"):
+        get_pipeline(w3).submit_payment(buyer, seller, 0.01).receipt()
+
+
+def run_user(timer, w3, contract, listing_store, user, buyer, completed):
+    seller = w3.eth.accounts[1 + user % (len(w3.eth.accounts) - 1)]
+    for flow in range(FLOWS_PER_USER):
+        city = f"City {(user * FLOWS_PER_USER + flow) % DISTINCT_CITIES}"
+        try:
+            with timer.stage("booking"):
+                token_id, hotel = booking_flow(timer, w3, contract, seller, city)
+            with timer.stage("resale"):
+                resale_flow(timer, w3, contract, listing_store, token_id, hotel, seller, buyer)
+        except Exception as error:
+            print(f"  user {user} flow {flow} failed: {error!r}")
+            continue
+        completed.append(1)
+
+################################################################################
+# Reporting
+
+def previous_run(config):
+    """Return the last recorded run with the same settings, if any."""
+    if not RESULTS_PATH.exists():
+        return None
+    previous = None
+    with open(RESULTS_PATH) as f:
+        for line in f:
+            run = json.loads(line)
+            if run.get("config") == config:
+                previous = run
+    return previous
+
+
+def print_report(run, previous):
+    print(f"{run['config']['users']} users x {run['config']['flows_per_user']} flows, "
+          f"fake API latency {FAKE_LATENCY * 1000:.0f}±{FAKE_JITTER * 1000:.0f} ms, error rate {FAKE_ERROR_RATE:.0%}")
+    print(f"  {'stage':<10} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+          f"{'  p50 vs last' if previous else ''}")
+    for name, stage in run["stages"].items():
+        line = (f"  {name:<10} {stage['count']:>6} {stage['errors']:>6} {stage['p50_ms']:>9.1f} "
+                f"{stage['p90_ms']:>9.1f} {stage['p99_ms']:>9.1f} {stage['max_ms']:>9.1f}")
+        before = previous["stages"].get(name, {}).get("p50_ms") if previous else None
+        if before:
+            line += f"  {stage['p50_ms'] / before - 1:+12.1%}"
+        print(line)
+    print(f"  throughput: {run['throughput_flows_per_s']:.2f} flows/s "
+          f"({run['completed_flows']} completed in {run['wall_seconds']:.2f}s)")
+    print(f"  fake Booking.com: {run['services']['booking']}, fake Pinata: {run['services']['pinata']}")
+
+
+if __name__ == "__main__":
+    w3, contract = deploy_registry()
+    locked_provider(w3)
+    buyers = fund_buyers(w3, USERS)
+    listing_store = ListingStore(os.path.join(scratch, "listings.sqlite3"))
+
+    timer, completed = StageTimer(), []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=USERS) as executor:
+        for user in range(USERS):
+            executor.submit(run_user, timer, w3, contract, listing_store, user, buyers[user], completed)
+    wall_seconds = time.perf_counter() - start
+
+    config = {"users": USERS, "flows_per_user": FLOWS_PER_USER, "search_pages": SEARCH_PAGES,
+              "distinct_cities": DISTINCT_CITIES, "fake_latency": FAKE_LATENCY, "fake_jitter": FAKE_JITTER,
+              "fake_error_rate": FAKE_ERROR_RATE}
+    run = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "stages": summarize(timer, BOOKING_STAGES + RESALE_STAGES + ["booking", "resale"]),
+        "completed_flows": len(completed),
+        "wall_seconds": wall_seconds,
+        "throughput_flows_per_s": len(completed) / wall_seconds,
+        "services": {"booking": booking_server.stats(), "pinata": pinata_server.stats()},
+    }
+
+    previous = previous_run(config)
+    print_report(run, previous)
+
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(RESULTS_PATH, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"  recorded in {RESULTS_PATH}")
+
+    booking_server.stop()
+    pinata_server.stop()
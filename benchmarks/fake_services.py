@@ -0,0 +1,234 @@
+# Fake Services
+################################################################################
+
+# Local stand-ins for the Booking.com (RapidAPI) and Pinata endpoints the app calls, so the booking flow can be
+# measured without network access, API keys or rate limits. Each server answers in the same shape as the real
+# API, adds a configurable delay to every response and can fail a share of requests with 429/5xx so the retry
+# paths in `http_client.py` are exercised too.
+#
+# Point the app at them with BOOKING_API_URL and PINATA_API_URL (set before importing functions/pinata):
+#     booking = FakeBookingServer(latency=0.05).start()
+#     os.environ["BOOKING_API_URL"] = booking.url
+
+################################################################################
+# Imports
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pin_cache import compute_cid
+
+################################################################################
+# Configuration
+
+# Status codes used for injected failures, all of which the shared HTTP client retries
+INJECTED_ERRORS = (429, 500, 502, 503)
+
+HOTELS_PER_PAGE = 20
+
+################################################################################
+# Server base
+
+class FakeService:
+    """A threaded HTTP server on a free local port with latency and error injection.
+
+    `latency` is the mean delay in seconds added to every response, `jitter` the +/- spread around it,
+    and `error_rate` the share of requests answered with one of INJECTED_ERRORS instead.
+    """
+
+    routes = {}
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _delay_and_fault(self):
+        """Sleep for the configured latency; return an error status to inject, or None."""
+        with self._random_lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+            status = self._random.choice(INJECTED_ERRORS) if fail else None
+        if delay:
+            time.sleep(delay)
+        return status
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _read_body(self):
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    body = b""
+                    while True:
+                        size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return body
+                        body += self.rfile.read(size)
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                body = self._read_body() if method == "POST" else b""
+                service._count("requests")
+
+                route = service.routes.get((method, parsed.path))
+                status = service._delay_and_fault()
+                if route is None:
+                    status, payload = 404, {"error": f"no route for {method} {parsed.path}"}
+                elif status is not None:
+                    service._count("errors")
+                    payload = {"error": "injected failure"}
+                else:
+                    query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                    status, payload = 200, getattr(service, route)(query, body, self.headers)
+
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+################################################################################
+# Booking.com
+
+class FakeBookingServer(FakeService):
+    """Answers /v1/hotels/locations and /v1/hotels/search with deterministic generated hotels."""
+
+    routes = {
+        ("GET", "/v1/hotels/locations"): "locations",
+        ("GET", "/v1/hotels/search"): "search",
+    }
+
+    def __init__(self, hotels_per_city=100, **kwargs):
+        super().__init__(**kwargs)
+        self.hotels_per_city = hotels_per_city
+
+    @staticmethod
+    def _destination_id(city):
+        return str(int(hashlib.sha256(city.lower().encode("utf-8")).hexdigest()[:8], 16))
+
+    def locations(self, query, body, headers):
+        city = query.get("name", "")
+        return [{"dest_id": self._destination_id(city), "dest_type": "city", "name": city}]
+
+    def search(self, query, body, headers):
+        dest_id = query.get("dest_id", "0")
+        page_number = int(query.get("page_number", 0))
+        currency = query.get("filter_by_currency", "USD")
+        first = page_number * HOTELS_PER_PAGE
+        last = min(first + HOTELS_PER_PAGE, self.hotels_per_city)
+
+        hotels = []
+        for position in range(first, last):
+            nightly = 80 + (int(dest_id) + position * 37) % 320
+            hotels.append({
+                "hotel_id": int(dest_id) % 100000 * 1000 + position,
+                "hotel_name": f"Hotel {dest_id[-4:]}-{position}",
+                "currencycode": currency,
+                "review_score": round(5 + (position * 7 % 50) / 10, 1),
+                "composite_price_breakdown": {"gross_amount_per_night": {"value": nightly, "currency": currency}},
+                "price_breakdown": {"all_inclusive_price": nightly * 3, "currency": currency},
+            })
+        return {"count": self.hotels_per_city, "result": hotels}
+
+################################################################################
+# Pinata
+
+def _multipart_file(body, content_type):
+    """Return the content of the `file` part of a multipart/form-data body."""
+    boundary = content_type.split("boundary=")[-1].encode("utf-8")
+    for part in body.split(b"--" + boundary):
+        head, _, content = part.partition(b"\r\n\r\n")
+        if b'name="file"' in head:
+            return content[:-2] if content.endswith(b"\r\n") else content
+    return b""
+
+
+class FakePinataServer(FakeService):
+    """Answers the pinning endpoints with the CIDv1 of the uploaded content, like Pinata does."""
+
+    routes = {
+        ("POST", "/pinning/pinFileToIPFS"): "pin_file",
+        ("POST", "/pinning/pinJSONToIPFS"): "pin_json",
+    }
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.pinned = {}
+        self._pinned_lock = threading.Lock()
+
+    def _pin(self, data):
+        # Content too large for a single block gets a stand-in hash, which is fine for timing
+        cid = compute_cid(data) or "b" + hashlib.sha256(data).hexdigest()
+        with self._pinned_lock:
+            self.pinned[cid] = len(data)
+        return {"IpfsHash": cid, "PinSize": len(data), "Timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+    def pin_file(self, query, body, headers):
+        return self._pin(_multipart_file(body, headers.get("Content-Type", "")))
+
+    def pin_json(self, query, body, headers):
+        content = json.loads(body or b"{}").get("pinataContent")
+        return self._pin(json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8"))
@@ -0,0 +1,84 @@
+# Storage Layout Gas Benchmark
+################################################################################
+
+# Deploys the previous HotelConfirmation layout (every field a `string`, kept in benchmarks/contracts/) and the
+# current compact layout (uint32 day numbers, bytes16 confirmation, uint64 value) side by side on a local py-evm
+# chain, mints the same reservations on both and reports gas per reservation for single and bulk mints.
+#
+# Run from the project root with:  python benchmarks/layout_gas_benchmark.py  (see local_chain.py for requirements)
+
+################################################################################
+# Imports
+import os
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from local_chain import CONTRACT_SOURCE, local_web3, deploy_contract
+from reservation_codec import encode_reservation, decode_reservation
+
+STRING_LAYOUT_SOURCE = Path(__file__).resolve().parent / "contracts" / "hotelbooking_NFT_string_layout.sol"
+
+RESERVATIONS = int(os.getenv("RESERVATIONS", 200))
+BULK_CHUNK = int(os.getenv("BULK_CHUNK", 50))
+
+
+def make_reservations(count):
+    return [
+        (f"Hotel {i % 25}", "2022-09-01", "2022-09-03", str(uuid.uuid4()), 100 + i)
+        for i in range(count)
+    ]
+
+
+def string_fields(reservation):
+    # The old layout took every field as it came from the app
+    return tuple(reservation)
+
+
+def compact_fields(reservation):
+    return encode_reservation(*reservation)
+
+
+def mint_single(w3, contract, reservations, encode):
+    owner, gas_used = w3.eth.accounts[1], 0
+    for reservation in reservations:
+        tx_hash = contract.functions.registerHotelReservation(owner, *encode(reservation), "ipfs://placeholder") \
+            .transact({"from": w3.eth.accounts[0], "gas": 1000000})
+        gas_used += w3.eth.wait_for_transaction_receipt(tx_hash)["gasUsed"]
+    return gas_used / len(reservations)
+
+
+def mint_bulk(w3, contract, reservations, encode):
+    owner, gas_used = w3.eth.accounts[1], 0
+    for offset in range(0, len(reservations), BULK_CHUNK):
+        chunk = [encode(reservation) for reservation in reservations[offset:offset + BULK_CHUNK]]
+        columns = [list(column) for column in zip(*chunk)]
+        tx_hash = contract.functions.registerHotelReservations([owner] * len(chunk), *columns,
+                                                               ["ipfs://placeholder"] * len(chunk)) \
+            .transact({"from": w3.eth.accounts[0], "gas": 25000000})
+        gas_used += w3.eth.wait_for_transaction_receipt(tx_hash)["gasUsed"]
+    return gas_used / len(reservations)
+
+
+def measure(source_path, encode, reservations):
+    w3 = local_web3()
+    contract = deploy_contract(w3, source_path)
+    return mint_single(w3, contract, reservations, encode), mint_bulk(w3, contract, reservations, encode), contract
+
+
+if __name__ == "__main__":
+    reservations = make_reservations(RESERVATIONS)
+    string_single, string_bulk, _ = measure(STRING_LAYOUT_SOURCE, string_fields, reservations)
+    compact_single, compact_bulk, contract = measure(CONTRACT_SOURCE, compact_fields, reservations)
+
+    # The compact layout must round-trip to the same values the app used to store as strings
+    assert decode_reservation(contract.functions.roomconfirmation(0).call()) == list(reservations[0])
+
+    print(f"{RESERVATIONS} reservations (gas per reservation)")
+    print(f"  {'layout':<8} {'single':>10} {'bulk':>10}")
+    print(f"  {'string':<8} {string_single:10.0f} {string_bulk:10.0f}")
+    print(f"  {'compact':<8} {compact_single:10.0f} {compact_bulk:10.0f}")
+    print(f"  saved    {1 - compact_single / string_single:10.1%} {1 - compact_bulk / string_bulk:10.1%}")
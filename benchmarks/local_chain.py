@@ -0,0 +1,90 @@
+# Local Chain
+################################################################################
+
+# Compiles `contracts/hotelbooking_NFT.sol` with py-solc-x and deploys it on an in-process eth-tester (py-evm) chain,
+# so the contract and the Python pipelines around it can be measured without Ganache or a public node.
+#
+# Requirements: pip install "web3[tester]" py-solc-x
+# and OpenZeppelin 2.5.0 on disk:  npm install @openzeppelin/contracts@2.5.0
+# (set OPENZEPPELIN_PATH if it is not in ./node_modules/@openzeppelin/contracts).
+
+################################################################################
+# Imports
+import os
+import threading
+from pathlib import Path
+from functools import lru_cache
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CONTRACT_SOURCE = PROJECT_ROOT / "contracts" / "hotelbooking_NFT.sol"
+CONTRACT_NAME = "HotelReservationRegistry"
+
+SOLC_VERSION = os.getenv("SOLC_VERSION", "0.5.17")
+OPENZEPPELIN_PATH = Path(os.getenv("OPENZEPPELIN_PATH", PROJECT_ROOT / "node_modules" / "@openzeppelin" / "contracts"))
+
+# The contract imports OpenZeppelin straight from GitHub (for Remix); locally that prefix is remapped to disk
+OPENZEPPELIN_URL = "https://github.com/OpenZeppelin/openzeppelin-contracts/blob/release-v2.5.0/contracts/"
+
+# Enough room for large bulk mints in a single block
+LOCAL_BLOCK_GAS_LIMIT = int(os.getenv("LOCAL_BLOCK_GAS_LIMIT", 30_000_000))
+
+################################################################################
+# Compile and deploy
+
+@lru_cache(maxsize=None)
+def compile_contract(source_path=CONTRACT_SOURCE, contract_name=CONTRACT_NAME):
+    """Return (abi, bytecode) for a contract in this repository."""
+    import solcx
+
+    solcx.install_solc(SOLC_VERSION)
+    source = Path(source_path).read_text().replace(OPENZEPPELIN_URL, "@openzeppelin/contracts/")
+    compiled = solcx.compile_source(
+        source,
+        output_values=["abi", "bin"],
+        solc_version=SOLC_VERSION,
+        import_remappings=[f"@openzeppelin/contracts/={OPENZEPPELIN_PATH}/"],
+        allow_paths=[str(OPENZEPPELIN_PATH)],
+        optimize=True,
+    )
+    for name, output in compiled.items():
+        if name.endswith(f":{contract_name}"):
+            return output["abi"], output["bin"]
+    raise KeyError(f"{contract_name} not found in {source_path}")
+
+
+def local_web3(gas_limit=LOCAL_BLOCK_GAS_LIMIT):
+    """Return a Web3 instance backed by a fresh in-process py-evm chain with funded test accounts."""
+    from web3 import Web3
+    from eth_tester import EthereumTester, PyEVMBackend
+
+    genesis = PyEVMBackend._generate_genesis_params(overrides={"gas_limit": gas_limit})
+    return Web3(Web3.EthereumTesterProvider(EthereumTester(PyEVMBackend(genesis_parameters=genesis))))
+
+
+def deploy_contract(w3, source_path=CONTRACT_SOURCE, contract_name=CONTRACT_NAME):
+    """Deploy a contract from the first test account and return the contract object."""
+    abi, bytecode = compile_contract(source_path, contract_name)
+    deployer = w3.eth.accounts[0]
+    tx_hash = w3.eth.contract(abi=abi, bytecode=bytecode).constructor().transact({"from": deployer})
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    return w3.eth.contract(address=receipt["contractAddress"], abi=abi)
+
+
+def deploy_registry(source_path=CONTRACT_SOURCE):
+    """Return (w3, contract) with HotelReservationRegistry deployed on a fresh local chain."""
+    w3 = local_web3()
+    return w3, deploy_contract(w3, source_path)
+
+
+def locked_provider(w3):
+    """Serialize requests to the chain; returns `w3`."""
+    # py-evm is not thread safe, so concurrent users take turns at the chain like they would at a node's queue
+    provider, lock = w3.provider, threading.Lock()
+    make_request = provider.make_request
+
+    def make_request_locked(method, params):
+        with lock:
+            return make_request(method, params)
+
+    provider.make_request = make_request_locked
+    return w3
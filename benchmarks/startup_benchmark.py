@@ -0,0 +1,94 @@
+# Startup Benchmark
+################################################################################
+
+# Compares how long the Streamlit pages take to get a provider and contract object, before and after
+# `contract_registry.py`:
+#   cold - a fresh Python process importing what the page imports and building w3 + contract
+#   warm - a Streamlit rerun in an already running process, which repeats the page's top level code
+#
+# Run from the project root with:  python benchmarks/startup_benchmark.py
+# No node is needed; building a provider and a contract object does not connect.
+
+################################################################################
+# Imports
+import os
+import sys
+import time
+import statistics
+import subprocess
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# Any valid address will do, nothing is called on it
+os.environ.setdefault("SMART_CONTRACT_ADDRESS", "0x" + "0" * 40)
+os.environ.setdefault("WEB3_PROVIDER_URI", "http://127.0.0.1:7545")
+
+################################################################################
+# Page start up, before and after
+
+# What the pages did on every run before the registry existed
+BEFORE = """
+from lib2to3.pgen2 import token
+import os, json
+import pandas as pd
+from pathlib import Path
+from web3 import Web3
+from bip44 import Wallet
+w3 = Web3(Web3.HTTPProvider(os.getenv("WEB3_PROVIDER_URI")))
+w3_wallet = Web3(Web3.HTTPProvider('HTTP://127.0.0.1:7545'))
+with open(Path("./contracts/compiled/hotel_reservation_registry_abi.json")) as f:
+    contract_abi = json.load(f)
+contract = w3.eth.contract(address=os.getenv("SMART_CONTRACT_ADDRESS"), abi=contract_abi)
+"""
+
+# What they do now
+AFTER = """
+from contract_registry import get_web3, get_wallet_web3, get_contract
+w3 = get_web3()
+w3_wallet = get_wallet_web3()
+contract = get_contract()
+"""
+
+
+def cold_start(code, runs):
+    """Time a fresh interpreter running `code`, in milliseconds."""
+    timer = "import time; _start = time.perf_counter()\n" + code + "\nprint((time.perf_counter() - _start) * 1000)"
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", timer], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        )
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def warm_start(code, runs):
+    """Time `code` re-executed in this process, as a Streamlit rerun does, in milliseconds."""
+    compiled = compile(code, "<page>", "exec")
+    exec(compiled, {})  # Pay the import cost once, like the first page load
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        exec(compiled, {})
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(label, timings):
+    print(f"{label:<14} median {statistics.median(timings):9.2f} ms   min {min(timings):9.2f} ms   runs {len(timings)}")
+
+
+if __name__ == "__main__":
+    os.chdir(PROJECT_ROOT)
+    cold_runs = int(os.getenv("COLD_RUNS", 5))
+    warm_runs = int(os.getenv("WARM_RUNS", 200))
+
+    print("Cold start (new process)")
+    summarize("  before", cold_start(BEFORE, cold_runs))
+    summarize("  after", cold_start(AFTER, cold_runs))
+
+    print("Warm start (page rerun)")
+    summarize("  before", warm_start(BEFORE, warm_runs))
+    summarize("  after", warm_start(AFTER, warm_runs))
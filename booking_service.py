@@ -0,0 +1,236 @@
+# Booking Service
+################################################################################
+
+# This file holds the booking flow of `hotel_reservation_app.py` (search -> select -> pin -> mint) as an
+# importable asyncio API, so reservations can be booked without a browser, and a command line entry point
+# that books every request in a CSV or JSON lines file concurrently:
+#
+#     python booking_service.py bookings.csv --concurrency 16 > results.jsonl
+#
+# Each input row needs city, checkin_date, checkout_date and owner (the wallet the reservation NFT is minted to).
+# Optional columns: adults_number, room_number, currency, hotel_name (book that hotel), max_price, min_score,
+# sender (account paying for the mint, the owner by default) and request_id. Results are printed as JSON lines
+# in the order they finish.
+
+################################################################################
+# Imports
+import os
+import sys
+import csv
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from dataclasses import dataclass, asdict, field
+from functions import get_location, search_all_hotels
+from pin_cache import pin_json
+from reservation_codec import encode_reservation
+from tx_pipeline import get_pipeline
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+BOOKING_CONCURRENCY = int(os.getenv("BOOKING_CONCURRENCY", 8))
+BOOKING_MAX_PAGES = int(os.getenv("BOOKING_MAX_PAGES", 10))
+MINT_GAS = 1000000
+
+################################################################################
+# Data classes
+
+@dataclass
+class BookingRequest:
+    city: str
+    checkin_date: str
+    checkout_date: str
+    owner: str
+    adults_number: int = 1
+    room_number: int = 1
+    currency: str = "USD"
+    hotel_name: str = None
+    max_price: float = None
+    min_score: float = None
+    sender: str = None
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a request from a CSV or JSON row, treating empty cells as missing."""
+        values = {key: value for key, value in row.items() if key in cls.__dataclass_fields__
+                  and value not in (None, "")}
+        for key in ("adults_number", "room_number"):
+            if key in values:
+                values[key] = int(values[key])
+        for key in ("max_price", "min_score"):
+            if key in values:
+                values[key] = float(values[key])
+        return cls(**values)
+
+
+@dataclass
+class BookingResult:
+    request_id: str
+    status: str
+    hotel_name: str = None
+    total_price: float = None
+    confirmation: str = None
+    token_uri: str = None
+    token_id: int = None
+    tx_hash: str = None
+    error: str = None
+    seconds: float = None
+
+################################################################################
+# Service
+
+class BookingService:
+    """Runs the search -> select -> pin -> mint flow for many bookings at once."""
+
+    def __init__(self, w3=None, contract=None, max_pages=BOOKING_MAX_PAGES):
+        if w3 is None or contract is None:
+            from contract_registry import get_web3, get_contract
+            w3, contract = w3 or get_web3(), contract or get_contract()
+        self.w3 = w3
+        self.contract = contract
+        self.max_pages = max_pages
+        self.pipeline = get_pipeline(w3)
+        # Group bookings repeat the same search; identical searches in flight share one task
+        self._searches = {}
+
+    async def search(self, city, checkin_date, checkout_date, adults_number=1, room_number=1, currency="USD"):
+        """Return every hotel for a stay as a typed table (see `hotel_table.parse_hotels`)."""
+        key = (city, str(checkin_date), str(checkout_date), str(adults_number), str(room_number), currency)
+        task = self._searches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self._search, *key))
+            self._searches[key] = task
+            task.add_done_callback(lambda done: self._searches.pop(key, None))
+        return await task
+
+    def _search(self, city, checkin_date, checkout_date, adults_number, room_number, currency):
+        from hotel_table import parse_hotels
+
+        destination_id = get_location(city)
+        pages = dict(search_all_hotels(destination_id, checkin_date, checkout_date, adults_number, room_number,
+                                       currency=currency, max_pages=self.max_pages))
+        # Join the pages back in page order to keep the popularity ordering
+        hotels = parse_hotels([pages[page_number] for page_number in sorted(pages)])
+        return hotels.dropna(subset=["Hotel Name"]).drop_duplicates(subset=["Hotel Name"])
+
+    @staticmethod
+    def select(hotels, hotel_name=None, max_price=None, min_score=None):
+        """Pick the named hotel, or else the cheapest one within the price and review score limits."""
+        from hotel_table import filter_hotels, rank_hotels
+
+        # Hotels the API returned without a price cannot be minted
+        hotels = hotels.dropna(subset=["Total Price"])
+        if hotel_name is not None:
+            hotels = hotels[hotels["Hotel Name"] == hotel_name]
+        hotels = rank_hotels(filter_hotels(hotels, max_price=max_price, min_score=min_score), top=1)
+        if hotels.empty:
+            return None
+        return hotels.iloc[0]
+
+    async def pin(self, hotel_name):
+        """Pin the reservation's token metadata and return its ipfs:// URI."""
+        ipfs_hash = await asyncio.to_thread(pin_json, {"name": hotel_name})
+        return f"ipfs://{ipfs_hash}"
+
+    async def mint(self, owner, hotel_name, checkin_date, checkout_date, confirmation, total_price, token_uri,
+                   sender=None):
+        """Register the reservation on chain; returns (token_id, receipt) once it is mined."""
+        function = self.contract.functions.registerHotelReservation(
+            owner,
+            *encode_reservation(hotel_name, checkin_date, checkout_date, confirmation, total_price),
+            token_uri,
+        )
+        receipt = await self.pipeline.submit_transact(function, {"from": sender or owner, "gas": MINT_GAS})
+        if receipt["status"] != 1:
+            raise RuntimeError(f"registerHotelReservation {receipt['transactionHash'].hex()} reverted")
+        transfers = self.contract.events.Transfer().processReceipt(receipt)
+        return transfers[0]["args"]["tokenId"], receipt
+
+    async def tokenize(self, owner, hotel_name, checkin_date, checkout_date, confirmation, total_price, sender=None):
+        """Pin and mint a reservation that has already been chosen; returns (token_id, receipt, token_uri)."""
+        token_uri = await self.pin(hotel_name)
+        token_id, receipt = await self.mint(owner, hotel_name, checkin_date, checkout_date, confirmation,
+                                            total_price, token_uri, sender=sender)
+        return token_id, receipt, token_uri
+
+    async def book(self, request):
+        """Run the whole flow for one request; failures are reported in the result rather than raised."""
+        start = time.perf_counter()
+        result = BookingResult(request.request_id, "failed")
+        try:
+            hotels = await self.search(request.city, request.checkin_date, request.checkout_date,
+                                       request.adults_number, request.room_number, request.currency)
+            hotel = self.select(hotels, request.hotel_name, request.max_price, request.min_score)
+            if hotel is None:
+                raise LookupError(f"No hotel in {request.city} matches the request")
+
+            result.hotel_name = str(hotel["Hotel Name"])
+            result.total_price = float(hotel["Total Price"])
+            result.confirmation = str(uuid.uuid4())
+            result.token_id, receipt, result.token_uri = await self.tokenize(
+                request.owner, result.hotel_name, request.checkin_date, request.checkout_date,
+                result.confirmation, result.total_price, sender=request.sender,
+            )
+            result.tx_hash = receipt["transactionHash"].hex()
+            result.status = "booked"
+        except Exception as error:
+            result.error = f"{type(error).__name__}: {error}"
+        result.seconds = round(time.perf_counter() - start, 3)
+        return result
+
+    async def book_many(self, requests, concurrency=BOOKING_CONCURRENCY):
+        """Book many requests with at most `concurrency` in progress; yields results as they finish."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(request):
+            async with semaphore:
+                return await self.book(request)
+
+        for finished in asyncio.as_completed([bounded(request) for request in requests]):
+            yield await finished
+
+################################################################################
+# Command line
+
+def read_requests(path):
+    """Read booking requests from a .csv file or a JSON lines file."""
+    with open(path, newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return [BookingRequest.from_row(row) for row in rows]
+
+
+async def run_bookings(requests, concurrency, out=sys.stdout):
+    service = BookingService()
+    booked = failed = 0
+    async for result in service.book_many(requests, concurrency):
+        out.write(json.dumps(asdict(result)) + "\n")
+        out.flush()
+        if result.status == "booked":
+            booked += 1
+        else:
+            failed += 1
+    return booked, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Book every reservation in a CSV or JSON lines file.")
+    parser.add_argument("path", help="bookings file (.csv, or JSON lines otherwise)")
+    parser.add_argument("--concurrency", type=int, default=BOOKING_CONCURRENCY,
+                        help="bookings in progress at once (default %(default)s)")
+    args = parser.parse_args()
+
+    booking_requests = read_requests(args.path)
+    start = time.perf_counter()
+    booked, failed = asyncio.run(run_bookings(booking_requests, args.concurrency))
+    print(f"Booked {booked} of {len(booking_requests)} reservations ({failed} failed) "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    sys.exit(1 if failed else 0)
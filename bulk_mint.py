@@ -0,0 +1,193 @@
+# Bulk Mint
+################################################################################
+
+# This file registers many hotel reservations at once through `registerHotelReservations`.
+# Metadata for every reservation is pinned together by the background pinner (its CID is known locally, so minting
+# does not wait on the uploads), the reservations are split into chunks that fit the block gas limit, the chunks are
+# sent one after another without waiting for each to be mined, and the minted token IDs come back in the same
+# order as the input. A chunk that fails or reverts is reported on its reservations instead of stopping the rest.
+
+################################################################################
+# Imports
+import os
+from dataclasses import dataclass
+from pin_cache import pinner, compute_cid, serialize_json
+from tx_pipeline import get_pipeline
+from reservation_codec import encode_reservation
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+# Share of the block gas limit a single chunk may use, leaving room for estimate drift
+BULK_MINT_GAS_SHARE = float(os.getenv("BULK_MINT_GAS_SHARE", 0.8))
+BULK_MINT_MAX_CHUNK = int(os.getenv("BULK_MINT_MAX_CHUNK", 100))
+
+# Chunk used to measure how much gas one reservation costs
+PROBE_CHUNK = 4
+
+################################################################################
+# Data classes
+
+@dataclass
+class Reservation:
+    owner: str
+    hotel_name: str
+    start_date: str
+    end_date: str
+    confirmation: str
+    hotel_room_value: int
+    token_uri: str = None
+
+
+@dataclass
+class MintResult:
+    index: int
+    token_id: int
+    tx_hash: str
+    gas_per_reservation: float
+    # Set, with token_id None, when the reservation's chunk was not minted
+    error: str = None
+
+################################################################################
+# Minting
+
+def reservation_metadata(reservation):
+    """Token metadata pinned for a reservation, the same document `BookingService.pin` pins."""
+    return {"name": reservation.hotel_name}
+
+
+class BulkMinter:
+    """Chunks, sends and collects `registerHotelReservations` transactions."""
+
+    def __init__(self, w3, contract, sender, gas_share=BULK_MINT_GAS_SHARE, max_chunk=BULK_MINT_MAX_CHUNK):
+        self.w3 = w3
+        self.contract = contract
+        self.sender = sender
+        self.max_chunk = max_chunk
+        self.gas_budget = int(w3.eth.get_block("latest")["gasLimit"] * gas_share)
+        self.pipeline = get_pipeline(w3)
+
+    def assign_token_uris(self, reservations, pin_metadata=True):
+        """Give every reservation an ipfs:// URI; with `pin_metadata`, upload the metadata in the background."""
+        missing = [reservation for reservation in reservations if reservation.token_uri is None]
+        if pin_metadata:
+            pinned = pinner.pin_many([reservation_metadata(reservation) for reservation in missing])
+            cids = [cid if cid is not None else future.result() for cid, future in pinned]
+        else:
+            cids = [compute_cid(serialize_json(reservation_metadata(reservation))) for reservation in missing]
+        for reservation, cid in zip(missing, cids):
+            reservation.token_uri = f"ipfs://{cid}"
+
+    def _function(self, chunk):
+        encoded = [
+            encode_reservation(reservation.hotel_name, reservation.start_date, reservation.end_date,
+                               reservation.confirmation, reservation.hotel_room_value)
+            for reservation in chunk
+        ]
+        hotel_names, start_dates, end_dates, confirmations, hotel_room_values = (list(column) for column in zip(*encoded))
+        return self.contract.functions.registerHotelReservations(
+            [reservation.owner for reservation in chunk],
+            hotel_names,
+            start_dates,
+            end_dates,
+            confirmations,
+            hotel_room_values,
+            [reservation.token_uri for reservation in chunk],
+        )
+
+    def _estimate(self, chunk):
+        return self._function(chunk).estimateGas({"from": self.sender})
+
+    def _fit(self, chunk):
+        """Halve `chunk` until its estimate fits the budget; returns (chunk, gas).
+
+        A chunk over the block gas limit makes the node's estimate fail rather than return a large number, so a
+        failed estimate also halves the chunk. A single reservation that cannot be estimated raises.
+        """
+        while True:
+            try:
+                gas = self._estimate(chunk)
+            except Exception:
+                if len(chunk) == 1:
+                    raise
+                gas = None
+            if gas is not None and (gas <= self.gas_budget or len(chunk) == 1):
+                return chunk, gas
+            chunk = chunk[:len(chunk) // 2]
+
+    def plan_chunks(self, reservations):
+        """Split reservations into chunks whose estimated gas fits the budget."""
+        probe, probe_gas = self._fit(reservations[:PROBE_CHUNK])
+        per_reservation = probe_gas / len(probe)
+        chunk_size = max(1, min(self.max_chunk, int(self.gas_budget // per_reservation)))
+
+        chunks, offset = [], 0
+        while offset < len(reservations):
+            # Long strings cost more than the probe suggested, so shrink until the chunk fits
+            chunk, gas = self._fit(reservations[offset:offset + chunk_size])
+            chunks.append((chunk, int(gas * 1.1)))
+            offset += len(chunk)
+        return chunks
+
+    def mint(self, reservations, pin_metadata=True):
+        """Mint every reservation and return a `MintResult` per reservation, in input order.
+
+        Reservations of a chunk that could not be sent or reverted get a result with `error` set.
+        """
+        reservations = list(reservations)
+        if not reservations:
+            return []
+        self.assign_token_uris(reservations, pin_metadata=pin_metadata)
+
+        # The node numbers the sender's transactions in the order they arrive, so each chunk is sent only once the
+        # previous one was accepted; mining still overlaps
+        submitted = []
+        for chunk, gas in self.plan_chunks(reservations):
+            pending = self.pipeline.submit_transact(self._function(chunk), {"from": self.sender, "gas": gas})
+            # Waits for the send without raising; a refused chunk is reported when the results are collected
+            pending.sent.exception()
+            submitted.append((chunk, pending))
+
+        results, index = [], 0
+        for chunk, pending in submitted:
+            results += self._collect(index, chunk, pending)
+            index += len(chunk)
+        return results
+
+    def _collect(self, index, chunk, pending):
+        try:
+            receipt = pending.receipt()
+        except Exception as error:
+            return self._failed(index, chunk, None, f"{type(error).__name__}: {error}")
+        tx_hash = receipt["transactionHash"].hex()
+        if receipt["status"] != 1:
+            return self._failed(index, chunk, tx_hash, f"Bulk mint transaction {tx_hash} reverted")
+
+        # Mint Transfer events are emitted in array order, so they line up with the chunk
+        transfers = self.contract.events.Transfer().processReceipt(receipt)
+        gas_per_reservation = receipt["gasUsed"] / len(chunk)
+        return [
+            MintResult(index + offset, transfer["args"]["tokenId"], tx_hash, gas_per_reservation)
+            for offset, transfer in enumerate(transfers)
+        ]
+
+    @staticmethod
+    def _failed(index, chunk, tx_hash, error):
+        return [MintResult(index + offset, None, tx_hash, 0.0, error=error) for offset in range(len(chunk))]
+
+
+def gas_report(results):
+    """Summarize gas use of a bulk mint; failed reservations are counted separately."""
+    failed = sum(result.error is not None for result in results)
+    results = [result for result in results if result.error is None]
+    if not results:
+        return {"reservations": 0, "transactions": 0, "gas_per_reservation": 0.0, "failed": failed}
+    transactions = {result.tx_hash for result in results}
+    return {
+        "reservations": len(results),
+        "transactions": len(transactions),
+        "gas_per_reservation": sum(result.gas_per_reservation for result in results) / len(results),
+        "failed": failed,
+    }
@@ -0,0 +1,106 @@
+# Contract Registry
+################################################################################
+
+# This file is the one place the Streamlit pages get their web3 providers, contract objects and local stores from.
+# Everything is created lazily on first use and then shared by the whole process, so a Streamlit rerun (which
+# re-executes the page script but not its imports) reuses them instead of rebuilding providers and re-parsing
+# the contract ABI. Heavy libraries (web3, pandas) are only imported when something actually needs them.
+
+################################################################################
+# Imports
+import os
+import json
+import threading
+from pathlib import Path
+from functools import lru_cache
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+CONTRACT_ABI_PATH = PROJECT_ROOT / "contracts" / "compiled" / "hotel_reservation_registry_abi.json"
+
+# Ganache wallet used for payments on the Secondary Market page
+GANACHE_URI = os.getenv("GANACHE_URI", "HTTP://127.0.0.1:7545")
+
+_lock = threading.RLock()
+
+################################################################################
+# Providers and contracts
+
+@lru_cache(maxsize=None)
+def load_abi(path=CONTRACT_ABI_PATH):
+    """Parse a contract ABI file once per process."""
+    with open(Path(path)) as f:
+        return json.load(f)
+
+
+def get_web3(uri=None):
+    """Return the shared Web3 instance for a provider URI (WEB3_PROVIDER_URI by default)."""
+    # Cached by the resolved URI, so the default and the same URI passed explicitly share one instance
+    return _web3_for(uri or os.getenv("WEB3_PROVIDER_URI"))
+
+
+@lru_cache(maxsize=None)
+def _web3_for(uri):
+    from web3 import Web3
+    from batch_rpc import BatchHTTPProvider
+    from metrics import install_web3
+
+    # Every JSON-RPC call is timed when metrics are enabled
+    return install_web3(Web3(BatchHTTPProvider(uri)))
+
+
+def get_wallet_web3():
+    """Return the shared Web3 instance connected to the Ganache wallet."""
+    return get_web3(GANACHE_URI)
+
+
+@lru_cache(maxsize=None)
+def get_contract(address=None, uri=None, abi_path=CONTRACT_ABI_PATH):
+    """Return the shared HotelReservationRegistry contract (SMART_CONTRACT_ADDRESS by default)."""
+    w3 = get_web3(uri)
+    return w3.eth.contract(address=address or os.getenv("SMART_CONTRACT_ADDRESS"), abi=load_abi(abi_path))
+
+################################################################################
+# Local stores
+
+_stores = {}
+
+
+def _shared(name, factory):
+    if name not in _stores:
+        with _lock:
+            if name not in _stores:
+                _stores[name] = factory()
+    return _stores[name]
+
+
+def get_reservation_store():
+    """Return the shared local mirror of minted reservations."""
+    def build():
+        from reservation_indexer import ReservationStore
+        return ReservationStore()
+    return _shared("reservations", build)
+
+
+def get_listing_store():
+    """Return the shared secondary market listing store, importing the legacy CSV the first time."""
+    def build():
+        from listing_store import ListingStore
+        store = ListingStore()
+        store.import_csv()
+        return store
+    return _shared("listings", build)
+
+
+def get_order_book():
+    """Return the shared secondary market order book, loaded from the listing store the first time."""
+    def build():
+        from order_book import OrderBook
+        book = OrderBook()
+        book.load(get_listing_store())
+        return book
+    return _shared("order_book", build)
@@ -1,4 +1,5 @@
 pragma solidity ^0.5.5;
+pragma experimental ABIEncoderV2; // needed for string[] parameters in registerHotelReservations
 
 import "https://github.com/OpenZeppelin/openzeppelin-contracts/blob/release-v2.5.0/contracts/token/ERC721/ERC721Full.sol";
 
@@ -7,32 +8,93 @@ contract HotelReservationRegistry is ERC721Full {
 
     struct HotelConfirmation {
         // Data class for Hotel reservation
+        // Everything after hotelName is packed into a single 32 byte storage slot (4 + 4 + 16 + 8 bytes)
 
         string hotelName;
-        string startDate;
-        string endDate;
-        string confirmation;
-        uint256 hotelRoomValue;
+        uint32 startDate; // days since 1970-01-01
+        uint32 endDate; // days since 1970-01-01
+        bytes16 confirmation; // confirmation UUID
+        uint64 hotelRoomValue;
     }
 
     mapping(uint256 => HotelConfirmation) public roomconfirmation; // data structure (dictionary) creation
 
+    uint256 private _nextTokenId; // next token ID to mint; unlike totalSupply() it never goes down when tokens are burned
+
     event Price(uint256 token_id, uint256 hotelRoomValue, string reportURI); // event function to record data as a log entry on the blockchain
 
-    event TerminationOfToken(uint256 token_id, string current_date); // event function to delete Token that has expired per the endDate
+    event TerminationOfToken(uint256 token_id, uint32 current_date); // event function to delete Token that has expired per the endDate
 
     function registerHotelReservation(
         // register hotel reservation and returns the newly minted token as a uint256
 
         address owner,
         string memory hotelName,
-        string memory startDate,
-        string memory endDate,
-        string memory confirmation,
-        uint256 hotelRoomValue,
+        uint32 startDate,
+        uint32 endDate,
+        bytes16 confirmation,
+        uint64 hotelRoomValue,
         string memory tokenURI // The URI to where the hotelreservation resides on the internet
     ) public returns (uint256) {
-        uint256 tokenId = totalSupply(); // the count of the number of tokens minted
+        return
+            _registerHotelReservation(
+                owner,
+                hotelName,
+                startDate,
+                endDate,
+                confirmation,
+                hotelRoomValue,
+                tokenURI
+            );
+    }
+
+    function registerHotelReservations(
+        // register a block of hotel reservations in one transaction; entry i of every array describes reservation i
+
+        address[] memory owners,
+        string[] memory hotelNames,
+        uint32[] memory startDates,
+        uint32[] memory endDates,
+        bytes16[] memory confirmations,
+        uint64[] memory hotelRoomValues,
+        string[] memory tokenURIs
+    ) public returns (uint256 firstTokenId) {
+        uint256 count = owners.length;
+        require(
+            hotelNames.length == count &&
+                startDates.length == count &&
+                endDates.length == count &&
+                confirmations.length == count &&
+                hotelRoomValues.length == count &&
+                tokenURIs.length == count,
+            "HotelReservationRegistry: array lengths differ"
+        );
+
+        firstTokenId = _nextTokenId; // token IDs are consecutive, starting here
+
+        for (uint256 i = 0; i < count; i++) {
+            _registerHotelReservation(
+                owners[i],
+                hotelNames[i],
+                startDates[i],
+                endDates[i],
+                confirmations[i],
+                hotelRoomValues[i],
+                tokenURIs[i]
+            );
+        }
+    }
+
+    function _registerHotelReservation(
+        address owner,
+        string memory hotelName,
+        uint32 startDate,
+        uint32 endDate,
+        bytes16 confirmation,
+        uint64 hotelRoomValue,
+        string memory tokenURI
+    ) internal returns (uint256) {
+        uint256 tokenId = _nextTokenId++; // a burned token's ID is never handed out again
 
         _mint(owner, tokenId); // minting hotelreservation NFT
 
@@ -56,14 +118,34 @@ contract HotelReservationRegistry is ERC721Full {
     ) public returns (uint256) {
         // function to update price of reservatoin
 
-        roomconfirmation[tokenId].hotelRoomValue = updatedRoomPrice; // updating the price of the NFT room reservation
+        require(updatedRoomPrice <= uint64(-1), "HotelReservationRegistry: price does not fit uint64");
+
+        roomconfirmation[tokenId].hotelRoomValue = uint64(updatedRoomPrice); // updating the price of the NFT room reservation
 
         emit Price(tokenId, updatedRoomPrice, reportURI); // event triggered by emit keyword
 
         return roomconfirmation[tokenId].hotelRoomValue;
     }
 
-    function TerminatingToken(uint256 tokenId, string memory current_date)
+    function terminateExpiredReservations(uint256[] memory tokenIds)
+        public
+        returns (uint256 terminated)
+    {
+        // burn every listed reservation whose endDate has passed; anyone may call this since expiry is a fact of the chain's clock
+        // tokens that no longer exist or have not expired yet are skipped, so a stale list never reverts the batch
+
+        uint32 today = uint32(now / 1 days);
+
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            uint256 tokenId = tokenIds[i];
+            if (_exists(tokenId) && roomconfirmation[tokenId].endDate < today) {
+                TerminatingToken(tokenId, today);
+                terminated++;
+            }
+        }
+    }
+
+    function TerminatingToken(uint256 tokenId, uint32 current_date)
         internal
     {
         roomconfirmation[tokenId].endDate = current_date;
@@ -5,38 +5,36 @@
 
 ################################################################################
 # Imports
-import os
-import requests
 from dotenv import load_dotenv
 load_dotenv()
-from bip44 import Wallet
-from web3 import Account
-from web3 import middleware
-from web3.gas_strategies.time_based import medium_gas_price_strategy
+from balance_service import get_balance_service
+from tx_pipeline import get_pipeline
+from wallet_keyring import get_keyring
 
 ################################################################################
 # Wallet functionality
 
-def generate_account():
+def generate_account(index=0):
     """Create a digital wallet and Ethereum account from a mnemonic seed phrase."""
-    # Fetch mnemonic from environment variable.
-    mnemonic = os.getenv("MNEMONIC")
+    # Fetch the account from the process-wide keyring, which derives it from the MNEMONIC only once
+    account = get_keyring().account(index)
 
-    # Create Wallet Object
-    wallet = Wallet(mnemonic)
+    return account
 
-    # Derive Ethereum Private Key
-    private, public = wallet.derive_account("eth")
 
-    # Convert private key into an Ethereum account
-    account = Account.privateKeyToAccount(private)
+def generate_accounts(count):
+    """Derive the first `count` accounts of the mnemonic seed phrase in one pass."""
+    return get_keyring().derive_many(count)
 
-    return account
+
+def find_account(address):
+    """Look up an already derived account by its address."""
+    return get_keyring().by_address(address)
 
 def get_balance(w3, address):
     """Using an Ethereum account address access the balance of Ether"""
-    # Get balance of address in Wei
-    wei_balance = w3.eth.get_balance(address)
+    # Get balance of address in Wei, cached until the next block
+    wei_balance = get_balance_service(w3).get_balance(address)
 
     # Convert Wei value to ether
     ether = w3.fromWei(wei_balance, "ether")
@@ -45,29 +43,30 @@ def get_balance(w3, address):
     return ether
 
 
+def get_balances(w3, addresses):
+    """Access the Ether balance of many addresses with batched JSON-RPC calls"""
+    # Get balances of all addresses in Wei, fetching only those not cached for the current block
+    wei_balances = get_balance_service(w3).get_balances(addresses)
+
+    # Convert Wei values to ether, keeping the order of the addresses
+    return [w3.fromWei(wei_balance, "ether") for wei_balance in wei_balances]
+
+
 def send_transaction(w3, account, to, wage):
     """Send an authorized transaction to the Ganache blockchain."""
-    # Set gas price strategy
-    w3.eth.setGasPriceStrategy(medium_gas_price_strategy)
-
-    # Convert eth amount to Wei
-    value = w3.toWei(wage, "ether")
-
-    # Calculate gas estimate
-    gasEstimate = w3.eth.estimateGas({"to": to, "from": account.address, "value": value})
-
-    # Construct a raw transaction
-    raw_tx = {
-        "to": to,
-        "from": account.address,
-        "value": value,
-        "gas": gasEstimate,
-        "gasPrice": 0,
-        "nonce": w3.eth.getTransactionCount(account.address)
-    }
-
-    # Sign the raw transaction with ethereum account
-    signed_tx = account.signTransaction(raw_tx)
-
-    # Send the signed transactions
-    return w3.eth.sendRawTransaction(signed_tx.rawTransaction)
+    # Nonce and gas come from the shared pipeline, so back to back payments never reuse a nonce
+    pipeline = get_pipeline(w3)
+
+    # Sign and send the transaction; the receipt is tracked in the background
+    pending = pipeline.submit_payment(account, to, wage)
+
+    # The sender's cached balance is stale as soon as the payment is sent
+    get_balance_service(w3).invalidate(account.address)
+
+    # Return the transaction hash once it has been sent
+    return pending.tx_hash
+
+
+def submit_transaction(w3, account, to, wage):
+    """Send a payment without blocking and return its `PendingTransaction` to await or attach callbacks to."""
+    return get_pipeline(w3).submit_payment(account, to, wage)
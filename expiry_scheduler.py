@@ -0,0 +1,167 @@
+# Expiry Scheduler
+################################################################################
+
+# This file burns reservation tokens whose stay is over. Live tokens are kept in a min-heap keyed by end date,
+# filled from the local reservation index (`reservation_indexer.py`), so finding what has expired only looks
+# at the front of the heap. Expired tokens are terminated through `terminateExpiredReservations` in batches
+# sized to fit the block gas limit, and their secondary market listings are removed.
+#
+# Run next to the indexer with:  python expiry_scheduler.py  (add --once for a single pass, e.g. from cron)
+
+################################################################################
+# Imports
+import os
+import sys
+import time
+import heapq
+import logging
+import datetime
+from reservation_codec import encode_date
+from tx_pipeline import get_pipeline
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+EXPIRY_POLL_INTERVAL = float(os.getenv("EXPIRY_POLL_INTERVAL", 3600))
+# Share of the block gas limit one terminate batch may use
+EXPIRY_GAS_SHARE = float(os.getenv("EXPIRY_GAS_SHARE", 0.5))
+EXPIRY_MAX_BATCH = int(os.getenv("EXPIRY_MAX_BATCH", 200))
+
+# Batch used to measure how much gas one termination costs
+PROBE_BATCH = 4
+
+logger = logging.getLogger(__name__)
+
+################################################################################
+# Scheduler
+
+class ExpiryScheduler:
+    """Min-heap of (end day, token ID) over the live tokens, and the batched burns that empty it."""
+
+    def __init__(self, w3, contract, reservation_store, listing_store, sender=None, gas_share=EXPIRY_GAS_SHARE,
+                 max_batch=EXPIRY_MAX_BATCH):
+        self.w3 = w3
+        self.contract = contract
+        self.reservation_store = reservation_store
+        self.listing_store = listing_store
+        self.sender = sender or os.getenv("EXPIRY_SENDER_ADDRESS") or w3.eth.accounts[0]
+        self.gas_share = gas_share
+        self.max_batch = max_batch
+        self.pipeline = get_pipeline(w3)
+        self._heap = []
+        self._last_token_id = -1
+
+    def refresh(self):
+        """Push tokens indexed since the last refresh; token IDs only grow, so this is incremental."""
+        for token_id, end_date in self.reservation_store.expiries_after(self._last_token_id):
+            heapq.heappush(self._heap, (encode_date(end_date), token_id))
+            self._last_token_id = max(self._last_token_id, token_id)
+        return len(self._heap)
+
+    def due(self, today=None):
+        """Pop every token whose end date is before `today` and is still live in the index."""
+        today = encode_date(today or datetime.datetime.utcnow().date())
+        expired = []
+        while self._heap and self._heap[0][0] < today:
+            end_day, token_id = heapq.heappop(self._heap)
+            # Entries are never updated in place; skip ones the index says were burned or changed since
+            end_date = self.reservation_store.live_end_date(token_id)
+            if end_date is not None and encode_date(end_date) == end_day:
+                expired.append(token_id)
+        return expired
+
+    def _function(self, token_ids):
+        return self.contract.functions.terminateExpiredReservations(list(token_ids))
+
+    def plan_batches(self, token_ids):
+        """Split token IDs into batches whose estimated gas fits the budget; returns [(batch, gas limit)]."""
+        budget = int(self.w3.eth.get_block("latest")["gasLimit"] * self.gas_share)
+        probe = token_ids[:PROBE_BATCH]
+        per_token = self._function(probe).estimateGas({"from": self.sender}) / len(probe)
+        batch_size = max(1, min(self.max_batch, int(budget // per_token)))
+
+        batches, offset = [], 0
+        while offset < len(token_ids):
+            batch = token_ids[offset:offset + batch_size]
+            gas = self._function(batch).estimateGas({"from": self.sender})
+            # Tokens with long owner lists cost more to remove from the enumerations, so shrink until it fits
+            while gas > budget and len(batch) > 1:
+                batch = batch[:len(batch) // 2]
+                gas = self._function(batch).estimateGas({"from": self.sender})
+            batches.append((batch, int(gas * 1.2)))
+            offset += len(batch)
+        return batches
+
+    def terminate(self, token_ids):
+        """Burn the given expired tokens and delist them; returns the IDs that were burned.
+
+        A batch that cannot be planned, sent or mined is logged and left out; its tokens are not in the result.
+        """
+        if not token_ids:
+            return []
+        try:
+            batches = self.plan_batches(token_ids)
+        except Exception:
+            logger.exception("Estimating gas to terminate %d tokens failed", len(token_ids))
+            return []
+        submitted = [
+            (batch, self.pipeline.submit_transact(self._function(batch), {"from": self.sender, "gas": gas}))
+            for batch, gas in batches
+        ]
+
+        burned = []
+        for batch, pending in submitted:
+            try:
+                receipt = pending.receipt()
+            except Exception:
+                logger.exception("Terminating %d tokens failed", len(batch))
+                continue
+            if receipt["status"] != 1:
+                logger.warning("Terminating %d tokens reverted in %s", len(batch), receipt["transactionHash"].hex())
+                continue
+            terminations = self.contract.events.TerminationOfToken().processReceipt(receipt)
+            burned.extend(event["args"]["token_id"] for event in terminations)
+
+        # A burned reservation can no longer be sold
+        if burned:
+            self.listing_store.remove_listings(burned)
+        return burned
+
+    def run_once(self, today=None):
+        self.refresh()
+        expired = self.due(today)
+        burned = []
+        try:
+            burned = self.terminate(expired)
+        finally:
+            # The chain's clock may lag ours, or a batch may have failed; try those tokens again next time
+            for token_id in set(expired) - set(burned):
+                end_date = self.reservation_store.live_end_date(token_id)
+                if end_date is not None:
+                    heapq.heappush(self._heap, (encode_date(end_date), token_id))
+        return burned
+
+    def run_forever(self, poll_interval=EXPIRY_POLL_INTERVAL):
+        while True:
+            try:
+                burned = self.run_once()
+            except Exception:
+                # e.g. the node or the index is briefly unreachable; the heap is kept for the next pass
+                logger.exception("Expiry pass failed")
+            else:
+                if burned:
+                    logger.info("Terminated %d expired reservations", len(burned))
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from contract_registry import get_web3, get_contract, get_reservation_store, get_listing_store
+
+    scheduler = ExpiryScheduler(get_web3(), get_contract(), get_reservation_store(), get_listing_store())
+    if "--once" in sys.argv[1:]:
+        print(f"Terminated {len(scheduler.run_once())} expired reservations")
+    else:
+        scheduler.run_forever()
@@ -0,0 +1,161 @@
+# Fan-out Hotel Search
+################################################################################
+
+# This file compares stays across several cities and date windows in one call. Each city's destination id is
+# resolved once, then every (city, date window) search runs concurrently on a thread pool. Results are merged
+# into one ranked hotel table as each search finishes, so a caller can show the best stays found so far.
+#
+# Requests to Booking.com go through the machine-wide token bucket set up in `functions.py` (`rate_limiter.py`),
+# so a wide sweep queues for the RapidAPI quota instead of being throttled; cached searches cost no tokens.
+#
+#     python fanout_search.py Toronto Montreal Vancouver --checkin 2026-11-06 --nights 2 --days 7 --top 20
+
+################################################################################
+# Imports
+import os
+import time
+import datetime
+import argparse
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from functions import get_location, search_all_hotels
+from hotel_table import parse_hotels, rank_hotels, empty_hotel_table
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", 8))
+# Pages fetched per search; the first page holds the most popular hotels
+FANOUT_MAX_PAGES = int(os.getenv("FANOUT_MAX_PAGES", 1))
+
+STAY_COLUMNS = ["City", "Check In", "Check Out"]
+
+################################################################################
+# Results
+
+@dataclass
+class StayResult:
+    city: str
+    checkin_date: str
+    checkout_date: str
+    hotels: pd.DataFrame = None
+    error: str = None
+
+
+def date_windows(first_checkin, nights, days):
+    """(check in, check out) for `days` consecutive check in dates, each stay `nights` long."""
+    first_checkin = datetime.date.fromisoformat(str(first_checkin))
+    return [
+        ((first_checkin + datetime.timedelta(days=day)).isoformat(),
+         (first_checkin + datetime.timedelta(days=day + nights)).isoformat())
+        for day in range(days)
+    ]
+
+
+class RankedResults:
+    """One hotel table over every finished search, re-ranked as each search is added."""
+
+    def __init__(self, by="Total Price", ascending=True, top=None):
+        self.by = by
+        self.ascending = ascending
+        self.top = top
+        empty = empty_hotel_table()
+        self.table = empty.reindex(columns=STAY_COLUMNS + list(empty.columns))
+        self.failures = []
+
+    def add(self, result):
+        if result.error is not None:
+            self.failures.append(result)
+            return self.table
+        hotels = result.hotels.copy()
+        hotels.insert(0, "City", result.city)
+        hotels.insert(1, "Check In", result.checkin_date)
+        hotels.insert(2, "Check Out", result.checkout_date)
+        # With `top`, only the best rows are kept, so merging stays cheap however many searches arrive
+        merged = pd.concat([self.table, hotels], ignore_index=True) if len(self.table) else hotels
+        self.table = rank_hotels(merged, by=self.by, ascending=self.ascending, top=self.top).reset_index(drop=True)
+        return self.table
+
+################################################################################
+# Fan-out
+
+def _search_stay(city, destination_id, checkin_date, checkout_date, adults_number, room_number, currency, max_pages):
+    try:
+        pages = dict(search_all_hotels(destination_id, checkin_date, checkout_date, adults_number, room_number,
+                                       currency=currency, max_pages=max_pages, max_workers=1))
+        hotels = parse_hotels([pages[page_number] for page_number in sorted(pages)])
+        return StayResult(city, checkin_date, checkout_date, hotels=hotels)
+    except Exception as error:
+        return StayResult(city, checkin_date, checkout_date, error=f"{type(error).__name__}: {error}")
+
+
+def fan_out_search(cities, windows, adults_number=1, room_number=1, currency="USD", max_pages=FANOUT_MAX_PAGES,
+                   max_workers=FANOUT_WORKERS):
+    """Search every city for every (check in, check out) window, yielding a StayResult as each one finishes.
+
+    A failed search (or a city that cannot be resolved) is yielded with `error` set instead of raising.
+    """
+    cities = list(dict.fromkeys(cities))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Resolve each city once, however many date windows it is searched for; a city's searches start as soon
+        # as it resolves, while other cities are still being resolved
+        locations = {executor.submit(get_location, city): city for city in cities}
+        pending = set(locations)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future not in locations:
+                    yield future.result()
+                    continue
+                city = locations[future]
+                try:
+                    destination_id = future.result()
+                except Exception as error:
+                    for checkin_date, checkout_date in windows:
+                        yield StayResult(city, checkin_date, checkout_date, error=f"{type(error).__name__}: {error}")
+                    continue
+                pending.update(
+                    executor.submit(_search_stay, city, destination_id, checkin_date, checkout_date, adults_number,
+                                    room_number, currency, max_pages)
+                    for checkin_date, checkout_date in windows
+                )
+
+def search(cities, windows, adults_number=1, room_number=1, currency="USD", by="Total Price", ascending=True,
+           top=None, max_pages=FANOUT_MAX_PAGES, max_workers=FANOUT_WORKERS, on_result=None):
+    """Run a fan-out search and return the merged RankedResults.
+
+    `on_result(result, ranked)` is called after each search is merged, e.g. to redraw a table as results arrive.
+    """
+    ranked = RankedResults(by=by, ascending=ascending, top=top)
+    for result in fan_out_search(cities, windows, adults_number, room_number, currency, max_pages, max_workers):
+        ranked.add(result)
+        if on_result is not None:
+            on_result(result, ranked)
+    return ranked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the cheapest stays across cities and check in dates.")
+    parser.add_argument("cities", nargs="+")
+    parser.add_argument("--checkin", required=True, help="first check in date (YYYY-MM-DD)")
+    parser.add_argument("--nights", type=int, default=1)
+    parser.add_argument("--days", type=int, default=1, help="consecutive check in dates to try")
+    parser.add_argument("--adults", type=int, default=1)
+    parser.add_argument("--rooms", type=int, default=1)
+    parser.add_argument("--currency", default="USD")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=FANOUT_WORKERS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = search(args.cities, date_windows(args.checkin, args.nights, args.days), args.adults, args.rooms,
+                     args.currency, top=args.top, max_workers=args.workers)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(results.table.to_string(index=False))
+    for failure in results.failures:
+        print(f"{failure.city} {failure.checkin_date}: {failure.error}")
+    print(f"{len(args.cities) * args.days} searches in {time.perf_counter() - start:.1f}s "
+          f"({len(results.failures)} failed)")
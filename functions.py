@@ -1,37 +1,82 @@
-import pandas as pd
-import json
-import requests
+from http_client import http
+from metrics import timed, record_cache
 from dotenv import load_dotenv
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from api_cache import api_cache, make_key, MISSING, LOCATION_CACHE_TTL, HOTEL_CACHE_TTL
+from rate_limiter import booking_rate_limiter
 
 # Load dotenv file
 
 load_dotenv()
 booking_api_key = os.getenv('API_KEY')
+# Base URL of the Booking.com API, overridable to point at a local stand-in (see benchmarks/fake_services.py)
+booking_api_url = os.getenv('BOOKING_API_URL', "https://booking-com.p.rapidapi.com").rstrip("/")
 headers = {
 "X-RapidAPI-Key": booking_api_key,
 "X-RapidAPI-Host": "booking-com.p.rapidapi.com"
 }
+# Every Booking.com request from any thread or process on this machine shares the RapidAPI quota
+http.set_rate_limiter("booking", booking_rate_limiter())
 
 
+class BookingAPIError(RuntimeError):
+    """The Booking.com API answered with an error payload (e.g. a RapidAPI quota message) instead of results."""
+
+
+def api_error_message(payload):
+    """Best effort human readable message from an error payload."""
+    if isinstance(payload, dict):
+        for key in ("message", "detail", "error", "errors"):
+            if payload.get(key):
+                return str(payload[key])
+    return str(payload)[:200]
+
+
+@timed("booking.location")
 def get_location(city):
-    location_search_url = "https://booking-com.p.rapidapi.com/v1/hotels/locations"
+    # Serve the destination id from the cache when this city was already resolved
+    cache_key = make_key(city=city)
+    destination_id = api_cache.get("location", cache_key)
+    record_cache("booking.location", destination_id is not MISSING)
+    if destination_id is not MISSING:
+        return destination_id
+
+    location_search_url = f"{booking_api_url}/v1/hotels/locations"
     location_querystring = {
     "locale":"en-gb",
     "name":city
     }
 
-    location_response = requests.request("GET", url=location_search_url, headers=headers, params=location_querystring)
+    location_response = http.get(location_search_url, endpoint="booking", headers=headers, params=location_querystring)
 
     # Obtain Destination Id
     location_data = location_response.json()
     destination_id = location_data[0]['dest_id']
 
+    api_cache.set("location", cache_key, destination_id, LOCATION_CACHE_TTL)
+
     return destination_id
 
 
-def get_hotels(destination_id, checkin_date, checkout_date, adults_number, room_number):
-    hotel_search_url = "https://booking-com.p.rapidapi.com/v1/hotels/search"
+@timed("booking.hotels")
+def get_hotels(destination_id, checkin_date, checkout_date, adults_number, room_number, currency="USD", page_number=0):
+    # Serve the search results from the cache when the same query was made recently
+    cache_key = make_key(
+        dest_id=destination_id,
+        checkin_date=checkin_date,
+        checkout_date=checkout_date,
+        adults_number=adults_number,
+        room_number=room_number,
+        currency=currency,
+        page_number=page_number,
+    )
+    hotel_data = api_cache.get("hotels", cache_key)
+    record_cache("booking.hotels", hotel_data is not MISSING)
+    if hotel_data is not MISSING:
+        return hotel_data
+
+    hotel_search_url = f"{booking_api_url}/v1/hotels/search"
 
     hotel_search_querystring = {
     "checkin_date":checkin_date,
@@ -42,17 +87,94 @@ def get_hotels(destination_id, checkin_date, checkout_date, adults_number, room_
     "locale":"en-gb",
     "adults_number":adults_number,
     "order_by":"popularity",
-    "filter_by_currency":"USD",
+    "filter_by_currency":currency,
     "room_number":room_number,
-    "include_adjacency":"true"
+    "include_adjacency":"true",
+    "page_number":page_number
     }
 
-    hotel_response = requests.request("GET", url = hotel_search_url, headers = headers, params = hotel_search_querystring)
+    hotel_response = http.get(hotel_search_url, endpoint="booking", headers = headers, params = hotel_search_querystring)
+    hotel_data = hotel_response.json()
+
+    # Only cache real search results, never an error payload
+    if 'result' in hotel_data:
+        api_cache.set("hotels", cache_key, hotel_data, HOTEL_CACHE_TTL)
+        # Every fresh quote also goes into the price history used for fair values (opened on first use)
+        from price_history import price_history
+        price_history.record_quotes(hotel_data, checkin_date, currency)
+
+    return hotel_data
+
+def search_all_hotels(destination_id, checkin_date, checkout_date, adults_number, room_number, currency="USD",
+                      max_pages=None, max_results=None, max_workers=4):
+    """Fetch every page of a hotel search concurrently, yielding (page_number, hotel_data) as pages arrive.
+
+    The first page is always yielded first so a caller can render it while the rest load. Later pages
+    arrive in completion order, so sort on page_number to keep the popularity ordering.
+    """
+    search = (destination_id, checkin_date, checkout_date, adults_number, room_number, currency)
+
+    # The first page tells us the page size and how many results there are in total
+    first_page = get_hotels(*search, page_number=0)
+    if not isinstance(first_page, dict) or 'result' not in first_page:
+        raise BookingAPIError(f"Hotel search failed: {api_error_message(first_page)}")
+    page_results = first_page['result'] or []
+    if max_results is not None:
+        first_page = dict(first_page, result=page_results[:max_results])
+    yield 0, first_page
+
+    page_size = len(page_results)
+    results_seen = min(page_size, max_results) if max_results is not None else page_size
+    if page_size == 0 or (max_results is not None and results_seen >= max_results):
+        return
+
+    total_count = first_page.get('count')
+    if total_count is not None:
+        last_page = -(-int(total_count) // page_size)
+    else:
+        # Without a total, keep probing until a short page comes back
+        last_page = None
+
+    def page_limit():
+        limits = [limit for limit in (last_page, max_pages) if limit is not None]
+        if max_results is not None:
+            limits.append(-(-max_results // page_size))
+        return min(limits) if limits else None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        next_page = 1
+        exhausted = False
+        while True:
+            # Keep at most max_workers pages in flight
+            limit = page_limit()
+            while not exhausted and len(pending) < max_workers and (limit is None or next_page < limit):
+                pending[executor.submit(get_hotels, *search, page_number=next_page)] = next_page
+                next_page += 1
+            if not pending:
+                return
+
+            future = next(as_completed(pending))
+            page_number = pending.pop(future)
+            hotel_data = future.result()
+            page_results = hotel_data.get('result', [])
+
+            if len(page_results) < page_size:
+                exhausted = True
+                last_page = page_number + 1 if last_page is None else min(last_page, page_number + 1)
+
+            if max_results is not None:
+                page_results = page_results[:max_results - results_seen]
+                hotel_data = dict(hotel_data, result=page_results)
+            results_seen += len(page_results)
+            yield page_number, hotel_data
 
-    return hotel_response
+            if max_results is not None and results_seen >= max_results:
+                for leftover in pending:
+                    leftover.cancel()
+                return
 
 # TAO:
-# Take the get_hotels function and input all the information as depicted by the booking. Then you will need to use the following line of code
-# to parse out the price you're looking for:
-# hotel_data = hotel_response.json()
+# Take the get_hotels function and input all the information as depicted by the booking. It returns the parsed json, so you
+# can parse out the price you're looking for with the following line of code:
 # hotel_data['result'][i]['price_breakdown']['all_inclusive_price']
\ No newline at end of file
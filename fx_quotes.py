@@ -0,0 +1,197 @@
+# FX Quotes
+################################################################################
+
+# This file provides USD/ETH exchange rates for the secondary market, where listings are priced in ETH but
+# reservations were bought (and are stored on chain) in USD. Rates come from a pluggable source - CoinGecko by
+# default, or a local fixture for tests and offline runs - and are cached in memory with a time to live.
+# Once a rate is older than the TTL it is still served while one background thread fetches a new one, so a page
+# never waits on the network unless there is no usable rate at all. When even that fetch fails, the failure is
+# remembered for FX_FAILURE_BACKOFF seconds, so reruns during an outage fail at once instead of waiting again.
+#
+# Conversions take a single number or a whole pandas column / numpy array and multiply by one rate, so a listing
+# table of any size is converted in one vectorized step.
+
+################################################################################
+# Imports
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass
+import metrics
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+# "coingecko", or "fixture" to read rates from FX_FIXTURE_PATH (or FX_FIXTURE_ETH_USD) without the network
+FX_SOURCE = os.getenv("FX_SOURCE", "coingecko")
+FX_API_URL = os.getenv("FX_API_URL", "https://api.coingecko.com/api/v3")
+FX_FIXTURE_PATH = os.getenv("FX_FIXTURE_PATH")
+FX_FIXTURE_ETH_USD = float(os.getenv("FX_FIXTURE_ETH_USD", 1500))
+
+# Rates younger than the TTL are served as is; older ones are served while a refresh runs, up to FX_MAX_STALE
+FX_QUOTE_TTL = float(os.getenv("FX_QUOTE_TTL", 60))
+FX_MAX_STALE = float(os.getenv("FX_MAX_STALE", 60 * 60))
+# How long a failed fetch without any usable rate is reported again instead of retried
+FX_FAILURE_BACKOFF = float(os.getenv("FX_FAILURE_BACKOFF", 30))
+
+# CoinGecko ids of the assets we quote
+COINGECKO_IDS = {"ETH": "ethereum"}
+
+################################################################################
+# Sources
+
+class CoinGeckoSource:
+    """Spot rates from the CoinGecko simple price API."""
+
+    name = "coingecko"
+
+    def __init__(self, api_url=FX_API_URL):
+        self.api_url = api_url
+
+    @metrics.timed("fx.coingecko")
+    def fetch(self, base, quote):
+        from http_client import http
+
+        coin = COINGECKO_IDS[base]
+        # No retries: a failed refresh is simply tried again on a later lookup
+        response = http.get(f"{self.api_url}/simple/price", endpoint="fx", max_retries=0,
+                            params={"ids": coin, "vs_currencies": quote.lower()})
+        response.raise_for_status()
+        return float(response.json()[coin][quote.lower()])
+
+
+class FixtureSource:
+    """Fixed rates from a dict or a JSON file such as {"ETH/USD": 1500}."""
+
+    name = "fixture"
+
+    def __init__(self, rates=None, path=FX_FIXTURE_PATH):
+        if rates is None and path:
+            with open(path) as f:
+                rates = json.load(f)
+        self.rates = {key.upper(): float(rate) for key, rate in (rates or {"ETH/USD": FX_FIXTURE_ETH_USD}).items()}
+
+    def fetch(self, base, quote):
+        return self.rates[f"{base}/{quote}".upper()]
+
+
+SOURCES = {"coingecko": CoinGeckoSource, "fixture": FixtureSource}
+
+################################################################################
+# Quote service
+
+@dataclass
+class Quote:
+    base: str
+    quote: str
+    rate: float
+    fetched_at: float
+    source: str
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class QuoteService:
+    """TTL cache of exchange rates that serves stale rates while refreshing them in the background."""
+
+    def __init__(self, source=None, ttl=FX_QUOTE_TTL, max_stale=FX_MAX_STALE, failure_backoff=FX_FAILURE_BACKOFF):
+        self.source = source or SOURCES[FX_SOURCE]()
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.failure_backoff = failure_backoff
+        self._quotes = {}
+        self._failures = {}  # (base, quote) -> (error, failed_at) of the last fetch with nothing cached
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _fetch(self, base, quote):
+        fetched = Quote(base, quote, self.source.fetch(base, quote), time.time(), self.source.name)
+        with self._lock:
+            self._quotes[(base, quote)] = fetched
+        return fetched
+
+    def _refresh_in_background(self, base, quote):
+        def refresh():
+            try:
+                self._fetch(base, quote)
+            except Exception as error:
+                # Keep serving the stale rate; the next lookup after this one tries again
+                metrics.record_error("fx.refresh", type(error).__name__)
+            finally:
+                with self._lock:
+                    self._refreshing.discard((base, quote))
+
+        with self._lock:
+            # One refresh per pair at a time, however many lookups hit the stale rate
+            if (base, quote) in self._refreshing:
+                return
+            self._refreshing.add((base, quote))
+        threading.Thread(target=refresh, name=f"fx-refresh-{base}-{quote}", daemon=True).start()
+
+    def get_quote(self, base="ETH", quote="USD"):
+        """Return the Quote for a pair, fetching synchronously only when no usable rate is cached."""
+        base, quote = base.upper(), quote.upper()
+        with self._lock:
+            cached = self._quotes.get((base, quote))
+        if cached is not None and cached.age < self.ttl:
+            metrics.record_cache("fx", True)
+            return cached
+        if cached is not None and cached.age < self.max_stale:
+            metrics.record_cache("fx", True)
+            self._refresh_in_background(base, quote)
+            return cached
+        metrics.record_cache("fx", False)
+        with self._lock:
+            failure = self._failures.get((base, quote))
+        if failure is not None and time.time() - failure[1] < self.failure_backoff:
+            raise failure[0]
+        try:
+            fetched = self._fetch(base, quote)
+        except Exception as error:
+            metrics.record_error("fx.fetch", type(error).__name__)
+            with self._lock:
+                self._failures[(base, quote)] = (error, time.time())
+            raise
+        with self._lock:
+            self._failures.pop((base, quote), None)
+        return fetched
+
+    def rate(self, base="ETH", quote="USD"):
+        return self.get_quote(base, quote).rate
+
+    # Conversions work on numbers, numpy arrays and pandas columns alike
+
+    def eth_to_usd(self, amount):
+        return amount * self.rate("ETH", "USD")
+
+    def usd_to_eth(self, amount):
+        return amount / self.rate("ETH", "USD")
+
+    def add_currency_columns(self, df, usd_column="purchase price (Usd)", eth_column="price listed (Eth)"):
+        """Return a copy of a listing table with each price column also shown in the other currency."""
+        rate = self.rate("ETH", "USD")
+        df = df.copy()
+        if usd_column in df:
+            df[usd_column.replace("(Usd)", "(Eth)")] = df[usd_column].astype(float) / rate
+        if eth_column in df:
+            df[eth_column.replace("(Eth)", "(Usd)")] = df[eth_column].astype(float) * rate
+        return df
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_quote_service():
+    """Return the process wide quote service for the configured source."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = QuoteService()
+    return _service
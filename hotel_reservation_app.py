@@ -1,59 +1,30 @@
 # Import required libraries
-import os
-import json
-from web3 import Web3
-from pathlib import Path
-from dotenv import load_dotenv
 import streamlit as st
-import time
-import pandas as pd
 import uuid
+import asyncio
 
 # Import helper and pinata functions
-from pinata import pin_json_to_ipfs, convert_data_to_json
-from functions import get_location, get_hotels
+from pin_cache import pin_json
+from functions import get_location, search_all_hotels, BookingAPIError
+from booking_service import BookingService
+from contract_registry import get_web3, get_contract
+import metrics
 
-load_dotenv()
+# Shared instance of web3.py for communication to the Blockchain smart contract (created once per process)
+w3 = get_web3()
 
-# Create instance of web3.py for communication to the Blockchain smart contract
-w3 = Web3(Web3.HTTPProvider(os.getenv("WEB3_PROVIDER_URI")))
+# Load the contract; the ABI is parsed once per process
+contract = get_contract()
 
+# Pins and mints reservations; the same service is used by the bulk booking command line
+booking_service = BookingService(w3, contract)
 
-@st.cache(allow_output_mutation=True)
-def load_contract():
-
-    # Load the contract ABI
-    with open(Path("./contracts/compiled/hotel_reservation_registry_abi.json")) as f:
-        contract_abi = json.load(f)
-
-    # Set the contract address (this is the address of the deployed contract)
-    contract_address = os.getenv("SMART_CONTRACT_ADDRESS")
-
-    # Calling the contract
-    contract = w3.eth.contract(address=contract_address, abi=contract_abi)
-
-    return contract
-
-
-contract = load_contract()
-
-# Helper functions to pin files and json to Pinata
-
-
-def pin_hotel_reservation(hotel_name):
-    # Build a token metadata file for the Hotel Reservation
-    token_json = {"name": hotel_name}
-    json_data = convert_data_to_json(token_json)
-
-    # Pin the json to IPFS with Pinata
-    json_ipfs_hash = pin_json_to_ipfs(json_data)
-
-    return json_ipfs_hash
-
+# Serve Prometheus metrics for the external calls (only when METRICS_ENABLED is set; started once per process)
+metrics.start_exporter()
 
+# Helper function to pin json to Pinata
 def pin_historical_price_report(report_content):
-    json_report = convert_data_to_json(report_content)
-    report_ipfs_hash = pin_json_to_ipfs(json_report)
+    report_ipfs_hash = pin_json(report_content)
     return report_ipfs_hash
 
 
@@ -80,11 +51,10 @@ add_bg_from_url()
 ### SECTION TO SET RESERVATION DETAILS ### 
 st.title("Hotel Reservation NFT System")
 
-# Create blank dataframes for Streamlit
+# Create blank values for Streamlit
 selectable_hotel_dict = {}
 chosen_total_price = 0
-d = {'Hotel Name': ['name'], 'Average Price': [0], 'Total Price': [0]}
-hotel_price_df = pd.DataFrame(data=d, columns=['Hotel Name', 'Average Price', 'Total Price'])
+hotel_price_df = None
 
 # Room input details
 city = st.text_input('Which city would you like to search?')                    # Set city variable
@@ -113,36 +83,35 @@ if st.checkbox('Set Location'):
     destination_id = get_location(city)
 
 
-# Search hotels
+# Search hotels across every results page, showing progress as the pages arrive
 if st.checkbox('Search'):
-    hotel_response = get_hotels(destination_id, checkin_date, checkout_date, adults_number, room_number)
+    hotel_pages = {}
+    search_progress = st.empty()
+    try:
+        for page_number, page_data in search_all_hotels(destination_id, checkin_date, checkout_date, adults_number, room_number, max_pages=10):
+            hotel_pages[page_number] = page_data.get('result', [])
+            search_progress.markdown(f'_Loaded {sum(len(page) for page in hotel_pages.values())} hotels_')
+    except BookingAPIError as error:
+        # e.g. the RapidAPI quota is used up
+        st.error(str(error))
+        st.stop()
+
+    # Keep the popularity ordering by joining the pages back in page order
+    hotel_data = {'result': [hotel for page_number in sorted(hotel_pages) for hotel in hotel_pages[page_number]]}
 
 
 # Checkbox to display the dataframe
 if st.checkbox('Display Dataframe'):
-    hotel_data = hotel_response.json()
-    # Create empty lists for json values to be populated in
-    hotel_list = []
-    total_price_list = []
-    average_price_list = []
-    picklist_label = []
-
-    # Loop through all queried hotels in a given page to populate the values in the lists
-    i = 0
-    while i < 20:
-        hotel_list.append(hotel_data['result'][i]['hotel_name'])
-        total_price_list.append(hotel_data['result'][i]['price_breakdown']['all_inclusive_price'])
-        average_price_list.append(hotel_data['result'][i]['composite_price_breakdown']['gross_amount_per_night']['value'])
-        picklist_label.append(hotel_data['result'][i]['hotel_name'] + ' - $' + str(round(hotel_data['result'][i]['composite_price_breakdown']['gross_amount_per_night']['value'],2)) + ' per night - $' + str(round(hotel_data['result'][i]['price_breakdown']['all_inclusive_price'],2)) + ' total cost')
-        i += 1
-
-    # Create the final hotel list as a list of lists
-    final_hotel_list = [hotel_list, average_price_list, total_price_list]
-    selectable_hotel_dict = dict(zip(hotel_list, picklist_label))
-
-    # Create the hotel price dataframe
-    hotel_price_df = pd.DataFrame(final_hotel_list).transpose()
-    hotel_price_df.columns = ['Hotel Name', 'Average Price', 'Total Price']
+    # Imported here so pandas is only loaded once there is something to display
+    from hotel_table import parse_hotels, picklist_labels
+
+    # Parse every queried hotel into a typed table in one pass
+    hotel_price_df = parse_hotels(hotel_data)
+    # A hotel without a price cannot be booked (the price is stored on chain), so it is not offered
+    hotel_price_df = hotel_price_df.dropna(subset=['Hotel Name', 'Total Price']).drop_duplicates(subset=['Hotel Name'])
+    selectable_hotel_dict = dict(zip(hotel_price_df['Hotel Name'], picklist_labels(hotel_price_df)))
+
+    # Index the hotel price dataframe by name for the select box lookups
     hotel_price_df = hotel_price_df.set_index('Hotel Name')
 
 
@@ -181,22 +150,15 @@ if chosen_hotel != None:
 
 # Finalize the hotel room booking
 if st.button("Finalize Hotel Reservation"):
-    hotel_reservation_ipfs_hash = pin_hotel_reservation(chosen_hotel)
-    hotel_reservation_uri = f"ipfs://{hotel_reservation_ipfs_hash}"
-    tx_hash = contract.functions.registerHotelReservation(
-        address,
-        str(chosen_hotel),
-        str(checkin_date),
-        str(checkout_date),
-        str(confirmation_code),
-        int(chosen_total_price),
-        hotel_reservation_uri,
-    ).transact({"from": address, "gas": 1000000})
+    # Pin the token metadata and mint the reservation NFT through the booking service
     with st.spinner("Tokenizing Reservation ..."):
-        time.sleep(10)
+        token_id, receipt, hotel_reservation_uri = asyncio.run(booking_service.tokenize(
+            address, chosen_hotel, checkin_date, checkout_date, confirmation_code, chosen_total_price,
+        ))
+    hotel_reservation_ipfs_hash = hotel_reservation_uri[len("ipfs://"):]
     st.success("Success!")
     st.balloons()
-    receipt = w3.eth.waitForTransactionReceipt(tx_hash)
+    st.write(f"Your reservation NFT has token ID {token_id}")
     st.write("Transaction receipt mined:")
     st.write(dict(receipt))
     st.write(
@@ -206,3 +168,10 @@ if st.button("Finalize Hotel Reservation"):
         f"[Hotel Reservation IPFS Gateway Link](https://ipfs.io/ipfs/{hotel_reservation_ipfs_hash})"
     )
 st.markdown("---")
+
+
+### OPTIONAL DIAGNOSTICS PANEL ###
+if metrics.ENABLED and st.sidebar.checkbox("Show diagnostics"):
+    st.sidebar.markdown("## Diagnostics")
+    st.sidebar.caption(f"Prometheus metrics: http://{metrics.METRICS_HOST}:{metrics.METRICS_PORT}/metrics")
+    st.sidebar.dataframe(metrics.snapshot())
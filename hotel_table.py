@@ -0,0 +1,97 @@
+# Hotel Search Table
+################################################################################
+
+# This file turns Booking.com hotel search responses (as returned by `functions.get_hotels`) into a typed,
+# columnar pandas DataFrame in one pass, and provides fast filtering and ranking on price and review score.
+
+################################################################################
+# Imports
+import pandas as pd
+
+################################################################################
+# Column layout
+
+# Flattened response field -> table column
+HOTEL_FIELDS = {
+    "hotel_name": "Hotel Name",
+    "hotel_id": "Hotel ID",
+    "composite_price_breakdown.gross_amount_per_night.value": "Average Price",
+    "price_breakdown.all_inclusive_price": "Total Price",
+    "currencycode": "Currency",
+    "review_score": "Review Score",
+}
+
+HOTEL_DTYPES = {
+    "Hotel Name": "string",
+    "Hotel ID": "Int64",
+    "Average Price": "float64",
+    "Total Price": "float64",
+    "Currency": "string",
+    "Review Score": "float64",
+}
+
+NUMERIC_COLUMNS = ["Hotel ID", "Average Price", "Total Price", "Review Score"]
+
+################################################################################
+# Parsing
+
+def empty_hotel_table():
+    """Return an empty table with the hotel column types."""
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in HOTEL_DTYPES.items()})
+
+
+def parse_hotels(hotel_data):
+    """Parse one `get_hotels` response, or a list of them, into a typed hotel table.
+
+    Missing or malformed fields become nulls rather than raising.
+    """
+    responses = hotel_data if isinstance(hotel_data, list) else [hotel_data]
+    results = [hotel for response in responses for hotel in (response or {}).get("result") or []]
+    if not results:
+        return empty_hotel_table()
+
+    # Flatten every nested record at once, then keep only the columns we use
+    flat = pd.json_normalize(results)
+    table = flat.reindex(columns=list(HOTEL_FIELDS)).rename(columns=HOTEL_FIELDS)
+
+    for column in NUMERIC_COLUMNS:
+        table[column] = pd.to_numeric(table[column], errors="coerce")
+    table = table.astype(HOTEL_DTYPES)
+
+    # Pages can overlap while inventory shifts, keep the first (most popular) occurrence
+    duplicated = table["Hotel ID"].notna() & table["Hotel ID"].duplicated()
+    return table[~duplicated].reset_index(drop=True)
+
+
+def picklist_labels(table):
+    """Build the 'name - $x per night - $y total cost' select box labels for every row at once."""
+    return (
+        table["Hotel Name"].fillna("Unknown hotel")
+        + " - $" + table["Average Price"].round(2).astype("string").fillna("?")
+        + " per night - $" + table["Total Price"].round(2).astype("string").fillna("?")
+        + " total cost"
+    )
+
+################################################################################
+# Filtering and ranking
+
+def filter_hotels(table, min_price=None, max_price=None, min_score=None, price_column="Total Price"):
+    """Keep hotels within a price range and above a review score, using boolean masks."""
+    mask = pd.Series(True, index=table.index)
+    if min_price is not None:
+        mask &= table[price_column] >= min_price
+    if max_price is not None:
+        mask &= table[price_column] <= max_price
+    if min_score is not None:
+        mask &= table["Review Score"] >= min_score
+    # Comparisons against nulls are False, so hotels without the value drop out
+    return table[mask.fillna(False)]
+
+
+def rank_hotels(table, by="Total Price", ascending=True, top=None):
+    """Sort hotels on a column, nulls last; with `top`, only the best rows are selected."""
+    if top is not None:
+        ranked = table.dropna(subset=[by])
+        ranked = ranked.nsmallest(top, by) if ascending else ranked.nlargest(top, by)
+        return ranked
+    return table.sort_values(by, ascending=ascending, na_position="last", kind="stable")
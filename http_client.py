@@ -0,0 +1,228 @@
+# HTTP Client
+################################################################################
+
+# This file contains the shared HTTP client used by `functions.py` (Booking.com RapidAPI) and `pinata.py` (Pinata).
+# It keeps pooled keep-alive connections per host, applies a timeout per endpoint and retries 429/5xx responses
+# with jittered exponential backoff that respects the Retry-After header.
+
+################################################################################
+# Imports
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+import metrics
+
+################################################################################
+# Configuration
+
+# (connect timeout, read timeout) in seconds for each endpoint
+ENDPOINT_TIMEOUTS = {
+    "booking": (3.05, 15),
+    "pinata": (3.05, 60),
+    "pinata_file": (3.05, 300),
+    "rpc": (3.05, 30),
+    "fx": (3.05, 10),
+    "default": (3.05, 30),
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.5))
+BACKOFF_CAP = float(os.getenv("HTTP_BACKOFF_CAP", 20))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20))
+
+################################################################################
+# Retry helpers
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) into seconds to wait."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full jitter exponential backoff, never shorter than what the server asked for."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_CAP))
+    return delay
+
+
+def _idempotent(method):
+    return method.upper() in ("GET", "HEAD", "OPTIONS")
+
+
+def _should_retry(method, response, retry_non_idempotent):
+    if response.status_code not in RETRY_STATUSES:
+        return False
+    # A 429 means the request was not processed, so it is always safe to send again
+    return response.status_code == 429 or retry_non_idempotent or _idempotent(method)
+
+
+def _never_sent(error):
+    """True if the connection failed before any of the request reached the server."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason says which stage failed
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _should_retry_error(method, error, retry_non_idempotent):
+    # A read timeout or dropped connection may come after the server acted on the request
+    return retry_non_idempotent or _idempotent(method) or _never_sent(error)
+
+################################################################################
+# Clients
+
+class HttpClient:
+    """Thread-safe pooled HTTP client with per-endpoint timeouts and retries."""
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE, max_retries=MAX_RETRIES, timeouts=None):
+        self.max_retries = max_retries
+        self.timeouts = dict(ENDPOINT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        self._pool_maxsize = pool_maxsize
+        self._session = None
+        self._lock = threading.Lock()
+        self._rate_limiters = {}
+
+    @property
+    def session(self):
+        # The session is built on first use, so importing this module stays cheap
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=self._pool_maxsize, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def set_rate_limiter(self, endpoint, limiter):
+        """Take a token from `limiter` (see `rate_limiter.py`) before every attempt on `endpoint`; None removes it."""
+        if limiter is None:
+            self._rate_limiters.pop(endpoint, None)
+        else:
+            self._rate_limiters[endpoint] = limiter
+
+    def timeout_for(self, endpoint):
+        return self.timeouts.get(endpoint, self.timeouts["default"])
+
+    def request(self, method, url, endpoint="default", retry_non_idempotent=False, max_retries=None, **kwargs):
+        """Send a request, retrying throttled, failed or timed out attempts.
+
+        Non-idempotent requests (POST) are only retried on 429 or when the connection could not be opened,
+        unless `retry_non_idempotent` is set, since a 5xx or read timeout may arrive after the server acted on them.
+        Pass `max_retries=0` for bodies that cannot be sent twice, such as one-shot streams.
+        """
+        kwargs.setdefault("timeout", self.timeout_for(endpoint))
+        max_retries = self.max_retries if max_retries is None else max_retries
+        limiter = self._rate_limiters.get(endpoint)
+        attempt = 0
+        while True:
+            if limiter is not None:
+                # Retries count against the quota too
+                limiter.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt >= max_retries or not _should_retry_error(method, error, retry_non_idempotent):
+                    metrics.record_error(endpoint, type(error).__name__)
+                    raise
+                metrics.record_retry(endpoint, type(error).__name__)
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            if attempt >= max_retries or not _should_retry(method, response, retry_non_idempotent):
+                if metrics.ENABLED:
+                    self._record_response(endpoint, response, kwargs.get("stream", False))
+                return response
+
+            metrics.record_retry(endpoint, response.status_code)
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            response.close()
+            time.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    @staticmethod
+    def _record_response(endpoint, response, stream):
+        if response.status_code >= 400:
+            metrics.record_error(endpoint, str(response.status_code))
+        # requests sets Content-Length for every body of known size, including json= and sized streams
+        sent = response.request.headers.get("Content-Length")
+        metrics.record_payload(endpoint, "sent", int(sent) if sent else None)
+        received = response.headers.get("Content-Length")
+        if received is None and not stream:
+            # Compressed or chunked replies have no length header; the body is read by .json() anyway
+            received = len(response.content)
+        metrics.record_payload(endpoint, "received", int(received) if received is not None else None)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class AsyncHttpClient:
+    """asyncio front end over `HttpClient`, for callers that want to overlap requests.
+
+    Requests run on worker threads against the same connection pool; a semaphore bounds
+    how many are in flight at once.
+    """
+
+    def __init__(self, client=None, max_in_flight=POOL_MAXSIZE):
+        self.client = client or http
+        self.max_in_flight = max_in_flight
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        # Semaphores are bound to the running event loop
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphores[loop]
+
+    async def request(self, method, url, **kwargs):
+        async with self._semaphore():
+            return await asyncio.to_thread(self.client.request, method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def gather(self, *requests_to_send):
+        """Send (method, url, kwargs) tuples concurrently and return responses in order."""
+        return await asyncio.gather(
+            *(self.request(method, url, **kwargs) for method, url, kwargs in requests_to_send)
+        )
+
+
+# Shared client so every module reuses the same connection pool
+http = HttpClient()
+async_http = AsyncHttpClient(http)
@@ -0,0 +1,282 @@
+# Secondary Market Listing Store
+################################################################################
+
+# This file keeps the secondary market listings in an embedded SQLite database instead of a CSV file.
+# Listings are indexed by token ID, seller and price; every insert and delete is its own atomic transaction,
+# so several Streamlit workers can list and sell at the same time without overwriting each other.
+# Every listing and every removal takes the next number of one commit sequence, so an in-memory copy (the order
+# book) can catch up on both with `changes_after`.
+#
+# Import the old CSV once with:  python listing_store.py import hotels_on_secondary_market_list.csv
+
+################################################################################
+# Imports
+import os
+import sys
+import csv
+import time
+import sqlite3
+import threading
+from pathlib import Path
+import pandas as pd
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+LISTING_DB_PATH = os.getenv("LISTING_DB_PATH", ".cache/listings.sqlite3")
+LEGACY_CSV_PATH = "./hotels_on_secondary_market_list.csv"
+
+# Column order of the legacy CSV and of the table shown on the Secondary Market page
+LISTING_COLUMNS = [
+    'hotel name', 'start date', 'end date', 'confirmation',
+    'purchase price (Usd)', 'price listed (Eth)', 'token ID', 'seller address',
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    token_id INTEGER PRIMARY KEY,
+    hotel_name TEXT NOT NULL,
+    start_date TEXT,
+    end_date TEXT,
+    confirmation TEXT,
+    purchase_price_usd REAL,
+    price_eth REAL NOT NULL,
+    seller_address TEXT NOT NULL,
+    listed_at REAL NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS listings_seller ON listings (seller_address);
+CREATE INDEX IF NOT EXISTS listings_price ON listings (price_eth, listed_at);
+CREATE TABLE IF NOT EXISTS removals (
+    seq INTEGER PRIMARY KEY,
+    token_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settlements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token_id INTEGER NOT NULL,
+    seller_address TEXT NOT NULL,
+    buyer_address TEXT NOT NULL,
+    price_eth REAL NOT NULL,
+    status TEXT NOT NULL,
+    payment_tx TEXT,
+    transfer_tx TEXT,
+    error TEXT,
+    settled_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS settlements_status ON settlements (status);
+"""
+
+################################################################################
+# Store
+
+class ListingStore:
+    """Transactional, indexed store of the reservations listed for sale."""
+
+    def __init__(self, path=LISTING_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            # Stores created before listings carried a sequence number
+            if "seq" not in [column[1] for column in conn.execute("PRAGMA table_info(listings)")]:
+                conn.execute("ALTER TABLE listings ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS listings_seq ON listings (seq)")
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None lets us open IMMEDIATE transactions ourselves
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _ImmediateTransaction(self.connection())
+
+    @staticmethod
+    def _next_seq(conn):
+        # Taken inside the write lock, so the sequence only grows in commit order, across processes too
+        row = conn.execute("SELECT value FROM meta WHERE key = 'listing_seq'").fetchone()
+        seq = int(row[0]) + 1 if row else 1
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('listing_seq', ?)", (str(seq),))
+        return seq
+
+    # Writes
+
+    def add_listing(self, token_id, hotel_name, start_date, end_date, confirmation, purchase_price_usd,
+                    price_eth, seller_address, listed_at=None):
+        """List a token for sale, replacing any earlier listing of the same token; returns its sequence number.
+
+        Pass `listed_at` to put back a listing with its original place in the queue.
+        """
+        with self._transaction() as conn:
+            seq = self._next_seq(conn)
+            conn.execute(
+                "INSERT INTO listings (token_id, hotel_name, start_date, end_date, confirmation,"
+                " purchase_price_usd, price_eth, seller_address, listed_at, seq)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (token_id) DO UPDATE SET price_eth = excluded.price_eth,"
+                " seller_address = excluded.seller_address, listed_at = excluded.listed_at, seq = excluded.seq",
+                (int(token_id), str(hotel_name), str(start_date), str(end_date), str(confirmation),
+                 float(purchase_price_usd), float(price_eth), str(seller_address),
+                 time.time() if listed_at is None else float(listed_at), seq),
+            )
+        return seq
+
+    def remove_listing(self, token_id):
+        """Delete a listing; returns the removed listing, or None if another worker already took it."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM listings WHERE token_id = ?", (int(token_id),)).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM listings WHERE token_id = ?", (int(token_id),))
+            self._record_removal(conn, token_id)
+            return dict(row)
+
+    def remove_listings(self, token_ids):
+        """Delete many listings in one transaction and return how many were removed."""
+        removed = 0
+        with self._transaction() as conn:
+            for token_id in token_ids:
+                if conn.execute("DELETE FROM listings WHERE token_id = ?", (int(token_id),)).rowcount:
+                    self._record_removal(conn, token_id)
+                    removed += 1
+        return removed
+
+    def _record_removal(self, conn, token_id):
+        # Lets other processes' order books drop the listing too
+        conn.execute("INSERT INTO removals (seq, token_id) VALUES (?, ?)", (self._next_seq(conn), int(token_id)))
+
+    def record_settlement(self, token_id, seller_address, buyer_address, price_eth, status, payment_tx=None,
+                          transfer_tx=None, error=None):
+        """Keep a record of a sale, including ones that were paid for but could not be transferred."""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO settlements (token_id, seller_address, buyer_address, price_eth, status, payment_tx,"
+                " transfer_tx, error, settled_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (int(token_id), str(seller_address), str(buyer_address), float(price_eth), status, payment_tx,
+                 transfer_tx, error, time.time()),
+            )
+
+    # Reads
+
+    def get_listing(self, token_id):
+        row = self.connection().execute("SELECT * FROM listings WHERE token_id = ?", (int(token_id),)).fetchone()
+        return dict(row) if row else None
+
+    def listed_token_ids(self):
+        return [row[0] for row in self.connection().execute("SELECT token_id FROM listings ORDER BY token_id")]
+
+    def changes_after(self, seq):
+        """(listings, removals) committed after sequence number `seq`; removals are (seq, token ID) pairs.
+
+        Both are read from one snapshot, so nothing committed in between is skipped.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN")
+        try:
+            listings = [dict(row) for row in conn.execute("SELECT * FROM listings WHERE seq > ? ORDER BY seq", (seq,))]
+            removals = [tuple(row) for row in conn.execute(
+                "SELECT seq, token_id FROM removals WHERE seq > ? ORDER BY seq", (seq,))]
+        finally:
+            conn.execute("COMMIT")
+        return listings, removals
+
+    def settlements(self, status=None):
+        """Recorded sales, newest first, optionally only those with one status (e.g. "paid_not_transferred")."""
+        if status is None:
+            rows = self.connection().execute("SELECT * FROM settlements ORDER BY id DESC")
+        else:
+            rows = self.connection().execute("SELECT * FROM settlements WHERE status = ? ORDER BY id DESC", (status,))
+        return [dict(row) for row in rows]
+
+    def listings_by_seller(self, seller_address):
+        rows = self.connection().execute(
+            "SELECT * FROM listings WHERE seller_address = ? ORDER BY token_id", (seller_address,)
+        )
+        return [dict(row) for row in rows]
+
+    def cheapest(self, limit=20, max_price_eth=None):
+        """Return the lowest priced listings, oldest first on equal price."""
+        if max_price_eth is None:
+            rows = self.connection().execute(
+                "SELECT * FROM listings ORDER BY price_eth, listed_at LIMIT ?", (limit,)
+            )
+        else:
+            rows = self.connection().execute(
+                "SELECT * FROM listings WHERE price_eth <= ? ORDER BY price_eth, listed_at LIMIT ?",
+                (max_price_eth, limit),
+            )
+        return [dict(row) for row in rows]
+
+    def to_dataframe(self):
+        """Return every listing with the same columns the CSV used, indexed by token ID."""
+        df = pd.read_sql_query(
+            "SELECT hotel_name, start_date, end_date, confirmation, purchase_price_usd, price_eth,"
+            " token_id, seller_address FROM listings ORDER BY token_id",
+            self.connection(),
+        )
+        df.columns = LISTING_COLUMNS
+        return df.set_index('token ID')
+
+    # Legacy CSV import
+
+    def import_csv(self, csv_path=LEGACY_CSV_PATH):
+        """Load the old CSV listings once; later calls are no-ops. Returns the number of rows imported."""
+        csv_path = Path(csv_path)
+        marker = f"imported:{csv_path.resolve()}"
+        if self.connection().execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+            return 0
+        if not csv_path.exists():
+            return 0
+
+        with open(csv_path, 'r') as f:
+            rows = [row for row in csv.reader(f) if len(row) == len(LISTING_COLUMNS)]
+
+        with self._transaction() as conn:
+            # Checked again inside the write lock in case another worker imported in the meantime
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                return 0
+            for hotel_name, start_date, end_date, confirmation, purchase_price, price_eth, token_id, seller in rows:
+                conn.execute(
+                    "INSERT OR IGNORE INTO listings (token_id, hotel_name, start_date, end_date, confirmation,"
+                    " purchase_price_usd, price_eth, seller_address, listed_at, seq)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (int(token_id), hotel_name, start_date, end_date, confirmation,
+                     float(purchase_price), float(price_eth), seller, time.time(), self._next_seq(conn)),
+                )
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(len(rows))))
+        return len(rows)
+
+
+class _ImmediateTransaction:
+    """Takes the database write lock up front so concurrent writers queue instead of failing mid-transaction."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "import":
+        path = sys.argv[2] if len(sys.argv) > 2 else LEGACY_CSV_PATH
+        print(f"Imported {ListingStore().import_csv(path)} listings from {path}")
+    else:
+        print("Usage: python listing_store.py import [path/to/listings.csv]")
@@ -0,0 +1,295 @@
+# Metrics
+################################################################################
+
+# This file records how the app's external calls behave: latency histograms, payload sizes, error counts and
+# cache hit rates for every endpoint (Booking.com, Pinata and the JSON-RPC node). Metrics are served in the
+# Prometheus text format on a local port and can be shown in a Streamlit diagnostics panel.
+#
+# Instrumentation is switched on with METRICS_ENABLED=1. When it is off, `timed` hands back the undecorated
+# function, the web3 middleware is never installed and every `record_*` call returns on its first line, so the
+# hot paths pay nothing more than a flag check.
+
+################################################################################
+# Imports
+import os
+import time
+import bisect
+import functools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes", "on")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9464))
+
+METRIC_PREFIX = "hotel_app"
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+################################################################################
+# Metric types
+
+class Histogram:
+    """Fixed-bucket histogram, the same shape Prometheus expects."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        """Estimate a quantile by interpolating inside the bucket that contains it."""
+        if not self.count:
+            return None
+        target, seen, lower = fraction * self.count, 0, 0.0
+        for upper, count in zip(self.buckets, self.counts):
+            if count and seen + count >= target:
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+            lower = upper
+        # Above the last bucket there is no upper bound to interpolate to
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled counters and histograms."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, amount=1, help_text=""):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ("counter", help_text))
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets, help_text=""):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help_text))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def histograms(self, name):
+        """Return {endpoint: Histogram} for one histogram name."""
+        with self._lock:
+            return {dict(labels).get("endpoint", ""): histogram
+                    for (metric, labels), histogram in self._histograms.items() if metric == name}
+
+    def counters(self, name):
+        """Return [(labels dict, value)] for one counter name."""
+        with self._lock:
+            return [(dict(labels), value) for (metric, labels), value in self._counters.items() if metric == name]
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            help_texts = dict(self._help)
+
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                kind, help_text = help_texts[name]
+                lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+                described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{METRIC_PREFIX}_{name}{label_text(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            describe(name)
+            cumulative = 0
+            for upper, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{METRIC_PREFIX}_{name}_bucket{label_text(labels, [('le', upper)])} {cumulative}")
+            lines.append(f"{METRIC_PREFIX}_{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{METRIC_PREFIX}_{name}_sum{label_text(labels)} {histogram.sum}")
+            lines.append(f"{METRIC_PREFIX}_{name}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+
+################################################################################
+# Recording
+
+def record_latency(endpoint, seconds):
+    if not ENABLED:
+        return
+    registry.observe("call_duration_seconds", {"endpoint": endpoint}, seconds, LATENCY_BUCKETS,
+                     "Latency of external calls in seconds")
+
+
+def record_error(endpoint, error):
+    if not ENABLED:
+        return
+    registry.inc("call_errors_total", {"endpoint": endpoint, "error": error}, help_text="Failed external calls")
+
+
+def record_payload(endpoint, direction, size):
+    """Record the size in bytes of a request ("sent") or response ("received") body."""
+    if not ENABLED or size is None:
+        return
+    registry.observe("payload_bytes", {"endpoint": endpoint, "direction": direction}, size, SIZE_BUCKETS,
+                     "Size of request and response bodies in bytes")
+
+
+def record_retry(endpoint, reason):
+    if not ENABLED:
+        return
+    registry.inc("http_retries_total", {"endpoint": endpoint, "reason": str(reason)}, help_text="Retried HTTP attempts")
+
+
+def record_cache(endpoint, hit):
+    if not ENABLED:
+        return
+    registry.inc("cache_lookups_total", {"endpoint": endpoint, "result": "hit" if hit else "miss"},
+                 help_text="Cache lookups in front of external calls")
+
+
+def timed(endpoint):
+    """Decorator recording the latency and failures of a function under `endpoint`.
+
+    With metrics disabled the function is returned as is, so the decorator costs nothing at call time.
+    """
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception as error:
+                record_error(endpoint, type(error).__name__)
+                raise
+            finally:
+                record_latency(endpoint, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def rpc_middleware(make_request, w3):
+    """web3 middleware timing every JSON-RPC call under `rpc.<method>` and counting error replies."""
+    def middleware(method, params):
+        endpoint = f"rpc.{method}"
+        start = time.perf_counter()
+        try:
+            response = make_request(method, params)
+        except Exception as error:
+            record_error(endpoint, type(error).__name__)
+            raise
+        finally:
+            record_latency(endpoint, time.perf_counter() - start)
+        if "error" in response:
+            record_error(endpoint, "rpc_error")
+        return response
+    return middleware
+
+
+def install_web3(w3):
+    """Add the RPC middleware to a Web3 instance when metrics are enabled."""
+    if ENABLED:
+        w3.middleware_onion.add(rpc_middleware, name="metrics")
+    return w3
+
+################################################################################
+# Reporting
+
+def snapshot():
+    """Summarize every endpoint as rows for a table: calls, errors, latency quantiles and cache hit rate."""
+    errors, cache = {}, {}
+    for labels, value in registry.counters("call_errors_total"):
+        errors[labels["endpoint"]] = errors.get(labels["endpoint"], 0) + value
+    for labels, value in registry.counters("cache_lookups_total"):
+        hits, lookups = cache.get(labels["endpoint"], (0, 0))
+        cache[labels["endpoint"]] = (hits + (value if labels["result"] == "hit" else 0), lookups + value)
+
+    rows = []
+    for endpoint, histogram in sorted(registry.histograms("call_duration_seconds").items()):
+        hits, lookups = cache.get(endpoint, (0, 0))
+        rows.append({
+            "endpoint": endpoint,
+            "calls": histogram.count,
+            "errors": errors.get(endpoint, 0),
+            "mean ms": round(histogram.sum / histogram.count * 1000, 1),
+            "p50 ms": round(histogram.quantile(0.5) * 1000, 1),
+            "p95 ms": round(histogram.quantile(0.95) * 1000, 1),
+            "cache hit rate": round(hits / lookups, 3) if lookups else None,
+        })
+    return rows
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_exporter(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics on a background thread, once per process; does nothing when metrics are disabled.
+
+    Returns the bound (host, port), or None if disabled or the port is taken (e.g. by another app process).
+    """
+    global _server
+    if not ENABLED:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-exporter", daemon=True).start()
+        return _server.server_address[:2]
@@ -0,0 +1,336 @@
+# Order Book
+################################################################################
+
+# This file matches buyers and sellers on the secondary market. Listings (asks) and bids are kept in memory in
+# one book per stay - (hotel name, start date, end date) - as binary heaps with price-time priority: the
+# cheapest ask and the highest bid come first, and earlier orders win ties. Inserting is O(log n), cancelling
+# marks the order and lets it fall out lazily when it reaches the top, and best-price queries are O(1) amortized.
+#
+# The listing store (`listing_store.py`) stays the source of truth for asks: the book is loaded from it, picks up
+# listings made and removed by other processes with `refresh` (following the store's commit sequence, not the
+# clock), and every sale claims the listing there first, so an ask that was sold or expired elsewhere since the last
+# refresh is skipped rather than sold twice. Bids only live in memory.
+#
+# A sale is paid before the token moves: the buyer's balance is checked, the payment must be mined, and only then
+# is transferFrom sent. A failed payment puts the listing back; a paid sale whose transfer fails is recorded in the
+# store's settlements for follow-up.
+
+################################################################################
+# Imports
+import time
+import heapq
+import itertools
+import threading
+from dataclasses import dataclass, field
+from balance_service import get_balance_service
+from tx_pipeline import get_pipeline
+
+################################################################################
+# Orders
+
+@dataclass
+class Ask:
+    token_id: int
+    price_eth: float
+    seller_address: str
+    hotel_name: str
+    start_date: str
+    end_date: str
+    listed_at: float
+    seq: int = 0
+    listing: dict = field(default=None, repr=False)
+    active: bool = True
+
+    @property
+    def stay(self):
+        return (self.hotel_name, self.start_date, self.end_date)
+
+
+@dataclass
+class Bid:
+    bid_id: int
+    price_eth: float
+    buyer: object  # local account that signs the payment
+    hotel_name: str
+    start_date: str
+    end_date: str
+    placed_at: float
+    active: bool = True
+
+    @property
+    def stay(self):
+        return (self.hotel_name, self.start_date, self.end_date)
+
+
+@dataclass
+class Trade:
+    token_id: int
+    price_eth: float
+    seller_address: str
+    buyer_address: str
+    transfer_tx: str = None
+    payment_tx: str = None
+
+################################################################################
+# Book
+
+class _StayBook:
+    """Asks and bids of a single stay."""
+
+    def __init__(self):
+        self.asks = []  # (price, listed_at, seq, Ask)
+        self.bids = []  # (-price, placed_at, seq, Bid)
+        self.live_asks = 0
+
+    @staticmethod
+    def _top(heap):
+        # Cancelled orders are only dropped once they reach the top
+        while heap and not heap[0][-1].active:
+            heapq.heappop(heap)
+        return heap[0][-1] if heap else None
+
+    def best_ask(self):
+        return self._top(self.asks)
+
+    def best_bid(self):
+        return self._top(self.bids)
+
+
+class OrderBook:
+    """Thread-safe set of per-stay books with price-time priority."""
+
+    def __init__(self):
+        self._books = {}
+        self._hotels = {}
+        self._asks = {}
+        self._bids = {}
+        self._seq = itertools.count()
+        self._bid_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        # Sequence number of the last store listing seen by `refresh`; listings from older stores have seq 0
+        self._last_seq = -1
+
+    def _book(self, stay):
+        book = self._books.get(stay)
+        if book is None:
+            book = self._books[stay] = _StayBook()
+            self._hotels.setdefault(stay[0], set()).add(stay)
+        return book
+
+    # Asks
+
+    def add_ask(self, listing):
+        """Add (or re-price) a listing from the listing store; returns the Ask."""
+        ask = Ask(int(listing["token_id"]), float(listing["price_eth"]), listing["seller_address"],
+                  listing["hotel_name"], str(listing["start_date"]), str(listing["end_date"]),
+                  float(listing["listed_at"]), int(listing.get("seq") or 0), listing)
+        with self._lock:
+            current = self._asks.get(ask.token_id)
+            if current is not None and ask.seq and current.seq == ask.seq:
+                # Already in the book, e.g. listed by this process and then read back by `refresh`
+                return current
+            self.cancel_ask(ask.token_id)
+            book = self._book(ask.stay)
+            heapq.heappush(book.asks, (ask.price_eth, ask.listed_at, next(self._seq), ask))
+            book.live_asks += 1
+            self._asks[ask.token_id] = ask
+        return ask
+
+    def cancel_ask(self, token_id):
+        with self._lock:
+            ask = self._asks.pop(int(token_id), None)
+            if ask is None:
+                return None
+            ask.active = False
+            self._books[ask.stay].live_asks -= 1
+            return ask
+
+    def get_ask(self, token_id):
+        with self._lock:
+            return self._asks.get(int(token_id))
+
+    def best_ask(self, hotel_name, start_date, end_date):
+        with self._lock:
+            book = self._books.get((hotel_name, str(start_date), str(end_date)))
+            return book.best_ask() if book else None
+
+    def cheapest(self, hotel_name, start_from=None, end_by=None):
+        """Cheapest ask for a hotel among stays starting on or after `start_from` and ending by `end_by`."""
+        with self._lock:
+            best = None
+            for stay in self._hotels.get(hotel_name, ()):
+                if (start_from and stay[1] < str(start_from)) or (end_by and stay[2] > str(end_by)):
+                    continue
+                ask = self._books[stay].best_ask()
+                if ask is not None and (best is None or (ask.price_eth, ask.listed_at) < (best.price_eth, best.listed_at)):
+                    best = ask
+            return best
+
+    # Bids
+
+    def add_bid(self, buyer, hotel_name, start_date, end_date, price_eth, placed_at):
+        with self._lock:
+            bid = Bid(next(self._bid_ids), float(price_eth), buyer, hotel_name, str(start_date), str(end_date),
+                      placed_at)
+            heapq.heappush(self._book(bid.stay).bids, (-bid.price_eth, bid.placed_at, next(self._seq), bid))
+            self._bids[bid.bid_id] = bid
+            return bid
+
+    def cancel_bid(self, bid_id):
+        with self._lock:
+            bid = self._bids.pop(bid_id, None)
+            if bid is not None:
+                bid.active = False
+            return bid
+
+    def best_bid(self, hotel_name, start_date, end_date):
+        with self._lock:
+            book = self._books.get((hotel_name, str(start_date), str(end_date)))
+            return book.best_bid() if book else None
+
+    # Browsing
+
+    def hotels(self):
+        """Hotels with at least one live listing, by name."""
+        with self._lock:
+            return sorted(hotel for hotel, stays in self._hotels.items()
+                          if any(self._books[stay].live_asks for stay in stays))
+
+    def stays(self, hotel_name):
+        """(start date, end date) of the hotel's stays that have live listings, soonest first."""
+        with self._lock:
+            return sorted(stay[1:] for stay in self._hotels.get(hotel_name, ()) if self._books[stay].live_asks)
+
+    def __len__(self):
+        return len(self._asks)
+
+    # Loading
+
+    def load(self, listing_store):
+        """Add every listing in the store; afterwards `refresh` only reads what is new."""
+        return self.refresh(listing_store)
+
+    def refresh(self, listing_store):
+        """Apply listings made, re-priced or removed since the last load (e.g. by another process).
+
+        Returns the number of changes applied.
+        """
+        listings, removals = listing_store.changes_after(self._last_seq)
+        # Replayed in commit order, so a token sold and listed again ends up listed
+        changes = sorted([(listing["seq"], listing) for listing in listings] + removals, key=lambda change: change[0])
+        with self._lock:
+            for seq, change in changes:
+                if isinstance(change, dict):
+                    self.add_ask(change)
+                else:
+                    ask = self._asks.get(change)
+                    # An ask listed after the removal (e.g. put back by this process) stays
+                    if ask is not None and ask.seq < seq:
+                        self.cancel_ask(change)
+                self._last_seq = max(self._last_seq, seq)
+        return len(changes)
+
+################################################################################
+# Matching
+
+class Matcher:
+    """Pairs bids with the best asks and settles each match with transferFrom plus a payment."""
+
+    def __init__(self, order_book, listing_store, contract, w3_wallet):
+        self.book = order_book
+        self.listing_store = listing_store
+        self.contract = contract
+        self.w3_wallet = w3_wallet
+
+    def list(self, token_id, hotel_name, start_date, end_date, confirmation, purchase_price_usd, price_eth,
+             seller_address):
+        """List a token; if a resting bid already pays at least the asking price, it is sold at once.
+
+        Returns the Trade when it sold, else None.
+        """
+        self.listing_store.add_listing(token_id, hotel_name, start_date, end_date, confirmation, purchase_price_usd,
+                                       price_eth, seller_address)
+        ask = self.book.add_ask(self.listing_store.get_listing(token_id))
+        bid = self.book.best_bid(*ask.stay)
+        if bid is None or bid.price_eth < ask.price_eth:
+            return None
+        # The resting bid set the price the buyer agreed to pay
+        self.book.cancel_bid(bid.bid_id)
+        return self._settle(ask, bid.buyer, bid.price_eth)
+
+    def cancel(self, token_id):
+        """Withdraw a listing from the book and the store."""
+        self.book.cancel_ask(token_id)
+        return self.listing_store.remove_listing(token_id)
+
+    def buy(self, buyer, hotel_name, start_date, end_date, max_price_eth, rest=False):
+        """Buy the cheapest listing of a stay at or below `max_price_eth`.
+
+        Returns the Trade, or - if nothing matched - the resting Bid when `rest` is set, else None.
+        """
+        while True:
+            ask = self.book.best_ask(hotel_name, start_date, end_date)
+            if ask is None or ask.price_eth > max_price_eth:
+                break
+            trade = self._settle(ask, buyer, ask.price_eth)
+            if trade is not None:
+                return trade
+        if rest:
+            return self.book.add_bid(buyer, hotel_name, start_date, end_date, max_price_eth, time.time())
+        return None
+
+    def buy_token(self, buyer, token_id, price_eth):
+        """Buy one specific listed token, paying at least its asking price."""
+        ask = self.book.get_ask(token_id)
+        if ask is None or price_eth < ask.price_eth:
+            return None
+        return self._settle(ask, buyer, price_eth)
+
+    def _restore(self, listing):
+        """Put a claimed listing back on the market in its original place."""
+        self.listing_store.add_listing(listing["token_id"], listing["hotel_name"], listing["start_date"],
+                                       listing["end_date"], listing["confirmation"], listing["purchase_price_usd"],
+                                       listing["price_eth"], listing["seller_address"], listed_at=listing["listed_at"])
+        self.book.add_ask(self.listing_store.get_listing(listing["token_id"]))
+
+    def _settle(self, ask, buyer, price_eth):
+        balance = get_balance_service(self.w3_wallet).get_balance(buyer.address)
+        if balance < self.w3_wallet.toWei(price_eth, "ether"):
+            raise ValueError(f"{buyer.address} cannot pay {price_eth} ETH for token {ask.token_id}")
+
+        self.book.cancel_ask(ask.token_id)
+        # Claim the listing in the shared store first, so two buyers (or processes) cannot both get it
+        listing = self.listing_store.remove_listing(ask.token_id)
+        if listing is None:
+            return None
+
+        # The seller is paid first; until the payment is mined nothing has changed hands
+        try:
+            payment = get_pipeline(self.w3_wallet).submit_payment(buyer, ask.seller_address, price_eth)
+            receipt = payment.receipt()
+            if receipt["status"] != 1:
+                raise RuntimeError(f"Payment {receipt['transactionHash'].hex()} reverted")
+        except Exception:
+            self._restore(listing)
+            raise
+        finally:
+            get_balance_service(self.w3_wallet).invalidate(buyer.address)
+        payment_tx = receipt["transactionHash"].hex()
+
+        try:
+            transfer_tx = self.contract.functions.transferFrom(
+                ask.seller_address, buyer.address, ask.token_id
+            ).transact({"from": ask.seller_address, "gas": 3000000})
+            transfer_receipt = self.contract.web3.eth.wait_for_transaction_receipt(transfer_tx)
+            if transfer_receipt["status"] != 1:
+                raise RuntimeError(f"transferFrom {transfer_tx.hex()} reverted")
+        except Exception as error:
+            # The buyer has paid; keep the sale on record so the token can be delivered or the payment refunded
+            self.listing_store.record_settlement(ask.token_id, ask.seller_address, buyer.address, price_eth,
+                                                 "paid_not_transferred", payment_tx=payment_tx,
+                                                 error=f"{type(error).__name__}: {error}")
+            raise RuntimeError(f"Token {ask.token_id} was paid for in {payment_tx} but not transferred") from error
+
+        self.listing_store.record_settlement(ask.token_id, ask.seller_address, buyer.address, price_eth, "settled",
+                                             payment_tx=payment_tx, transfer_tx=transfer_tx.hex())
+        return Trade(ask.token_id, price_eth, ask.seller_address, buyer.address, transfer_tx.hex(), payment_tx)
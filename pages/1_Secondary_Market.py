@@ -1,80 +1,69 @@
 ################################################################################
 # Imports
-from lib2to3.pgen2 import token
-import os
-import csv
-import pandas as pd
-import json
-from pathlib import Path
+import datetime
 import streamlit as st
-from dataclasses import dataclass
-from typing import Any, List
-from web3 import Web3
-from dotenv import load_dotenv
+from contract_registry import get_web3, get_wallet_web3, get_contract, get_reservation_store, get_listing_store, get_order_book
 # w3_wallet below defined to connect to Ganache wallet only, to distinguish from the other w3 below
-w3_wallet = Web3(Web3.HTTPProvider('HTTP://127.0.0.1:7545'))
+w3_wallet = get_wallet_web3()
 ################################################################################
 
-from pinata import pin_file_to_ipfs, pin_json_to_ipfs, convert_data_to_json
+from pinata import pin_file_to_ipfs
+from pin_cache import pin_json
+from price_history import price_history
+from order_book import Matcher
+from fx_quotes import get_quote_service
+from asset_cache import hotel_image
+from portfolio import get_portfolio_service
 
-load_dotenv()
+# Shared instance of web3.py for communicationn to the Blockchain smart contract (created once per process)
+w3 = get_web3()
 
-# Create an instance of web3.py for communicationn to the Blockchain smart contract
-w3 = Web3(Web3.HTTPProvider(os.getenv("WEB3_PROVIDER_URI")))
+## Load the smart contract from remix (the ABI is parsed once per process)
+contract = get_contract()
 
-## Load the smart contract from remix
+# Local mirror of the minted reservations, kept up to date by `reservation_indexer.py`
+reservation_store = get_reservation_store()
 
-def load_contract():
+# Listings of reservations for sale on the secondary market (the old CSV is imported once)
+listing_store = get_listing_store()
 
-    # Load the contract ABI
-    with open(Path("./contracts/compiled/hotel_reservation_registry_abi.json")) as f:
-        contract_abi = json.load(f)
-
-    # Set the contract address (this is the address of the deployed contract)
-    contract_address = os.getenv("SMART_CONTRACT_ADDRESS")
-
-    # Calling the contract
-    contract = w3.eth.contract(address=contract_address, abi=contract_abi)
-
-    return contract
-
-
-contract = load_contract()
+# In-memory order book over the listings, topped up with listings made by other sessions on every rerun
+order_book = get_order_book()
+order_book.refresh(listing_store)
+matcher = Matcher(order_book, listing_store, contract, w3_wallet)
 
 # Helper functions to pin files and json to Pinata
 def pin_hotel_reservation(hotel_name, hotel_confirmation_file):
-    # Pin the file to IPFS with Pinata
-    ipfs_file_hash = pin_file_to_ipfs(hotel_confirmation_file.getvalue())
+    # Stream the file to IPFS with Pinata without copying it into memory again
+    ipfs_file_hash = pin_file_to_ipfs(hotel_confirmation_file, name=hotel_confirmation_file.name)
 
     # Build a token metadata file for the Hotel Reservation
     token_json = {"name": hotel_name, "image": ipfs_file_hash}
-    json_data = convert_data_to_json(token_json)
 
-    # Pin the json to IPFS with Pinata
-    json_ipfs_hash = pin_json_to_ipfs(json_data)
+    # Compute the CID locally; new metadata is pinned to IPFS with Pinata in the background
+    json_ipfs_hash = pin_json(token_json)
 
     return json_ipfs_hash
 
 
 # Function to pin historical price report
 def pin_historical_price_report(report_content):
-    json_report = convert_data_to_json(report_content)
-    report_ipfs_hash = pin_json_to_ipfs(json_report)
+    report_ipfs_hash = pin_json(report_content)
     return report_ipfs_hash
 
 ################################################################################
 
 # Import functions from crypto wallet file
-from crypto_wallet import generate_account, get_balance, send_transaction
+from crypto_wallet import generate_account, get_balance
 
 ################################################################################
 
-## Below are database stored with fake/stock hotel infor & images for website display purposs
+## Below are database stored with fake/stock hotel infor for website display purposs (photos are found in Images/ by hotel name)
 hotel_database = {
-    "1 Hotel Toronto": ["1 Hotel Toronto", "0x05d38543486F918D1d0fFB73E074e90445dD9E5D", "4.3", .20, "Images/1 Hotel Toronto.jpeg"],
-    "The Omni King Edward Hotel": ["The Omni King Edward Hotel", "0x2422858F9C4480c2724A309D58Ffd7Ac8bF65396", "5.0", .33, "Images/The Omni King Edward Hotel.jpeg"],
-    "The Ritz-Carlton Toronto": ["The Ritz-Carlton Toronto", "0x8fD00f170FDf3772C5ebdCD90bF257316c69BA45", "4.7", .19, "Images/The Ritz-Carlton Toronto.jpeg"],
-    "The Yorkville Royal Sonesta Hotel Toronto": ["The Yorkville Royal Sonesta Hotel Toronto", "0x8fD00f170FDf3772C5ebdCD90bF257316c69BA45", "4.1", .16, "Images/The Yorkville Royal Sonesta Hotel Toronto.jpeg"]
+    "1 Hotel Toronto": ["1 Hotel Toronto", "0x05d38543486F918D1d0fFB73E074e90445dD9E5D", "4.3", .20],
+    "The Omni King Edward Hotel": ["The Omni King Edward Hotel", "0x2422858F9C4480c2724A309D58Ffd7Ac8bF65396", "5.0", .33],
+    "The Ritz-Carlton Toronto": ["The Ritz-Carlton Toronto", "0x8fD00f170FDf3772C5ebdCD90bF257316c69BA45", "4.7", .19],
+    "The Yorkville Royal Sonesta Hotel Toronto": ["The Yorkville Royal Sonesta Hotel Toronto", "0x8fD00f170FDf3772C5ebdCD90bF257316c69BA45", "4.1", .16]
 }
 
 # A list of 
@@ -86,7 +75,9 @@ def get_hotel(w3_wallet):
     db_list = list(hotel_database.values())
 
     for number in range(len(hotels)):
-        st.image(db_list[number][4], width=200)
+        photo = hotel_image(db_list[number][0], "thumbnail")
+        if photo is not None:
+            st.image(str(photo), width=200)
         st.write("Name: ", db_list[number][0])
         st.write("Ethereum Account Address: ", db_list[number][1])
         st.write("Rating: ", db_list[number][2])
@@ -101,27 +92,37 @@ st.markdown("# Buy and Sell Hotel Rooms Here!")
 st.markdown("## Hotels Available for Sale")
 st.text(" \n")
 
-# Set display image
-st.image(list(hotel_database.values())[0][4], width=400)
+# Set display image (a resized copy from the asset cache, not the full size photo)
+hero_photo = hotel_image(hotels[0], "hero")
+if hero_photo is not None:
+    st.image(str(hero_photo), width=400)
+
+# USD/ETH rate, cached and refreshed in the background; None if no rate could be fetched at all
+quote_service = get_quote_service()
+try:
+    eth_usd_quote = quote_service.get_quote("ETH", "USD")
+except Exception as error:
+    eth_usd_quote = None
+    st.warning(f"USD/ETH rate unavailable: {error}")
 
-# Open CSV file that contains details of hotels available for sale 
-with open('./hotels_on_secondary_market_list.csv', 'r') as f:
-    file = csv.reader(f)
-    hotels_on_secondary_market_list = list(file)
-    df_hotels_on_secondary_market_list = pd.DataFrame(hotels_on_secondary_market_list)
-    df_hotels_on_secondary_market_list.columns = ['hotel name','start date','end date','confirmation','purchase price (Usd)','price listed (Eth)','token ID','seller address']
-    df_hotels_on_secondary_market_list = df_hotels_on_secondary_market_list.set_index('token ID')
+# Load the details of hotels available for sale from the listing store, with the prices in both currencies
+df_hotels_on_secondary_market_list = listing_store.to_dataframe()
+if eth_usd_quote is not None:
+    df_hotels_on_secondary_market_list = quote_service.add_currency_columns(df_hotels_on_secondary_market_list)
 
 # Display subheader
 st.write("Hotels for Sale",df_hotels_on_secondary_market_list)
 
-# Set list of tokens available for purchase
-tokens_on_secondary_market_list = list(df_hotels_on_secondary_market_list)
-
 ################################################################################
 
 # Streamlit Sidebar Code - Start
 st.sidebar.markdown("## USD/Ether Converter")
+if eth_usd_quote is not None:
+    st.sidebar.caption(f"1 ETH = ${eth_usd_quote.rate:,.2f} ({eth_usd_quote.source}, {eth_usd_quote.age:.0f}s old)")
+    usd_to_convert = st.sidebar.number_input("Amount (USD)", min_value=0.0, value=100.0)
+    st.sidebar.write(f"= {quote_service.usd_to_eth(usd_to_convert):.6f} ETH")
+    eth_to_convert = st.sidebar.number_input("Amount (ETH)", min_value=0.0, value=1.0)
+    st.sidebar.write(f"= ${quote_service.eth_to_usd(eth_to_convert):,.2f} USD")
 st.sidebar.markdown("## Current Account Address and Ether Balance")
 
 ##########################################
@@ -143,45 +144,49 @@ st.sidebar.write(get_balance(w3_wallet, account.address))
 # Create a select box for user to list 
 st.sidebar.markdown("## SELL")
 
-# Show existing token list
-tokens = contract.functions.totalSupply().call()
-token_id_listed = st.sidebar.selectbox("Select a Reservation to Sell", list(range(tokens)))
+# Only the reservations this wallet owns (and whose stay is not over) can be sold; they are read from the chain
+# in one batched pass and cached until a Transfer involving the wallet
+portfolio = get_portfolio_service(w3, contract).get_portfolio(account.address)
+token_id_listed = st.sidebar.selectbox("Select a Reservation to Sell", portfolio.token_ids(as_of=datetime.date.today()))
 
-# Query booking information for selected hotel
-booking_info_listed = contract.functions.roomconfirmation(token_id_listed).call()
+# Booking information for the selected reservation comes with the portfolio
+booking_info_listed = portfolio.reservations.get(token_id_listed) or ["", "", "", "", 0]
 
 # Display hotel details
 st.sidebar.write("Hotel Name: ", booking_info_listed[0])
 st.sidebar.write("Check In: ",booking_info_listed[1])
 st.sidebar.write("Check Out: ",booking_info_listed[2])
 st.sidebar.write("Purchase Price: ",booking_info_listed[4])
+if eth_usd_quote is not None and booking_info_listed[4]:
+    st.sidebar.write("Purchase Price (ETH): ", round(quote_service.usd_to_eth(float(booking_info_listed[4])), 6))
+
+# Fair value of the stay from the price history (Price events and search quotes), to help set the sale price
+price_history.ingest_price_events(reservation_store)
+fair_value = price_history.fair_value(booking_info_listed[0], booking_info_listed[1]) if booking_info_listed[0] else None
+if fair_value:
+    st.sidebar.write("Fair Value (USD): ", round(fair_value["fair_value"], 2))
+    st.sidebar.caption(
+        f"Median of {fair_value['count']} prices for this {'stay' if fair_value['scope'] == 'date' else 'hotel'}, "
+        f"10th-90th percentile ${fair_value['p10']:.0f}-${fair_value['p90']:.0f}, recent trend ${fair_value['ema']:.0f}"
+    )
 
 # Set variable to determine the sellers desired sale price
 price_list_for_sale = st.sidebar.number_input("Sale Price (ETH)")
 
 # Identify the seller Ethereum Address
-seller_address = st.sidebar.text_input("Input Wallet Address")
+seller_address = st.sidebar.text_input("Input Wallet Address", value=account.address)
 
 ## below part enable seller to add their token to secondary market database
-if st.sidebar.button("Finalize Token Sale"):
+if st.sidebar.button("Finalize Token Sale", disabled=token_id_listed is None):
+    if token_id_listed is None:
+        st.sidebar.error("This wallet has no reservation to sell")
+        st.stop()
     st.sidebar.write("token_id_listed",token_id_listed)
     st.sidebar.write("booking_info_listed",booking_info_listed)
-    ## add other info to booking info like: listed price, token id, seller's address to receive proceeds from the sale
-    booking_info_listed.append(price_list_for_sale)
-    booking_info_listed.append(token_id_listed)
-    booking_info_listed.append(seller_address)
-
-    # Add hotel room token to the secondary market list
-    tokens_on_secondary_market_list.append(token_id_listed) 
-
-    # Add hotel room details to the secondary market list
-    hotels_on_secondary_market_list.append(booking_info_listed)
-
-    # Convert hotel list to dataframe
-    df = pd.DataFrame(hotels_on_secondary_market_list)
-
-    # Turn dataframe into CSV
-    df.to_csv('hotels_on_secondary_market_list.csv', index = False, header= None)
+    ## add the booking info with the listed price, token id and seller's address to receive proceeds from the sale
+    trade = matcher.list(token_id_listed, *booking_info_listed, price_list_for_sale, seller_address)
+    if trade is not None:
+        st.sidebar.write("#### Sold at once to a waiting buyer for (ETH): ", trade.price_eth)
 
     st.balloons()
 
@@ -191,14 +196,16 @@ if st.sidebar.button("Finalize Token Sale"):
 st.sidebar.markdown("## *********************************")
 st.sidebar.markdown("## BUY")
 
-# Determine the number of tokens available for sale on the secondary market
-tokens = contract.functions.totalSupply().call()
-
-# Select a hotel to purchase
-token_id_listed = st.sidebar.selectbox("Select Reservation to Purchase", list(range(tokens)))
+# Select a hotel and stay among the listings, and show the cheapest offer for it (earliest listed wins ties)
+hotel_to_buy = st.sidebar.selectbox("Select Hotel to Purchase", order_book.hotels())
+stay_to_buy = st.sidebar.selectbox("Select Stay", order_book.stays(hotel_to_buy) if hotel_to_buy else [],
+                                   format_func=lambda stay: f"{stay[0]} to {stay[1]}")
+best_ask = order_book.best_ask(hotel_to_buy, *stay_to_buy) if stay_to_buy else None
+token_id_listed = best_ask.token_id if best_ask else None
+st.sidebar.write("Token ID", token_id_listed)
 
 # Query seller's address from selected token
-seller_address = df_hotels_on_secondary_market_list.loc[str(token_id_listed),'seller address']
+seller_address = best_ask.seller_address if best_ask else None
 st.sidebar.write("Seller Address", seller_address)
 
 # Query and display buyer's address
@@ -212,10 +219,7 @@ st.sidebar.markdown("Ethereum Balance Available")
 st.sidebar.write(get_balance(w3_wallet,account.address)) 
 
 # Query and display room price
-requested_price = df_hotels_on_secondary_market_list.loc[str(token_id_listed),'price listed (Eth)']
-
-# Convert requested price to float
-requested_price = float(requested_price)
+requested_price = best_ask.price_eth if best_ask else 0.0
 st.sidebar.write('Hotel Room Price (ETH)')
 st.sidebar.write(requested_price)
 
@@ -226,48 +230,21 @@ price_to_pay_seller = st.sidebar.number_input(label="Purchase Price", min_value=
 
 # Function to purchase and transfer hotel room NFT
 if st.sidebar.button("Pay Seller & Transfer NFT Ownership"):
-    contract.functions.transferFrom(seller_address,buyer_address,token_id_listed).transact({"from": seller_address, "gas": 3000000})
-    st.sidebar.write("#### Just transfered ownership of token ID: ",token_id_listed)
-
-    # make payment to seller
-    transaction_hash = send_transaction(w3_wallet,account,seller_address,price_to_pay_seller)
+    # The matcher claims the cheapest listing still available for the stay, so two buyers cannot get the same one
+    try:
+        trade = matcher.buy(account, hotel_to_buy, *stay_to_buy, price_to_pay_seller) if stay_to_buy else None
+    except (ValueError, RuntimeError) as error:
+        st.sidebar.error(str(error))
+        st.stop()
+    if trade is None:
+        st.sidebar.error("No reservation for this stay is available at this price")
+        st.stop()
 
-    # Markdown for the transaction hash
-    st.sidebar.markdown("#### Validated Transaction Hash")
-
-    # Write the returned transaction hash to the screen
-    st.sidebar.write(transaction_hash)
-
-### JAMES THIS IS WHERE YOU NEED TO FIX
-    # Remove hotel from available list
-    Index_to_delete = df_hotels_on_secondary_market_list.index(token_id_listed)
-    df_hotels_on_secondary_market_list = df_hotels_on_secondary_market_list[Index_to_delete].remove()
-
-    # Re-write CSV
-    df_hotels_on_secondary_market_list.to_csv('hotels_on_secondary_market_list.csv', index = False, header= None)
-
-    # Celebrate your successful payment
-    st.balloons()
-
-
-## Transfer NFT ownership
-
-# Function to transfer NFT ownership only
-if st.sidebar.button("Transfer NFT Ownership"):
-
-    # Perform Contract function
-    contract.functions.transferFrom(seller_address,buyer_address,token_id_listed).transact({"from": seller_address, "gas": 3000000})
-
-    # Display success message
-    st.sidebar.write("#### Just transfered ownership of token ID: ",token_id_listed)
-
-    # Celebrate your successful transfer
-    st.balloons()
+    st.sidebar.write("#### Just transfered ownership of token ID: ",trade.token_id)
 
-# Function to send payment only
-if st.sidebar.button("Send Payment"):
+    # The payment to the seller is made by the matcher
+    transaction_hash = trade.payment_tx
 
-    transaction_hash = send_transaction(w3_wallet,account,seller_address,price_to_pay_seller)
     # Markdown for the transaction hash
     st.sidebar.markdown("#### Validated Transaction Hash")
 
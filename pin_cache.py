@@ -0,0 +1,292 @@
+# Pin Cache
+################################################################################
+
+# This file computes IPFS CIDv1 values locally and keeps a persistent index of content already pinned to Pinata.
+# Duplicate pins are skipped entirely, and new content is uploaded by a background batch pinner, so the caller
+# gets the CID (and can build the `ipfs://` token URI) before the upload has finished.
+#
+# Because that CID may already be minted into a token URI, a failed upload is retried, and content that still is
+# not pinned is kept in the index so a periodic sweep (or `python pin_cache.py sweep`) uploads it later.
+
+################################################################################
+# Imports
+import os
+import sys
+import json
+import time
+import logging
+import base64
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
+from pinata import pin_file_to_ipfs
+from metrics import record_cache, record_error
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+PIN_INDEX_PATH = os.getenv("PIN_INDEX_PATH", ".cache/pins.sqlite3")
+PIN_WORKERS = int(os.getenv("PIN_WORKERS", 4))
+PIN_RETRIES = int(os.getenv("PIN_RETRIES", 3))
+PIN_RETRY_DELAY = float(os.getenv("PIN_RETRY_DELAY", 2))
+# How often unpinned content is uploaded again, and how old it must be so uploads still in flight are left alone
+PIN_SWEEP_INTERVAL = float(os.getenv("PIN_SWEEP_INTERVAL", 300))
+PIN_SWEEP_AGE = float(os.getenv("PIN_SWEEP_AGE", 120))
+
+logger = logging.getLogger(__name__)
+
+# Content up to one chunk is stored as a single raw block, which is what makes the CID computable locally
+MAX_SINGLE_BLOCK_SIZE = 256 * 1024
+
+# Multicodec and multihash prefixes used by CIDv1
+CID_VERSION_1 = 0x01
+RAW_CODEC = 0x55
+SHA2_256 = 0x12
+
+################################################################################
+# CID computation
+
+def serialize_json(content):
+    """Serialize content the same way every time, so equal content always gets the same CID."""
+    return json.dumps(content, separators=(",", ":"), sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+
+def compute_cid(data):
+    """Return the base32 CIDv1 of bytes stored as a single raw block, or None if they span several blocks."""
+    if len(data) > MAX_SINGLE_BLOCK_SIZE:
+        return None
+    digest = hashlib.sha256(data).digest()
+    cid = bytes([CID_VERSION_1, RAW_CODEC, SHA2_256, len(digest)]) + digest
+    # Multibase "b" prefix: lower case base32 without padding
+    return "b" + base64.b32encode(cid).decode("ascii").lower().rstrip("=")
+
+################################################################################
+# Pinned content index
+
+class PinIndex:
+    """Persistent map of local CID -> pinned IPFS hash, shared by every process using the same file."""
+
+    def __init__(self, path=PIN_INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pins ("
+                " cid TEXT PRIMARY KEY,"
+                " ipfs_hash TEXT,"
+                " status TEXT NOT NULL,"
+                " size INTEGER,"
+                " updated_at REAL NOT NULL)"
+            )
+            # Content of CIDs that are not pinned yet, so they can be uploaded again later
+            if "data" not in [column[1] for column in conn.execute("PRAGMA table_info(pins)")]:
+                conn.execute("ALTER TABLE pins ADD COLUMN data BLOB")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, cid):
+        """Return the pinned IPFS hash for a CID, or None if it has not been pinned."""
+        row = self._connection().execute(
+            "SELECT ipfs_hash FROM pins WHERE cid = ? AND status = 'pinned'", (cid,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def record(self, cid, status, ipfs_hash=None, size=None, data=None):
+        """Store a CID's status; `data` is kept until the content is pinned."""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pins (cid, ipfs_hash, status, size, updated_at, data)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (cid, ipfs_hash, status, size, time.time(), None if status == "pinned" else data),
+            )
+
+    def unpinned(self, older_than, limit=100):
+        """Return [(cid, data)] of content that is still not pinned and was last touched before `older_than`."""
+        return self._connection().execute(
+            "SELECT cid, data FROM pins WHERE status != 'pinned' AND data IS NOT NULL AND updated_at < ?"
+            " ORDER BY updated_at LIMIT ?",
+            (older_than, limit),
+        ).fetchall()
+
+    def mismatches(self):
+        """(local CID, pinned IPFS hash) of every upload Pinata stored under a different CID than computed here."""
+        return self._connection().execute(
+            "SELECT cid, ipfs_hash FROM pins WHERE status = 'pinned' AND ipfs_hash != cid"
+        ).fetchall()
+
+    def counts(self):
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM pins GROUP BY status").fetchall()
+        return dict(rows)
+
+################################################################################
+# Background batch pinner
+
+class BatchPinner:
+    """Uploads documents to Pinata concurrently, skipping anything the index says is already pinned."""
+
+    def __init__(self, index=None, max_workers=PIN_WORKERS):
+        self.index = index or PinIndex()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pinner")
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {"skipped": 0, "uploaded": 0, "failed": 0, "mismatched": 0, "retried": 0}
+        self._sweeper = None
+        self._cids_trusted = None
+
+    def local_cids_trusted(self):
+        """False once Pinata has pinned anything under a CID other than the one computed locally."""
+        if self._cids_trusted is None:
+            self._cids_trusted = not self.index.mismatches()
+        return self._cids_trusted
+
+    def _upload(self, cid, data, name):
+        for attempt in range(PIN_RETRIES + 1):
+            try:
+                ipfs_hash = pin_file_to_ipfs(data, name=name, options={"cidVersion": 1})
+                break
+            except Exception as error:
+                if attempt < PIN_RETRIES:
+                    with self._lock:
+                        self._stats["retried"] += 1
+                    time.sleep(PIN_RETRY_DELAY * (2 ** attempt))
+                    continue
+                # The content stays in the index, so the next sweep tries again
+                self.index.record(cid, "failed", size=len(data), data=data)
+                record_error("pinata.pin", type(error).__name__)
+                logger.error("Pinning %s failed after %d attempts: %s", cid, PIN_RETRIES + 1, error)
+                with self._lock:
+                    self._stats["failed"] += 1
+                    self._in_flight.pop(cid, None)
+                raise
+
+        # Record the pin before leaving the in-flight map, so no other session uploads it again in between
+        self.index.record(cid, "pinned", ipfs_hash=ipfs_hash, size=len(data))
+        if ipfs_hash != cid:
+            # Anything already minted with the local CID may not resolve; both hashes are kept in the index
+            logger.error("Pinata pinned %s as %s; token URIs using the local CID may not resolve", cid, ipfs_hash)
+            record_error("pinata.pin", "cid_mismatch")
+            self._cids_trusted = False
+        with self._lock:
+            self._stats["uploaded"] += 1
+            if ipfs_hash != cid:
+                self._stats["mismatched"] += 1
+            self._in_flight.pop(cid, None)
+        return ipfs_hash
+
+    def submit(self, data, name=None):
+        """Queue bytes for pinning and return (cid, future); the future resolves to the pinned IPFS hash."""
+        cid = compute_cid(data)
+        if cid is None:
+            # Multi-block content cannot be addressed locally, so it is simply uploaded
+            future = self._executor.submit(pin_file_to_ipfs, data, name=name, options={"cidVersion": 1})
+            return None, future
+
+        pinned = self.index.lookup(cid)
+        record_cache("pinata.pin", pinned is not None)
+        if pinned is not None:
+            future = Future()
+            future.set_result(pinned)
+            with self._lock:
+                self._stats["skipped"] += 1
+            return cid, future
+
+        with self._lock:
+            # The same document may already be on its way up from another session
+            future = self._in_flight.get(cid)
+            if future is not None:
+                self._stats["skipped"] += 1
+                return cid, future
+            self.index.record(cid, "pending", size=len(data), data=data)
+            future = self._executor.submit(self._upload, cid, data, name or f"{cid}.json")
+            self._in_flight[cid] = future
+        self._start_sweeper()
+        return cid, future
+
+    def sweep(self, older_than=None):
+        """Upload again everything the index says is not pinned yet; returns how many were queued."""
+        older_than = time.time() - PIN_SWEEP_AGE if older_than is None else older_than
+        queued = 0
+        for cid, data in self.index.unpinned(older_than):
+            with self._lock:
+                if cid in self._in_flight:
+                    continue
+                self.index.record(cid, "pending", size=len(data), data=data)
+                self._in_flight[cid] = self._executor.submit(self._upload, cid, bytes(data), f"{cid}.json")
+            queued += 1
+        return queued
+
+    def _start_sweeper(self):
+        with self._lock:
+            if self._sweeper is not None or PIN_SWEEP_INTERVAL <= 0:
+                return
+            def run():
+                while True:
+                    time.sleep(PIN_SWEEP_INTERVAL)
+                    try:
+                        self.sweep()
+                    except Exception:
+                        logger.exception("Pin sweep failed")
+            self._sweeper = threading.Thread(target=run, name="pin-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def submit_json(self, content, name=None):
+        return self.submit(serialize_json(content), name=name)
+
+    def pin_many(self, contents, on_complete=None):
+        """Queue many JSON documents at once; `on_complete(cid, future)` fires as each upload finishes."""
+        submitted = [self.submit_json(content) for content in contents]
+        if on_complete is not None:
+            for cid, future in submitted:
+                future.add_done_callback(lambda done, cid=cid: on_complete(cid, done))
+        return submitted
+
+    def pending(self):
+        with self._lock:
+            return len(self._in_flight)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._in_flight)
+        stats["index"] = self.index.counts()
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+# Shared pinner for every Streamlit session in this process
+pinner = BatchPinner()
+
+
+def pin_json(content, wait=False):
+    """Return the IPFS CID for JSON content, pinning it in the background unless it is already pinned.
+
+    Waits for Pinata's hash instead when the local CID cannot be trusted: content too large for one raw block,
+    or a Pinata setup that has already pinned something under a different CID.
+    """
+    cid, future = pinner.submit_json(content)
+    if wait or cid is None or future.done() or not pinner.local_cids_trusted():
+        return future.result()
+    return cid
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["sweep"]:
+        logging.basicConfig(level=logging.INFO)
+        queued = pinner.sweep(older_than=time.time())
+        pinner.shutdown(wait=True)
+        print(f"Re-uploaded {queued} unpinned documents; index: {pinner.index.counts()}")
+    else:
+        print("Usage: python pin_cache.py sweep")
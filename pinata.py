@@ -1,9 +1,16 @@
+import io
 import os
 import json
-import requests
+import uuid
+import itertools
+from http_client import http
+from metrics import timed
 from dotenv import load_dotenv
 load_dotenv()
 
+# Base URL of the Pinata API, overridable to point at a local stand-in (see benchmarks/fake_services.py)
+PINATA_API_URL = os.getenv("PINATA_API_URL", "https://api.pinata.cloud").rstrip("/")
+
 json_headers = {
     "Content-Type": "application/json",
     "pinata_api_key": os.getenv("PINATA_API_KEY"),
@@ -19,22 +26,140 @@ def convert_data_to_json(content):
     data = {"pinataOptions": {"cidVersion": 1}, "pinataContent": content}
     return json.dumps(data)
 
-def pin_file_to_ipfs(data):
-    r = requests.post(
-        "https://api.pinata.cloud/pinning/pinFileToIPFS",
-        files={'file': data},
-        headers=file_headers
-    )
-    print(r.json())
+# Size of each piece of the multipart body handed to the connection
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class MultipartStream:
+    """Multipart/form-data body that is produced chunk by chunk instead of being built in memory.
+
+    Accepts bytes, a file path, a file-like object or an iterator of bytes as the file source.
+    """
+
+    def __init__(self, source, name=None, fields=None, chunk_size=UPLOAD_CHUNK_SIZE, progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._owns_file = False
+
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        elif isinstance(source, (str, os.PathLike)):
+            name = name or os.path.basename(source)
+            source = open(source, "rb")
+            self._owns_file = True
+        self.source = source
+        name = name or os.path.basename(getattr(source, "name", "") or "") or "file"
+
+        # Everything except the file content is small, so the head and tail are built up front
+        head = b""
+        for field, value in (fields or {}).items():
+            head += (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{field}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode("utf-8")
+        head += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        self.head = head
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self.file_size = self._measure()
+        self._start = self.source.tell() if self.rewindable else None
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def rewindable(self):
+        return hasattr(self.source, "seek") and hasattr(self.source, "tell") and getattr(self.source, "seekable", lambda: True)()
+
+    def _measure(self):
+        # The remaining length of a seekable file is known without reading it
+        if not self.rewindable:
+            return None
+        position = self.source.tell()
+        self.source.seek(0, io.SEEK_END)
+        size = self.source.tell() - position
+        self.source.seek(position)
+        return size
+
+    def __len__(self):
+        # requests sends a Content-Length when the size is known, and chunked transfer encoding otherwise
+        if self.file_size is None:
+            return 0
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def _file_chunks(self):
+        if hasattr(self.source, "read"):
+            if self._start is not None:
+                self.source.seek(self._start)
+            while True:
+                chunk = self.source.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            for chunk in self.source:
+                # Re-slice so no single piece is larger than the chunk size
+                for offset in range(0, len(chunk), self.chunk_size):
+                    yield chunk[offset:offset + self.chunk_size]
+
+    def __iter__(self):
+        sent = 0
+        total = len(self) or None
+        for chunk in itertools.chain([self.head], self._file_chunks(), [self.tail]):
+            sent += len(chunk)
+            if self.progress is not None:
+                self.progress(sent, total)
+            yield chunk
+
+    def close(self):
+        if self._owns_file:
+            self.source.close()
+
+
+@timed("pinata.pin_file")
+def pin_file_to_ipfs(data, name=None, options=None, chunk_size=UPLOAD_CHUNK_SIZE, progress=None):
+    """Stream a file to Pinata and return its IPFS hash.
+
+    `data` may be bytes, a file path, a file-like object or an iterator of bytes. `progress`, if given,
+    is called with (bytes_sent, total_bytes or None) as the upload proceeds.
+    """
+    # Optional pinataOptions (e.g. {"cidVersion": 1}) go along as a form field
+    fields = {"pinataOptions": json.dumps(options)} if options else None
+    body = MultipartStream(data, name=name, fields=fields, chunk_size=chunk_size, progress=progress)
+    headers = dict(file_headers, **{"Content-Type": body.content_type})
+
+    try:
+        # Pinning is content addressed, so sending the same upload again is safe as long as it can be replayed
+        r = http.post(
+            f"{PINATA_API_URL}/pinning/pinFileToIPFS",
+            endpoint="pinata_file",
+            retry_non_idempotent=True,
+            max_retries=None if body.rewindable else 0,
+            data=body,
+            headers=headers
+        )
+    finally:
+        body.close()
+    r.raise_for_status()
     ipfs_hash = r.json()["IpfsHash"]
     return ipfs_hash
 
+@timed("pinata.pin_json")
 def pin_json_to_ipfs(json):
-    r = requests.post(
-        "https://api.pinata.cloud/pinning/pinJSONToIPFS",
+    r = http.post(
+        f"{PINATA_API_URL}/pinning/pinJSONToIPFS",
+        endpoint="pinata",
+        retry_non_idempotent=True,
         data=json,
         headers=json_headers
     )
-    print(r.json())
+    r.raise_for_status()
     ipfs_hash = r.json()["IpfsHash"]
     return ipfs_hash
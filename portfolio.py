@@ -0,0 +1,139 @@
+# Portfolio
+################################################################################
+
+# This file lists the reservations one wallet owns, using the ERC721Enumerable functions of
+# HotelReservationRegistry: `balanceOf` gives the number of tokens, then every `tokenOfOwnerByIndex` and every
+# `roomconfirmation` is read in one batched pass (`batch_rpc.py`), all at the same block. The cost grows with
+# the wallet's holdings, not with the total supply.
+#
+# A wallet's portfolio is cached until a Transfer involving that wallet (or a Price update of one of its tokens)
+# shows up in the contract's logs, which are polled at most once per PORTFOLIO_POLL_INTERVAL.
+
+################################################################################
+# Imports
+import os
+import time
+import threading
+from dataclasses import dataclass
+from batch_rpc import batch_call
+from reservation_codec import decode_reservation
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+PORTFOLIO_POLL_INTERVAL = float(os.getenv("PORTFOLIO_POLL_INTERVAL", 1))
+
+################################################################################
+# Service
+
+@dataclass
+class Portfolio:
+    owner: str
+    block_number: int
+    # token ID -> [hotel name, start date, end date, confirmation, value], in enumeration order
+    reservations: dict
+
+    def token_ids(self, as_of=None):
+        """Token IDs held, optionally only those whose stay has not ended by `as_of` (a date)."""
+        if as_of is None:
+            return list(self.reservations)
+        as_of = str(as_of)
+        return [token_id for token_id, booking in self.reservations.items() if booking[2] >= as_of]
+
+
+class PortfolioService:
+    """Per-owner portfolio cache, invalidated by the contract's Transfer and Price events."""
+
+    def __init__(self, w3, contract, poll_interval=PORTFOLIO_POLL_INTERVAL):
+        self.w3 = w3
+        self.contract = contract
+        self.poll_interval = poll_interval
+        self._portfolios = {}
+        self._synced_block = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidated": 0}
+
+    def _sync(self):
+        """Drop the portfolios touched by events since the last sync; returns the block synced to."""
+        now = time.monotonic()
+        with self._lock:
+            if self._synced_block is not None and now - self._synced_at < self.poll_interval:
+                return self._synced_block
+            from_block = None if self._synced_block is None else self._synced_block + 1
+
+        head = self.w3.eth.block_number
+        touched = set()
+        if from_block is not None and from_block <= head:
+            for event in self.contract.events.Transfer.getLogs(fromBlock=from_block, toBlock=head):
+                touched.update((event["args"]["from"].lower(), event["args"]["to"].lower()))
+            price_updates = self.contract.events.Price.getLogs(fromBlock=from_block, toBlock=head)
+        else:
+            price_updates = []
+
+        with self._lock:
+            updated_tokens = {event["args"]["token_id"] for event in price_updates}
+            for owner, portfolio in list(self._portfolios.items()):
+                if owner in touched or not updated_tokens.isdisjoint(portfolio.reservations):
+                    del self._portfolios[owner]
+                    self._stats["invalidated"] += 1
+            if self._synced_block is None or head > self._synced_block:
+                self._synced_block = head
+            self._synced_at = now
+            return self._synced_block
+
+    def _fetch(self, owner, block):
+        functions = self.contract.functions
+        count = functions.balanceOf(owner).call(block_identifier=block)
+        token_ids = batch_call(self.w3, [functions.tokenOfOwnerByIndex(owner, index) for index in range(count)],
+                               block_identifier=block)
+        bookings = batch_call(self.w3, [functions.roomconfirmation(token_id) for token_id in token_ids],
+                              block_identifier=block)
+        return Portfolio(owner, block, {
+            token_id: decode_reservation(booking) for token_id, booking in zip(token_ids, bookings)
+        })
+
+    def get_portfolio(self, owner):
+        """Return the Portfolio of `owner`, read from the chain only if a Transfer touched it since last time."""
+        key = owner.lower()
+        block = self._sync()
+        with self._lock:
+            portfolio = self._portfolios.get(key)
+            self._stats["hits" if portfolio is not None else "misses"] += 1
+        if portfolio is not None:
+            return portfolio
+
+        # Reading at the synced block means any later Transfer is still seen by the next sync
+        portfolio = self._fetch(owner, block)
+        with self._lock:
+            # If another thread synced past our block meanwhile, its invalidations could not see this entry
+            if self._synced_block == block:
+                self._portfolios[key] = portfolio
+        return portfolio
+
+    def invalidate(self, owner=None):
+        """Forget one owner (e.g. right after it sent or received a token) or everyone."""
+        with self._lock:
+            if owner is None:
+                self._portfolios = {}
+            else:
+                self._portfolios.pop(owner.lower(), None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, block=self._synced_block, cached=len(self._portfolios))
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_portfolio_service(w3, contract):
+    """Return the shared portfolio service for a web3 instance and contract."""
+    key = (id(w3), contract.address)
+    with _services_lock:
+        if key not in _services:
+            _services[key] = PortfolioService(w3, contract)
+        return _services[key]
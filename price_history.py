@@ -0,0 +1,441 @@
+# Price History
+################################################################################
+
+# This file keeps a time series of room prices per hotel and stay date, built from two sources: the contract's
+# Price events (read from the local reservation index) and the quotes returned by every Booking.com search.
+#
+# Points are stored column by column in compressed segments (delta-encoded timestamps, prices and sources, each
+# zlib-compressed), one partition per (hotel, check-in date). Rolling statistics - count, min, max, an
+# exponential moving average and P² estimates of the 10th/50th/90th percentiles - are updated point by point
+# as data arrives and kept in memory, so a fair-value lookup for a token is a dictionary read rather than a scan.
+# The cached statistics are reloaded whenever another connection has committed (SQLite's `data_version`), so
+# points flushed by other processes are seen too.
+
+################################################################################
+# Imports
+import os
+import time
+import json
+import zlib
+import atexit
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+PRICE_HISTORY_PATH = os.getenv("PRICE_HISTORY_PATH", ".cache/price_history.sqlite3")
+# Buffered points are written at most this many seconds after they arrive
+PRICE_FLUSH_INTERVAL = float(os.getenv("PRICE_FLUSH_INTERVAL", 30))
+# Smoothing factor of the moving average; higher follows recent prices more closely
+PRICE_EMA_ALPHA = float(os.getenv("PRICE_EMA_ALPHA", 0.2))
+# Points per compressed segment before a new one is started
+SEGMENT_POINTS = 1024
+
+QUOTE, EVENT = 0, 1
+SOURCES = {QUOTE: "quote", EVENT: "event"}
+
+# Statistics for every stay date of a hotel are kept under this pseudo date
+ALL_DATES = "*"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    hotel TEXT NOT NULL,
+    stay_date TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    first_ts REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    points INTEGER NOT NULL,
+    timestamps BLOB NOT NULL,
+    prices BLOB NOT NULL,
+    sources BLOB NOT NULL,
+    PRIMARY KEY (hotel, stay_date, segment)
+);
+CREATE TABLE IF NOT EXISTS stats (
+    hotel TEXT NOT NULL,
+    stay_date TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (hotel, stay_date)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+################################################################################
+# Incremental statistics
+
+class P2Quantile:
+    """Streaming quantile estimate with the P² algorithm (Jain & Chlamtac): five markers, O(1) per point."""
+
+    def __init__(self, p, state=None):
+        self.p = p
+        if state is None:
+            self.heights = []
+            self.positions = [1, 2, 3, 4, 5]
+            self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        else:
+            self.heights, self.positions, self.desired = state["heights"], state["positions"], state["desired"]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def state(self):
+        return {"heights": self.heights, "positions": self.positions, "desired": self.desired}
+
+    def add(self, value):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            offset = self.desired[i] - self.positions[i]
+            if (offset >= 1 and self.positions[i + 1] - self.positions[i] > 1) or \
+                    (offset <= -1 and self.positions[i - 1] - self.positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / \
+                        (self.positions[i + step] - self.positions[i])
+                heights[i] = height
+                self.positions[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            # Too few points for the markers, so use the exact quantile of what has been seen
+            ordered = sorted(self.heights)
+            return ordered[min(len(ordered) - 1, int(round(self.p * (len(ordered) - 1))))]
+        return self.heights[2]
+
+
+class RollingStats:
+    """Count, min, max, EMA and P² percentiles of a price series, updated one point at a time."""
+
+    QUANTILES = {"p10": 0.1, "p50": 0.5, "p90": 0.9}
+
+    def __init__(self, state=None, alpha=PRICE_EMA_ALPHA):
+        state = state or {}
+        self.alpha = alpha
+        self.count = state.get("count", 0)
+        self.min = state.get("min")
+        self.max = state.get("max")
+        self.ema = state.get("ema")
+        self.last_ts = state.get("last_ts")
+        self.quantiles = {name: P2Quantile(p, state.get(name)) for name, p in self.QUANTILES.items()}
+
+    def add(self, value, ts):
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.ema = value if self.ema is None else self.alpha * value + (1 - self.alpha) * self.ema
+        self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        for quantile in self.quantiles.values():
+            quantile.add(value)
+
+    def state(self):
+        state = {"count": self.count, "min": self.min, "max": self.max, "ema": self.ema, "last_ts": self.last_ts}
+        state.update({name: quantile.state() for name, quantile in self.quantiles.items()})
+        return state
+
+    def summary(self):
+        summary = {"count": self.count, "min": self.min, "max": self.max, "ema": self.ema, "last_ts": self.last_ts}
+        summary.update({name: quantile.value() for name, quantile in self.quantiles.items()})
+        return summary
+
+################################################################################
+# Column encoding
+
+def encode_segment(timestamps, prices, sources):
+    """Compress three columns: millisecond timestamps as deltas, prices as doubles, sources as bytes."""
+    millis = [int(round(ts * 1000)) for ts in timestamps]
+    deltas = array("q", [millis[0]] + [b - a for a, b in zip(millis, millis[1:])])
+    return (
+        zlib.compress(deltas.tobytes()),
+        zlib.compress(array("d", prices).tobytes()),
+        zlib.compress(array("B", sources).tobytes()),
+    )
+
+
+def decode_segment(timestamps_blob, prices_blob, sources_blob):
+    deltas = array("q")
+    deltas.frombytes(zlib.decompress(timestamps_blob))
+    millis, total = [], 0
+    for delta in deltas:
+        total += delta
+        millis.append(total)
+    prices = array("d")
+    prices.frombytes(zlib.decompress(prices_blob))
+    sources = array("B")
+    sources.frombytes(zlib.decompress(sources_blob))
+    return [ms / 1000 for ms in millis], list(prices), list(sources)
+
+################################################################################
+# Store
+
+class PriceHistory:
+    """Partitioned, compressed price time series with incrementally maintained statistics."""
+
+    def __init__(self, path=PRICE_HISTORY_PATH, flush_interval=PRICE_FLUSH_INTERVAL):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._stats = {}
+        self._flusher = None
+        self._version_conn = None
+        self._data_version = None
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _load_stats(self, key):
+        row = self._connection().execute(
+            "SELECT state FROM stats WHERE hotel = ? AND stay_date = ?", key
+        ).fetchone()
+        return RollingStats(json.loads(row[0]) if row else None)
+
+    def _stats_for(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = self._load_stats(key)
+            # Points this process has not flushed yet are not in the stored state
+            for pending_key, points in self._pending.items():
+                if pending_key == key or (key[1] == ALL_DATES and pending_key[0] == key[0]):
+                    for ts, price, _ in points:
+                        stats.add(price, ts)
+        return stats
+
+    def _sync_stats(self):
+        """Drop cached statistics if any other connection (another process or thread) committed since last time."""
+        if self._version_conn is None:
+            # One connection for the whole store: data_version only counts commits made by other connections
+            self._version_conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None,
+                                                 check_same_thread=False)
+        version = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._data_version is not None and version != self._data_version:
+            self._stats = {}
+        self._data_version = version
+
+    # Writing
+
+    def record(self, hotel, stay_date, price, source=QUOTE, ts=None):
+        self.record_many([(hotel, stay_date, price, source, ts)])
+
+    def record_many(self, points):
+        """Add (hotel, stay_date, price, source, ts) points; ts defaults to now. Statistics update immediately."""
+        now = time.time()
+        with self._lock:
+            for hotel, stay_date, price, source, ts in points:
+                if hotel is None or price is None:
+                    continue
+                key, ts, price = (str(hotel), str(stay_date)[:10]), ts or now, float(price)
+                # Loaded before the point is buffered, so it is not counted twice
+                stats, hotel_stats = self._stats_for(key), self._stats_for((key[0], ALL_DATES))
+                self._pending.setdefault(key, []).append((ts, price, source))
+                stats.add(price, ts)
+                hotel_stats.add(price, ts)
+            self._start_flusher()
+
+    def _start_flusher(self):
+        if self._flusher is None and self.flush_interval > 0:
+            def run():
+                while True:
+                    time.sleep(self.flush_interval)
+                    self.flush()
+            self._flusher = threading.Thread(target=run, name="price-history-flush", daemon=True)
+            self._flusher.start()
+
+    def flush(self):
+        """Write buffered points to their partitions and persist the statistics; returns the points written."""
+        # Recording waits for the flush, which keeps the in-memory statistics in step with what is stored
+        with self._lock:
+            pending = self._pending
+            if not pending:
+                return 0
+
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                refreshed = self._write(conn, pending)
+                conn.execute("COMMIT")
+            except Exception:
+                # The points stay pending for the next attempt
+                conn.execute("ROLLBACK")
+                raise
+
+            self._pending = {}
+            self._stats.update(refreshed)
+            return sum(len(points) for points in pending.values())
+
+    def _write(self, conn, pending):
+        """Store {key: [(ts, price, source)]} and its statistics inside the caller's transaction."""
+        refreshed = {}
+        for key, points in pending.items():
+            points = sorted(points)
+            self._append_points(conn, key, points)
+            # Apply the points on top of what other processes may have stored meanwhile
+            for stats_key in (key, (key[0], ALL_DATES)):
+                stats = refreshed.get(stats_key) or self._load_stats(stats_key)
+                for ts, price, _ in points:
+                    stats.add(price, ts)
+                refreshed[stats_key] = stats
+        conn.executemany(
+            "INSERT OR REPLACE INTO stats (hotel, stay_date, state) VALUES (?, ?, ?)",
+            [(hotel, stay_date, json.dumps(stats.state())) for (hotel, stay_date), stats in refreshed.items()],
+        )
+        return refreshed
+
+    def _append_points(self, conn, key, points):
+        last = conn.execute(
+            "SELECT segment, points, timestamps, prices, sources FROM segments"
+            " WHERE hotel = ? AND stay_date = ? ORDER BY segment DESC LIMIT 1",
+            key,
+        ).fetchone()
+        segment = 0
+        if last is not None:
+            segment = last[0]
+            if last[1] < SEGMENT_POINTS:
+                # Top up the last segment instead of leaving many tiny ones behind
+                timestamps, prices, sources = decode_segment(*last[2:])
+                points = sorted(list(zip(timestamps, prices, sources)) + points)
+            else:
+                segment += 1
+
+        while points:
+            chunk, points = points[:SEGMENT_POINTS], points[SEGMENT_POINTS:]
+            timestamps, prices, sources = zip(*chunk)
+            conn.execute(
+                "INSERT OR REPLACE INTO segments (hotel, stay_date, segment, first_ts, last_ts, points, timestamps,"
+                " prices, sources) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, segment, timestamps[0], timestamps[-1], len(chunk), *encode_segment(timestamps, prices, sources)),
+            )
+            segment += 1
+
+    def record_quotes(self, hotel_data, checkin_date, currency="USD"):
+        """Record the total price of every hotel in a `get_hotels` response as a quote for that stay."""
+        if currency != "USD":
+            # Prices on chain are in USD, so only USD quotes are comparable
+            return
+        points = []
+        for hotel in (hotel_data or {}).get("result") or []:
+            price = (hotel.get("price_breakdown") or {}).get("all_inclusive_price")
+            points.append((hotel.get("hotel_name"), checkin_date, price, QUOTE, None))
+        self.record_many(points)
+
+    def ingest_price_events(self, reservation_store):
+        """Add Price events indexed since the last call; returns how many were added.
+
+        The cursor is read, the events' points written and the cursor advanced in one write transaction, under the
+        same lock as recording, so concurrent sessions (or processes) each claim a different range of events, none
+        is counted twice, and none is lost if the process dies. Buffered quotes are flushed along with them.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'price_event_cursor'").fetchone()
+                block_number, log_index = json.loads(row[0]) if row else (-1, -1)
+                events = reservation_store.price_events_after(block_number, log_index)
+                points = {key: list(key_points) for key, key_points in self._pending.items()}
+                now = time.time()
+                for event in events:
+                    if event["hotel_name"] is None or event["hotel_room_value"] is None:
+                        continue
+                    key = (str(event["hotel_name"]), str(event["start_date"])[:10])
+                    points.setdefault(key, []).append((now, float(event["hotel_room_value"]), EVENT))
+                refreshed = self._write(conn, points) if points else {}
+                if events:
+                    last = events[-1]
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('price_event_cursor', ?)",
+                                 (json.dumps([last["block_number"], last["log_index"]]),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._pending = {}
+            self._stats.update(refreshed)
+        return len(events)
+
+    # Reading
+
+    def stats(self, hotel, stay_date=ALL_DATES):
+        """Rolling statistics for one partition (or every date of a hotel), including unflushed points."""
+        with self._lock:
+            self._sync_stats()
+            return self._stats_for((str(hotel), str(stay_date)[:10] if stay_date != ALL_DATES else ALL_DATES)).summary()
+
+    def fair_value(self, hotel, stay_date):
+        """Estimate what a stay is worth: the median of that date's prices, else of the hotel's, else None."""
+        for scope, date in (("date", stay_date), ("hotel", ALL_DATES)):
+            summary = self.stats(hotel, date)
+            if summary["count"]:
+                return dict(summary, scope=scope, fair_value=summary["p50"])
+        return None
+
+    def fair_value_for_token(self, token_id, reservation_store):
+        reservation = reservation_store.get_reservation(token_id)
+        if reservation is None:
+            return None
+        return self.fair_value(reservation["hotel_name"], reservation["start_date"])
+
+    def history(self, hotel, stay_date):
+        """Return every point of a partition as columns: {"ts": [...], "price": [...], "source": [...]}."""
+        rows = self._connection().execute(
+            "SELECT timestamps, prices, sources FROM segments WHERE hotel = ? AND stay_date = ? ORDER BY segment",
+            (str(hotel), str(stay_date)[:10]),
+        )
+        columns = {"ts": [], "price": [], "source": []}
+        for row in rows:
+            timestamps, prices, sources = decode_segment(*row)
+            columns["ts"] += timestamps
+            columns["price"] += prices
+            columns["source"] += [SOURCES[source] for source in sources]
+        with self._lock:
+            for ts, price, source in sorted(self._pending.get((str(hotel), str(stay_date)[:10]), [])):
+                columns["ts"].append(ts)
+                columns["price"].append(price)
+                columns["source"].append(SOURCES[source])
+        return columns
+
+
+# Shared store for the app, the pages and `functions.get_hotels`
+price_history = PriceHistory()
+atexit.register(price_history.flush)
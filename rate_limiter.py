@@ -0,0 +1,105 @@
+# Rate Limiter
+################################################################################
+
+# This file contains a token bucket that is shared by every thread and process on this machine, so Streamlit
+# workers, batch jobs and fan-out searches together stay inside an API quota. The bucket state (tokens left and
+# when it was last refilled) lives in a small SQLite database; taking a token is one IMMEDIATE transaction, so
+# concurrent callers queue on the database lock instead of over-spending.
+#
+# `http_client.py` takes a token before every attempt on an endpoint that has a limiter, retries included.
+
+################################################################################
+# Imports
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", ".cache/rate_limits.sqlite3")
+
+# Booking.com RapidAPI quota: requests per second and how many may be sent back to back (0 disables the limit)
+BOOKING_RATE_LIMIT = float(os.getenv("BOOKING_RATE_LIMIT", 5))
+BOOKING_RATE_BURST = float(os.getenv("BOOKING_RATE_BURST", 5))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+################################################################################
+# Token bucket
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`; `acquire` blocks until a token is free."""
+
+    def __init__(self, name, rate, burst=None, path=RATE_LIMIT_DB_PATH):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # The database is only opened on first use, so building a limiter at import time stays cheap
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, tokens=1, max_wait=None):
+        """Take `tokens` now, going into debt if needed, and return the seconds to wait before using them.
+
+        Callers that run short are queued in the order they reserved, instead of all waking up to race for the
+        next token. With `max_wait`, nothing is taken and RateLimitTimeout is raised if the wait would be longer.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            available = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            wait = max(0.0, tokens - available) / self.rate
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitTimeout(f"No {self.name} token within {max_wait}s")
+            conn.execute(
+                "INSERT INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (self.name, available - tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until `tokens` may be used; returns the seconds spent waiting."""
+        wait = self.reserve(tokens, max_wait=timeout)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def booking_rate_limiter():
+    """The bucket for the Booking.com RapidAPI, or None when the limit is disabled."""
+    if BOOKING_RATE_LIMIT <= 0:
+        return None
+    return TokenBucket("booking", BOOKING_RATE_LIMIT, BOOKING_RATE_BURST)
@@ -0,0 +1,79 @@
+# Reservation Codec
+################################################################################
+
+# This file converts reservation details between their Python form and the compact on-chain layout of
+# HotelConfirmation: dates as uint32 day numbers (days since 1970-01-01), the confirmation UUID as bytes16
+# and the room value as uint64. The pages and pipelines encode before calling the contract and decode what
+# `roomconfirmation` returns.
+
+################################################################################
+# Imports
+import uuid
+import datetime
+
+################################################################################
+# Field encoders
+
+EPOCH = datetime.date(1970, 1, 1)
+MAX_UINT32 = 2 ** 32 - 1
+MAX_UINT64 = 2 ** 64 - 1
+
+
+def encode_date(value):
+    """Convert a date (or ISO 'YYYY-MM-DD' string) into its uint32 day number."""
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    days = (value - EPOCH).days
+    if not 0 <= days <= MAX_UINT32:
+        raise ValueError(f"{value} cannot be stored as a uint32 day number")
+    return days
+
+
+def decode_date(days):
+    return EPOCH + datetime.timedelta(days=int(days))
+
+
+def encode_confirmation(value):
+    """Convert a confirmation UUID (uuid.UUID or string) into 16 bytes."""
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(str(value))
+    return value.bytes
+
+
+def decode_confirmation(value):
+    return uuid.UUID(bytes=bytes(value))
+
+
+def encode_price(value):
+    """Round a room value to a whole number that fits the uint64 field."""
+    value = int(round(float(value)))
+    if not 0 <= value <= MAX_UINT64:
+        raise ValueError(f"{value} cannot be stored as a uint64 room value")
+    return value
+
+################################################################################
+# Whole reservations
+
+def encode_reservation(hotel_name, start_date, end_date, confirmation, hotel_room_value):
+    """Return the HotelConfirmation fields in contract order and types."""
+    return (
+        str(hotel_name),
+        encode_date(start_date),
+        encode_date(end_date),
+        encode_confirmation(confirmation),
+        encode_price(hotel_room_value),
+    )
+
+
+def decode_reservation(fields):
+    """Decode a `roomconfirmation` result into [name, start 'YYYY-MM-DD', end 'YYYY-MM-DD', confirmation, value]."""
+    hotel_name, start_date, end_date, confirmation, hotel_room_value = fields
+    return [
+        hotel_name,
+        decode_date(start_date).isoformat(),
+        decode_date(end_date).isoformat(),
+        str(decode_confirmation(confirmation)),
+        int(hotel_room_value),
+    ]
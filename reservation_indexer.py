@@ -0,0 +1,425 @@
+# Reservation Indexer
+################################################################################
+
+# This file mirrors the HotelReservationRegistry contract into a local SQLite database.
+# It follows the Transfer and Price events from a saved block cursor, stores each token's owner, HotelConfirmation
+# fields, tokenURI and price history, and rolls back when the chain reorganizes. The Streamlit pages read from
+# `ReservationStore` instead of making one RPC call per token.
+#
+# Run it next to the app with:  python reservation_indexer.py
+
+################################################################################
+# Imports
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from batch_rpc import batch_call
+from reservation_codec import decode_reservation
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+INDEXER_DB_PATH = os.getenv("INDEXER_DB_PATH", ".cache/reservations.sqlite3")
+INDEXER_START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", 0))
+INDEXER_BATCH_BLOCKS = int(os.getenv("INDEXER_BATCH_BLOCKS", 2000))
+INDEXER_POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", 2))
+
+# How far back a reorg is looked for, and how many blocks to stay behind the head
+REORG_DEPTH = int(os.getenv("INDEXER_REORG_DEPTH", 64))
+CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", 0))
+
+ZERO_ADDRESS = "0x" + "0" * 40
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursor (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    block_number INTEGER NOT NULL,
+    block_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    block_number INTEGER PRIMARY KEY,
+    block_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    token_id INTEGER PRIMARY KEY,
+    owner TEXT,
+    hotel_name TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    confirmation TEXT,
+    hotel_room_value INTEGER,
+    token_uri TEXT,
+    burned INTEGER NOT NULL DEFAULT 0,
+    minted_block INTEGER,
+    updated_block INTEGER
+);
+CREATE INDEX IF NOT EXISTS tokens_owner ON tokens (owner) WHERE burned = 0;
+CREATE INDEX IF NOT EXISTS tokens_hotel ON tokens (hotel_name, start_date);
+CREATE INDEX IF NOT EXISTS tokens_end_date ON tokens (end_date) WHERE burned = 0;
+CREATE TABLE IF NOT EXISTS transfers (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    token_id INTEGER NOT NULL,
+    from_address TEXT NOT NULL,
+    to_address TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS transfers_token ON transfers (token_id, block_number);
+CREATE TABLE IF NOT EXISTS prices (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    token_id INTEGER NOT NULL,
+    hotel_room_value INTEGER NOT NULL,
+    report_uri TEXT,
+    tx_hash TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS prices_token ON prices (token_id, block_number);
+"""
+
+################################################################################
+# Local store
+
+class ReservationStore:
+    """Indexed local mirror of the reservation tokens, safe to read from many threads and processes."""
+
+    def __init__(self, path=INDEXER_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # Cursor
+
+    def cursor(self):
+        """Return (block_number, block_hash) of the last indexed block, or None."""
+        row = self.connection().execute("SELECT block_number, block_hash FROM cursor WHERE id = 0").fetchone()
+        return (row["block_number"], row["block_hash"]) if row else None
+
+    # Queries used by the UI
+
+    def token_count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM tokens WHERE burned = 0").fetchone()[0]
+
+    def active_token_ids(self, as_of=None):
+        """IDs of tokens not burned; with `as_of` (a date), only those whose stay has not ended before it."""
+        if as_of is None:
+            rows = self.connection().execute("SELECT token_id FROM tokens WHERE burned = 0 ORDER BY token_id")
+        else:
+            # Walks the end date index, so the cost follows live inventory rather than every token ever minted
+            rows = self.connection().execute(
+                "SELECT token_id FROM tokens WHERE burned = 0 AND end_date >= ? ORDER BY token_id", (str(as_of),)
+            )
+        return [row["token_id"] for row in rows]
+
+    def expiries_after(self, token_id):
+        """(token_id, end_date) of live tokens minted after `token_id`, for building an expiry schedule."""
+        rows = self.connection().execute(
+            "SELECT token_id, end_date FROM tokens WHERE burned = 0 AND token_id > ? ORDER BY token_id", (token_id,)
+        )
+        return [(row["token_id"], row["end_date"]) for row in rows]
+
+    def live_end_date(self, token_id):
+        """End date of a token that has not been burned, or None."""
+        row = self.connection().execute("SELECT burned, end_date FROM tokens WHERE token_id = ?", (token_id,)).fetchone()
+        return row["end_date"] if row and not row["burned"] else None
+
+    def get_reservation(self, token_id):
+        """Return the indexed token as a dict, or None if it is unknown."""
+        row = self.connection().execute("SELECT * FROM tokens WHERE token_id = ?", (token_id,)).fetchone()
+        return dict(row) if row else None
+
+    def roomconfirmation(self, token_id):
+        """Return the token's decoded HotelConfirmation fields in the same order as the contract getter."""
+        reservation = self.get_reservation(token_id)
+        if reservation is None:
+            return None
+        return [
+            reservation["hotel_name"],
+            reservation["start_date"],
+            reservation["end_date"],
+            reservation["confirmation"],
+            reservation["hotel_room_value"],
+        ]
+
+    def tokens_of_owner(self, owner):
+        rows = self.connection().execute(
+            "SELECT * FROM tokens WHERE owner = ? AND burned = 0 ORDER BY token_id", (owner.lower(),)
+        )
+        return [dict(row) for row in rows]
+
+    def search(self, hotel_name=None, start_date=None, end_date=None, limit=100):
+        """Find live reservations by hotel and stay dates (dates as ISO strings)."""
+        clauses, params = ["burned = 0"], []
+        if hotel_name:
+            clauses.append("hotel_name = ?")
+            params.append(hotel_name)
+        if start_date:
+            clauses.append("start_date >= ?")
+            params.append(str(start_date))
+        if end_date:
+            clauses.append("end_date <= ?")
+            params.append(str(end_date))
+        rows = self.connection().execute(
+            f"SELECT * FROM tokens WHERE {' AND '.join(clauses)} ORDER BY token_id LIMIT ?", params + [limit]
+        )
+        return [dict(row) for row in rows]
+
+    def price_history(self, token_id):
+        rows = self.connection().execute(
+            "SELECT block_number, hotel_room_value, report_uri, tx_hash FROM prices"
+            " WHERE token_id = ? ORDER BY block_number, log_index",
+            (token_id,),
+        )
+        return [dict(row) for row in rows]
+
+    def price_events_after(self, block_number, log_index, limit=10000):
+        """Price events after a (block, log index) position, with the token's hotel and stay dates."""
+        rows = self.connection().execute(
+            "SELECT p.block_number, p.log_index, p.token_id, p.hotel_room_value, t.hotel_name, t.start_date"
+            " FROM prices p JOIN tokens t ON t.token_id = p.token_id"
+            " WHERE (p.block_number, p.log_index) > (?, ?) ORDER BY p.block_number, p.log_index LIMIT ?",
+            (block_number, log_index, limit),
+        )
+        return [dict(row) for row in rows]
+
+################################################################################
+# Indexer
+
+def _hex(value):
+    return value.hex() if hasattr(value, "hex") and not isinstance(value, str) else value
+
+
+class ReservationIndexer:
+    """Follows contract events from the saved cursor and writes them into a `ReservationStore`."""
+
+    def __init__(self, w3, contract, store=None, start_block=INDEXER_START_BLOCK, batch_blocks=INDEXER_BATCH_BLOCKS):
+        self.w3 = w3
+        self.contract = contract
+        self.store = store or ReservationStore()
+        self.start_block = start_block
+        self.batch_blocks = batch_blocks
+
+    # Reorg handling
+
+    def _block_hash(self, block_number):
+        return _hex(self.w3.eth.get_block(block_number)["hash"])
+
+    def _find_fork_point(self):
+        """Return the last indexed block still on the canonical chain, or None if nothing diverged."""
+        cursor = self.store.cursor()
+        if cursor is None or self._block_hash(cursor[0]) == cursor[1]:
+            return None
+
+        rows = self.store.connection().execute(
+            "SELECT block_number, block_hash FROM blocks WHERE block_number < ? ORDER BY block_number DESC LIMIT ?",
+            (cursor[0], REORG_DEPTH),
+        ).fetchall()
+        for row in rows:
+            if self._block_hash(row["block_number"]) == row["block_hash"]:
+                return row["block_number"]
+        # Deeper than we track: start over from the first block
+        return self.start_block - 1
+
+    def _rollback(self, fork_block):
+        """Undo every event after `fork_block` and refresh the tokens they touched."""
+        conn = self.store.connection()
+        with conn:
+            touched = {
+                row[0]
+                for table in ("transfers", "prices")
+                for row in conn.execute(f"SELECT token_id FROM {table} WHERE block_number > ?", (fork_block,))
+            }
+            conn.execute("DELETE FROM transfers WHERE block_number > ?", (fork_block,))
+            conn.execute("DELETE FROM prices WHERE block_number > ?", (fork_block,))
+            conn.execute("DELETE FROM blocks WHERE block_number > ?", (fork_block,))
+            for token_id in touched:
+                self._rebuild_token(conn, token_id)
+            if fork_block < self.start_block:
+                conn.execute("DELETE FROM cursor")
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cursor (id, block_number, block_hash) VALUES (0, ?, ?)",
+                    (fork_block, self._block_hash(fork_block)),
+                )
+
+    def _rebuild_token(self, conn, token_id):
+        # Replay what is left of the token's history after a rollback
+        transfers = conn.execute(
+            "SELECT from_address, to_address, block_number FROM transfers WHERE token_id = ?"
+            " ORDER BY block_number DESC, log_index DESC",
+            (token_id,),
+        ).fetchall()
+        if not transfers:
+            conn.execute("DELETE FROM tokens WHERE token_id = ?", (token_id,))
+            return
+        last = transfers[0]
+        burned = int(last["to_address"] == ZERO_ADDRESS)
+        conn.execute(
+            "UPDATE tokens SET owner = ?, burned = ?, updated_block = ? WHERE token_id = ?",
+            (None if burned else last["to_address"], burned, last["block_number"], token_id),
+        )
+        price = conn.execute(
+            "SELECT hotel_room_value FROM prices WHERE token_id = ? ORDER BY block_number DESC, log_index DESC LIMIT 1",
+            (token_id,),
+        ).fetchone()
+        if price is None:
+            # No price updates left, so the value is the one stored at mint time
+            hotel_room_value = self.contract.functions.roomconfirmation(token_id).call(
+                block_identifier=last["block_number"]
+            )[4]
+        else:
+            hotel_room_value = price[0]
+        conn.execute("UPDATE tokens SET hotel_room_value = ? WHERE token_id = ?", (hotel_room_value, token_id))
+
+    # Event handling
+
+    def _prefetch_mints(self, transfers, to_block):
+        """Read the details of every token minted in a block range with batched calls."""
+        minted = [event["args"]["tokenId"] for event in transfers if event["args"]["from"] == ZERO_ADDRESS]
+        burned = {event["args"]["tokenId"] for event in transfers if event["args"]["to"] == ZERO_ADDRESS}
+        # tokenURI reverts for burned tokens, so those are read one by one at their mint block instead
+        token_ids = [token_id for token_id in minted if token_id not in burned]
+        if not token_ids:
+            return {}
+
+        functions = self.contract.functions
+        results = batch_call(
+            self.w3,
+            [functions.roomconfirmation(token_id) for token_id in token_ids]
+            + [functions.tokenURI(token_id) for token_id in token_ids],
+            block_identifier=to_block,
+        )
+        confirmations, token_uris = results[:len(token_ids)], results[len(token_ids):]
+        return {token_id: (confirmation, token_uri)
+                for token_id, confirmation, token_uri in zip(token_ids, confirmations, token_uris)}
+
+    def _apply_transfer(self, conn, event, prefetched=None):
+        token_id = event["args"]["tokenId"]
+        from_address = event["args"]["from"].lower()
+        to_address = event["args"]["to"].lower()
+        block_number = event["blockNumber"]
+        conn.execute(
+            "INSERT OR IGNORE INTO transfers (block_number, log_index, token_id, from_address, to_address, tx_hash)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (block_number, event["logIndex"], token_id, from_address, to_address, _hex(event["transactionHash"])),
+        )
+
+        if from_address == ZERO_ADDRESS:
+            # Newly minted: use the batched read, or read the reservation details as of the mint block
+            if prefetched and token_id in prefetched:
+                confirmation, token_uri = prefetched[token_id]
+            else:
+                confirmation = self.contract.functions.roomconfirmation(token_id).call(block_identifier=block_number)
+                token_uri = self.contract.functions.tokenURI(token_id).call(block_identifier=block_number)
+            conn.execute(
+                "INSERT OR REPLACE INTO tokens (token_id, owner, hotel_name, start_date, end_date, confirmation,"
+                " hotel_room_value, token_uri, burned, minted_block, updated_block)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (token_id, to_address, *decode_reservation(confirmation), token_uri, block_number, block_number),
+            )
+        elif to_address == ZERO_ADDRESS:
+            conn.execute(
+                "UPDATE tokens SET owner = NULL, burned = 1, updated_block = ? WHERE token_id = ?",
+                (block_number, token_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE tokens SET owner = ?, updated_block = ? WHERE token_id = ?",
+                (to_address, block_number, token_id),
+            )
+
+    def _apply_price(self, conn, event):
+        token_id = event["args"]["token_id"]
+        conn.execute(
+            "INSERT OR IGNORE INTO prices (block_number, log_index, token_id, hotel_room_value, report_uri, tx_hash)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (event["blockNumber"], event["logIndex"], token_id, event["args"]["hotelRoomValue"],
+             event["args"]["reportURI"], _hex(event["transactionHash"])),
+        )
+        conn.execute(
+            "UPDATE tokens SET hotel_room_value = ?, updated_block = ? WHERE token_id = ?",
+            (event["args"]["hotelRoomValue"], event["blockNumber"], token_id),
+        )
+
+    def sync_once(self):
+        """Index everything up to the current head; returns the number of events processed."""
+        fork_block = self._find_fork_point()
+        if fork_block is not None:
+            self._rollback(fork_block)
+
+        head = self.w3.eth.block_number - CONFIRMATIONS
+        cursor = self.store.cursor()
+        from_block = cursor[0] + 1 if cursor else self.start_block
+        processed = 0
+
+        while from_block <= head:
+            to_block = min(head, from_block + self.batch_blocks - 1)
+            transfers = self.contract.events.Transfer.getLogs(fromBlock=from_block, toBlock=to_block)
+            prices = self.contract.events.Price.getLogs(fromBlock=from_block, toBlock=to_block)
+            events = sorted(
+                [("transfer", event) for event in transfers] + [("price", event) for event in prices],
+                key=lambda item: (item[1]["blockNumber"], item[1]["logIndex"]),
+            )
+
+            # Later Price events in the range are applied on top, so reading at the end of the range is safe
+            prefetched = self._prefetch_mints(transfers, to_block)
+
+            conn = self.store.connection()
+            # Each block range is applied atomically together with the cursor that follows it
+            with conn:
+                for kind, event in events:
+                    if kind == "transfer":
+                        self._apply_transfer(conn, event, prefetched)
+                    else:
+                        self._apply_price(conn, event)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO blocks (block_number, block_hash) VALUES (?, ?)",
+                        (event["blockNumber"], _hex(event["blockHash"])),
+                    )
+                to_hash = self._block_hash(to_block)
+                conn.execute("INSERT OR REPLACE INTO blocks (block_number, block_hash) VALUES (?, ?)", (to_block, to_hash))
+                conn.execute(
+                    "INSERT OR REPLACE INTO cursor (id, block_number, block_hash) VALUES (0, ?, ?)", (to_block, to_hash)
+                )
+                # Only the recent blocks are needed to find a fork point
+                conn.execute("DELETE FROM blocks WHERE block_number < ?", (to_block - REORG_DEPTH * 4,))
+
+            processed += len(events)
+            from_block = to_block + 1
+
+        return processed
+
+    def run_forever(self, poll_interval=INDEXER_POLL_INTERVAL):
+        while True:
+            processed = self.sync_once()
+            if processed:
+                print(f"Indexed {processed} events up to block {self.store.cursor()[0]}")
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    from web3 import Web3
+
+    w3 = Web3(Web3.HTTPProvider(os.getenv("WEB3_PROVIDER_URI")))
+    with open(Path("./contracts/compiled/hotel_reservation_registry_abi.json")) as f:
+        contract_abi = json.load(f)
+    contract = w3.eth.contract(address=os.getenv("SMART_CONTRACT_ADDRESS"), abi=contract_abi)
+
+    ReservationIndexer(w3, contract).run_forever()
@@ -0,0 +1,38 @@
+# Shared fixtures for the test suite. Run from the project root with:  python -m pytest tests
+#
+# Tests that need a chain deploy HotelReservationRegistry on the in-process py-evm chain of
+# `benchmarks/local_chain.py` and are skipped when its requirements are not installed.
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "benchmarks"))
+
+
+@pytest.fixture
+def deploy():
+    """Deploy HotelReservationRegistry on a fresh local chain: `deploy(gas_limit=None)` returns (w3, contract)."""
+    pytest.importorskip("solcx")
+    pytest.importorskip("eth_tester")
+    from local_chain import LOCAL_BLOCK_GAS_LIMIT, OPENZEPPELIN_PATH, deploy_contract, local_web3, locked_provider
+
+    if not OPENZEPPELIN_PATH.exists():
+        pytest.skip("OpenZeppelin 2.5.0 is not installed (see benchmarks/local_chain.py)")
+
+    def deploy_registry(gas_limit=LOCAL_BLOCK_GAS_LIMIT):
+        w3 = local_web3(gas_limit)
+        contract = deploy_contract(w3)
+        # The transaction pipeline polls receipts from a background thread, and py-evm is not thread safe
+        return locked_provider(w3), contract
+
+    return deploy_registry
+
+
+@pytest.fixture
+def registry(deploy):
+    """(w3, contract) with HotelReservationRegistry deployed on a fresh local chain."""
+    return deploy()
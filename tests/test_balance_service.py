@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+pytest.importorskip("web3")
+
+import balance_service
+from balance_service import BalanceService
+
+
+class FakeChain:
+    def __init__(self):
+        self.block_number = 1
+        self.balances = {"0xbuyer": 100}
+
+    def get_balances(self, w3, addresses, block_identifier):
+        assert block_identifier == self.block_number
+        return [self.balances[address] for address in addresses]
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    chain = FakeChain()
+    monkeypatch.setattr(balance_service, "batch_get_balance", chain.get_balances)
+    return chain
+
+
+def test_balances_are_cached_within_a_block(chain):
+    service = BalanceService(SimpleNamespace(eth=chain), block_poll_interval=60)
+
+    assert service.get_balance("0xbuyer") == 100
+    chain.balances["0xbuyer"] = 50
+    assert service.get_balance("0xbuyer") == 100
+    assert service.stats()["round_trips"] == 1
+
+
+def test_invalidate_reads_the_payment_block(chain):
+    service = BalanceService(SimpleNamespace(eth=chain), block_poll_interval=60)
+    service.get_balance("0xbuyer")
+
+    # The payment is mined in the next block, well within the block poll interval
+    chain.block_number, chain.balances["0xbuyer"] = 2, 50
+    service.invalidate("0xbuyer")
+
+    assert service.get_balance("0xbuyer") == 50
@@ -0,0 +1,83 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+pytest.importorskip("web3")
+
+import batch_rpc
+from batch_rpc import BatchHTTPProvider, batch_call, batch_request
+
+
+class ShuffledNode:
+    """Stands in for the shared HTTP client: answers a JSON-RPC batch with the replies in reverse order."""
+
+    def __init__(self):
+        self.batches = []
+
+    def post(self, url, endpoint=None, json=None):
+        self.batches.append(json)
+        replies = [{"jsonrpc": "2.0", "id": call["id"], "result": f"{call['method']}:{call['params'][0]}"}
+                   for call in json]
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: list(reversed(replies)))
+
+
+class FakeBatchProvider:
+    def __init__(self, replies=None):
+        self.sizes = []
+        self.replies = replies
+
+    def make_batch_request(self, calls):
+        self.sizes.append(len(calls))
+        if self.replies is not None:
+            return self.replies
+        return [{"result": params[0]} for method, params in calls]
+
+
+def test_out_of_order_batch_replies_keep_call_order(monkeypatch):
+    node = ShuffledNode()
+    monkeypatch.setattr(batch_rpc, "http", node)
+    provider = BatchHTTPProvider("http://node.invalid")
+
+    calls = [("eth_getBalance", [f"0x{i:040x}", "latest"]) for i in range(5)]
+    replies = provider.make_batch_request(calls)
+
+    assert len(node.batches) == 1
+    assert [reply["result"] for reply in replies] == [f"eth_getBalance:0x{i:040x}" for i in range(5)]
+
+
+def test_batch_request_splits_into_batches():
+    provider = FakeBatchProvider()
+    w3 = SimpleNamespace(provider=provider)
+
+    assert batch_request(w3, [("eth_call", [i]) for i in range(250)], batch_size=100) == list(range(250))
+    assert provider.sizes == [100, 100, 50]
+
+
+def test_batch_request_raises_on_error_reply():
+    w3 = SimpleNamespace(provider=FakeBatchProvider([{"result": "0x1"}, {"error": {"message": "execution reverted"}}]))
+
+    with pytest.raises(ValueError, match="execution reverted"):
+        batch_request(w3, [("eth_call", [0]), ("eth_call", [1])])
+
+
+def test_batch_call_matches_single_calls(registry):
+    w3, contract = registry
+    from reservation_codec import decode_reservation, encode_reservation
+
+    owner = w3.eth.accounts[1]
+    confirmations = [str(uuid.uuid4()) for _ in range(3)]
+    encoded = [encode_reservation("Hotel", "2022-09-01", "2022-09-03", confirmation, 100)
+               for confirmation in confirmations]
+    columns = [list(column) for column in zip(*encoded)]
+    tx_hash = contract.functions.registerHotelReservations([owner] * 3, *columns, ["ipfs://test"] * 3).transact(
+        {"from": w3.eth.accounts[0]})
+    w3.eth.wait_for_transaction_receipt(tx_hash)
+
+    token_ids = batch_call(w3, [contract.functions.tokenOfOwnerByIndex(owner, i) for i in range(3)])
+    bookings = batch_call(w3, [contract.functions.roomconfirmation(token_id) for token_id in token_ids])
+
+    assert token_ids == [contract.functions.tokenOfOwnerByIndex(owner, i).call() for i in range(3)]
+    assert [decode_reservation(booking)[3] for booking in bookings] == confirmations
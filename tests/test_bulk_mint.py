@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+pytest.importorskip("web3")
+
+from bulk_mint import BulkMinter, Reservation, gas_report
+from reservation_codec import decode_reservation
+
+ZERO_ADDRESS = "0x" + "00" * 20
+
+
+def make_reservations(owners, count):
+    return [
+        Reservation(owner=owners[i % len(owners)], hotel_name=f"Hotel {i}", start_date="2022-09-01",
+                    end_date="2022-09-03", confirmation=str(uuid.uuid4()), hotel_room_value=100 + i)
+        for i in range(count)
+    ]
+
+
+def stored_confirmation(contract, token_id):
+    return decode_reservation(contract.functions.roomconfirmation(token_id).call())[3]
+
+
+def test_token_ids_follow_input_order_across_chunks(registry):
+    w3, contract = registry
+    reservations = make_reservations(w3.eth.accounts[1:], 7)
+
+    results = BulkMinter(w3, contract, w3.eth.accounts[0], max_chunk=3).mint(reservations, pin_metadata=False)
+
+    assert [result.index for result in results] == list(range(7))
+    assert len({result.tx_hash for result in results}) == 3
+    for result, reservation in zip(results, reservations):
+        assert result.error is None
+        assert stored_confirmation(contract, result.token_id) == reservation.confirmation
+
+
+def test_reverted_chunk_is_reported_without_losing_the_others(registry):
+    w3, contract = registry
+    reservations = make_reservations(w3.eth.accounts[1:], 6)
+    # Minting to the zero address reverts, so the middle chunk fails
+    reservations[2].owner = reservations[3].owner = ZERO_ADDRESS
+    minter = BulkMinter(w3, contract, w3.eth.accounts[0])
+    minter.plan_chunks = lambda chunk: [(reservations[0:2], 3_000_000), (reservations[2:4], 3_000_000),
+                                        (reservations[4:6], 3_000_000)]
+
+    results = minter.mint(reservations, pin_metadata=False)
+
+    assert [result.index for result in results] == list(range(6))
+    assert [result.token_id is None for result in results] == [False, False, True, True, False, False]
+    assert all(result.error for result in results[2:4])
+    for result, reservation in zip(results[:2] + results[4:], reservations[:2] + reservations[4:]):
+        assert stored_confirmation(contract, result.token_id) == reservation.confirmation
+    assert gas_report(results)["failed"] == 2
+
+
+def test_chunks_over_the_block_gas_limit_are_halved(deploy):
+    # Each long token URI costs roughly 3M gas of storage, so four of them no longer fit a 10M gas block and the
+    # node fails the estimate instead of returning a number
+    w3, contract = deploy(gas_limit=10_000_000)
+    reservations = make_reservations(w3.eth.accounts[1:], 12)
+    for reservation in reservations[4:]:
+        reservation.token_uri = "ipfs://" + "x" * 5000
+    minter = BulkMinter(w3, contract, w3.eth.accounts[0], max_chunk=8)
+    minter.assign_token_uris(reservations, pin_metadata=False)
+
+    chunks = minter.plan_chunks(reservations)
+
+    assert [reservation for chunk, gas in chunks for reservation in chunk] == reservations
+    assert max(len(chunk) for chunk, gas in chunks if chunk[-1].token_uri.startswith("ipfs://xxx")) <= 2
+    results = minter.mint(reservations, pin_metadata=False)
+    assert [result.index for result in results] == list(range(12))
+    for result, reservation in zip(results, reservations):
+        assert result.error is None
+        assert stored_confirmation(contract, result.token_id) == reservation.confirmation
@@ -0,0 +1,121 @@
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from fx_quotes import FixtureSource, QuoteService
+
+
+class CountingSource:
+    """Returns 1000, 1001, ... and can hold a fetch until released."""
+
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.fetched = threading.Event()
+        self.fail = False
+
+    def fetch(self, base, quote):
+        self.release.wait(5)
+        self.calls += 1
+        self.fetched.set()
+        if self.fail:
+            raise ConnectionError("source is down")
+        return 1000.0 + self.calls - 1
+
+
+def age(service, seconds, base="ETH", quote="USD"):
+    service._quotes[(base, quote)].fetched_at -= seconds
+
+
+def wait_for_refresh(service, pair=("ETH", "USD")):
+    for _ in range(500):
+        with service._lock:
+            if pair not in service._refreshing:
+                return
+        threading.Event().wait(0.01)
+    raise AssertionError("background refresh did not finish")
+
+
+def test_fresh_quote_is_served_from_cache():
+    source = CountingSource()
+    service = QuoteService(source, ttl=60, max_stale=3600)
+
+    assert service.rate() == 1000.0
+    assert service.rate("eth", "usd") == 1000.0
+    assert source.calls == 1
+
+
+def test_stale_quote_is_served_while_refreshing():
+    source = CountingSource()
+    service = QuoteService(source, ttl=60, max_stale=3600)
+    service.rate()
+    age(service, 120)
+
+    source.release.clear()
+    source.fetched.clear()
+    # Every lookup gets the stale rate at once, and only one refresh is started
+    assert [service.rate() for _ in range(5)] == [1000.0] * 5
+    assert service._refreshing == {("ETH", "USD")}
+
+    source.release.set()
+    assert source.fetched.wait(5)
+    wait_for_refresh(service)
+    assert source.calls == 2
+    assert service.rate() == 1001.0
+
+
+def test_failed_refresh_keeps_the_stale_quote():
+    source = CountingSource()
+    service = QuoteService(source, ttl=60, max_stale=3600)
+    service.rate()
+    age(service, 120)
+
+    source.fail = True
+    assert service.rate() == 1000.0
+    wait_for_refresh(service)
+    assert service.rate() == 1000.0
+
+
+def test_quote_older_than_max_stale_is_fetched_synchronously():
+    source = CountingSource()
+    service = QuoteService(source, ttl=60, max_stale=3600)
+    service.rate()
+    age(service, 7200)
+
+    assert service.rate() == 1001.0
+    assert not service._refreshing
+
+
+def test_fixture_source_and_conversions(tmp_path):
+    path = tmp_path / "rates.json"
+    path.write_text(json.dumps({"eth/usd": 2000}))
+    service = QuoteService(FixtureSource(path=str(path)))
+
+    quote = service.get_quote()
+    assert (quote.rate, quote.source) == (2000.0, "fixture")
+    assert service.eth_to_usd(1.5) == 3000.0
+    assert service.usd_to_eth(500) == 0.25
+    assert FixtureSource({"ETH/USD": 1234}).fetch("eth", "usd") == 1234.0
+
+
+def test_cold_failure_is_not_retried_during_the_backoff():
+    source = CountingSource()
+    source.fail = True
+    service = QuoteService(source, failure_backoff=60)
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            service.rate()
+    assert source.calls == 1
+
+    # Once the backoff has passed, the next lookup tries the source again
+    service._failures[("ETH", "USD")] = (ConnectionError("source is down"), 0)
+    source.fail = False
+    assert service.rate() == 1001.0
+    assert source.calls == 2
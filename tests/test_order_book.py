@@ -0,0 +1,173 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("pandas")
+pytest.importorskip("requests")
+pytest.importorskip("web3")
+
+import order_book
+from listing_store import ListingStore
+from order_book import Matcher, OrderBook
+
+STAY = ("1 Hotel Toronto", "2022-09-01", "2022-09-03")
+SELLER = "0xseller"
+
+
+class TxHash(str):
+    def hex(self):
+        return str(self)
+
+
+class FakeBalances:
+    def __init__(self, balance):
+        self.balance = balance
+
+    def get_balance(self, address):
+        return self.balance
+
+    def invalidate(self, address=None):
+        pass
+
+
+class FakePipeline:
+    """Mines every payment at once with the given status."""
+
+    def __init__(self, status=1):
+        self.status = status
+        self.payments = []
+
+    def submit_payment(self, account, to, amount_ether):
+        self.payments.append((account.address, to, amount_ether))
+        receipt = {"status": self.status, "transactionHash": TxHash(f"0xpay{len(self.payments)}")}
+        return SimpleNamespace(receipt=lambda: receipt)
+
+
+class FakeContract:
+    def __init__(self, status=1):
+        self.transfers = []
+        eth = SimpleNamespace(wait_for_transaction_receipt=lambda tx_hash: {"status": status})
+        self.web3 = SimpleNamespace(eth=eth)
+        self.functions = SimpleNamespace(transferFrom=self._transfer_from)
+
+    def _transfer_from(self, seller, buyer, token_id):
+        def transact(params):
+            self.transfers.append((seller, buyer, token_id))
+            return TxHash(f"0xtransfer{token_id}")
+        return SimpleNamespace(transact=transact)
+
+
+def listing(store, token_id, price_eth, listed_at):
+    store.add_listing(token_id, *STAY, f"conf-{token_id}", 100, price_eth, SELLER, listed_at=listed_at)
+    return store.get_listing(token_id)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ListingStore(tmp_path / "listings.sqlite3")
+
+
+@pytest.fixture
+def market(store, monkeypatch):
+    """(matcher, book, pipeline) over a loaded book, with a buyer who can pay 10 ETH."""
+    pipeline = FakePipeline()
+    monkeypatch.setattr(order_book, "get_balance_service", lambda w3: FakeBalances(10 * 10 ** 18))
+    monkeypatch.setattr(order_book, "get_pipeline", lambda w3: pipeline)
+    listing(store, 1, 0.5, listed_at=100)
+    listing(store, 2, 0.3, listed_at=200)
+    book = OrderBook()
+    book.load(store)
+    w3_wallet = SimpleNamespace(toWei=lambda amount, unit: int(amount * 10 ** 18))
+    return Matcher(book, store, FakeContract(), w3_wallet), book, pipeline
+
+
+BUYER = SimpleNamespace(address="0xbuyer")
+
+
+def test_price_time_priority(store):
+    book = OrderBook()
+    book.add_ask(listing(store, 1, 0.5, listed_at=100))
+    book.add_ask(listing(store, 2, 0.3, listed_at=300))
+    book.add_ask(listing(store, 3, 0.3, listed_at=200))
+
+    # Cheapest first, earlier listing wins a tie
+    assert book.best_ask(*STAY).token_id == 3
+    book.cancel_ask(3)
+    assert book.best_ask(*STAY).token_id == 2
+    book.cancel_ask(2)
+    assert book.best_ask(*STAY).token_id == 1
+
+    book.add_bid(BUYER, *STAY, 0.2, placed_at=100)
+    high = book.add_bid(BUYER, *STAY, 0.4, placed_at=200)
+    book.add_bid(BUYER, *STAY, 0.4, placed_at=300)
+    assert book.best_bid(*STAY) is high
+
+
+def test_refresh_drops_listings_removed_elsewhere(store):
+    book = OrderBook()
+    listing(store, 1, 0.5, listed_at=100)
+    listing(store, 2, 0.3, listed_at=200)
+    book.load(store)
+
+    # Another process sells token 2 and the expiry scheduler delists token 1
+    store.remove_listing(2)
+    store.remove_listings([1])
+    book.refresh(store)
+
+    assert book.get_ask(1) is None and book.get_ask(2) is None
+    assert book.hotels() == [] and book.stays(STAY[0]) == []
+
+    # Listed again after the removal, so it is back
+    listing(store, 2, 0.4, listed_at=300)
+    book.refresh(store)
+    assert book.best_ask(*STAY).price_eth == 0.4
+
+
+def test_buy_settles_the_cheapest_listing(market, store):
+    matcher, book, pipeline = market
+
+    trade = matcher.buy(BUYER, *STAY, max_price_eth=1)
+
+    assert (trade.token_id, trade.price_eth) == (2, 0.3)
+    assert pipeline.payments == [("0xbuyer", SELLER, 0.3)]
+    assert matcher.contract.transfers == [(SELLER, "0xbuyer", 2)]
+    assert store.get_listing(2) is None and book.get_ask(2) is None
+    [settlement] = store.settlements()
+    assert (settlement["token_id"], settlement["status"], settlement["transfer_tx"]) == (2, "settled", "0xtransfer2")
+
+
+def test_failed_payment_restores_the_listing(market, store):
+    matcher, book, pipeline = market
+    pipeline.status = 0
+
+    with pytest.raises(RuntimeError, match="reverted"):
+        matcher.buy(BUYER, *STAY, max_price_eth=1)
+
+    restored = store.get_listing(2)
+    assert (restored["price_eth"], restored["listed_at"]) == (0.3, 200)
+    assert book.best_ask(*STAY).token_id == 2
+    assert matcher.contract.transfers == [] and store.settlements() == []
+
+
+def test_buyer_who_cannot_pay_claims_nothing(market, store, monkeypatch):
+    matcher, book, pipeline = market
+    monkeypatch.setattr(order_book, "get_balance_service", lambda w3: FakeBalances(10 ** 17))
+
+    with pytest.raises(ValueError):
+        matcher.buy(BUYER, *STAY, max_price_eth=1)
+
+    assert store.get_listing(2) is not None and book.best_ask(*STAY).token_id == 2
+    assert pipeline.payments == []
+
+
+def test_paid_but_not_transferred_is_recorded(market, store):
+    matcher, book, pipeline = market
+    matcher.contract = FakeContract(status=0)
+
+    with pytest.raises(RuntimeError, match="not transferred"):
+        matcher.buy(BUYER, *STAY, max_price_eth=1)
+
+    [settlement] = store.settlements("paid_not_transferred")
+    assert (settlement["token_id"], settlement["payment_tx"]) == (2, "0xpay1")
+    assert store.get_listing(2) is None
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("requests")
+
+import pin_cache
+from pin_cache import BatchPinner, PinIndex, compute_cid, serialize_json
+
+
+def test_cid_matches_ipfs():
+    # Hashes IPFS gives these files when added as CIDv1 with raw leaves (`ipfs add --cid-version 1`)
+    assert compute_cid(b"") == "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku"
+    assert compute_cid(b"hello world") == "bafkreifzjut3te2nhyekklss27nh3k72ysco7y32koao5eei66wof36n5e"
+
+
+def test_content_over_one_block_has_no_local_cid():
+    assert compute_cid(b"x" * (pin_cache.MAX_SINGLE_BLOCK_SIZE + 1)) is None
+
+
+def test_mismatched_pin_is_recorded_and_stops_trusting_local_cids(tmp_path, monkeypatch):
+    monkeypatch.setattr(pin_cache, "pin_file_to_ipfs", lambda data, name=None, options=None: "QmSomethingElse")
+    pinner = BatchPinner(PinIndex(tmp_path / "pins.sqlite3"))
+    assert pinner.local_cids_trusted()
+
+    cid, future = pinner.submit(serialize_json({"name": "1 Hotel Toronto"}))
+    assert future.result() == "QmSomethingElse"
+
+    assert pinner.index.mismatches() == [(cid, "QmSomethingElse")]
+    assert not pinner.local_cids_trusted()
+    # Another process opening the same index does not trust local CIDs either
+    assert not BatchPinner(PinIndex(tmp_path / "pins.sqlite3")).local_cids_trusted()
+    pinner.shutdown()
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from price_history import PriceHistory
+
+
+class FakeReservationStore:
+    def __init__(self, count):
+        self.events = [
+            {"hotel_name": "1 Hotel Toronto", "start_date": "2022-09-01", "hotel_room_value": 100 + i,
+             "block_number": i, "log_index": 0}
+            for i in range(count)
+        ]
+
+    def price_events_after(self, block_number, log_index):
+        return [event for event in self.events if (event["block_number"], event["log_index"]) > (block_number, log_index)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "price_history.sqlite3"
+
+
+def test_ingested_events_are_stored_with_the_cursor(path):
+    history = PriceHistory(path, flush_interval=0)
+    reservations = FakeReservationStore(5)
+
+    assert history.ingest_price_events(reservations) == 5
+    assert history.ingest_price_events(reservations) == 0
+
+    # Nothing is left to flush, so a process killed now has lost nothing
+    reopened = PriceHistory(path, flush_interval=0)
+    assert reopened.stats("1 Hotel Toronto")["count"] == 5
+    assert len(reopened.history("1 Hotel Toronto", "2022-09-01")["price"]) == 5
+    assert reopened.ingest_price_events(reservations) == 0
+
+
+def test_statistics_flushed_by_another_process_are_seen(path):
+    reader, writer = PriceHistory(path, flush_interval=0), PriceHistory(path, flush_interval=0)
+    assert reader.stats("1 Hotel Toronto")["count"] == 0
+
+    writer.record_many([("1 Hotel Toronto", "2022-09-01", 120, 0, None), ("1 Hotel Toronto", "2022-09-02", 140, 0, None)])
+    writer.flush()
+    reader.record("1 Hotel Toronto", "2022-09-01", 100)
+
+    # Stored points from the other process plus this process's unflushed one
+    assert reader.stats("1 Hotel Toronto")["count"] == 3
+    assert reader.stats("1 Hotel Toronto", "2022-09-01")["count"] == 2
@@ -0,0 +1,271 @@
+# Transaction Pipeline
+################################################################################
+
+# This file lets many payments and mints be in flight at once.
+# Nonces are allocated locally per account instead of asking the node before every send, gas estimates are
+# cached per transaction shape, and receipts are tracked by one background thread that polls every pending
+# transaction in a single batched request. Callers get a future they can wait on, await, or attach callbacks to.
+
+################################################################################
+# Imports
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from batch_rpc import batch_request
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Configuration
+
+RECEIPT_POLL_INTERVAL = float(os.getenv("RECEIPT_POLL_INTERVAL", 0.5))
+RECEIPT_TIMEOUT = float(os.getenv("RECEIPT_TIMEOUT", 120))
+SUBMIT_WORKERS = int(os.getenv("SUBMIT_WORKERS", 8))
+GAS_CACHE_SIZE = 256
+# Headroom on contract call estimates: calls of the same shape can touch different storage
+GAS_MARGIN = float(os.getenv("GAS_MARGIN", 1.2))
+
+# A plain Ether transfer to an account without code always costs this much gas
+TRANSFER_GAS = 21000
+
+################################################################################
+# Nonce allocation
+
+class NonceManager:
+    """Hands out consecutive nonces per account without a node round trip for each one.
+
+    Each account's nonces are allocated, signed and sent one at a time under that account's lock, so they reach
+    the node in order and a failed send never leaves a later nonce outstanding.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._next = {}
+        self._account_locks = {}
+        self._lock = threading.Lock()
+
+    def _account_lock(self, address):
+        with self._lock:
+            return self._account_locks.setdefault(address, threading.Lock())
+
+    @contextmanager
+    def reserve(self, address):
+        """Hold the account's next nonce while the transaction using it is signed and sent."""
+        with self._account_lock(address):
+            if address not in self._next:
+                # Counting pending transactions keeps us clear of anything already in the mempool
+                self._next[address] = self.w3.eth.get_transaction_count(address, "pending")
+            nonce = self._next[address]
+            try:
+                yield nonce
+            except Exception:
+                # Nothing later was handed out, so the next reservation can safely re-read the count from the chain
+                self._next.pop(address, None)
+                raise
+            self._next[address] = nonce + 1
+
+################################################################################
+# Gas estimates
+
+class GasEstimateCache:
+    """Caches gas estimates by transaction shape: sender, recipient and function selector.
+
+    Contract calls get GAS_MARGIN headroom, since a cached estimate may be reused for calldata that costs more.
+    """
+
+    def __init__(self, w3, max_entries=GAS_CACHE_SIZE):
+        self.w3 = w3
+        self.max_entries = max_entries
+        self._estimates = OrderedDict()
+        self._plain_accounts = set()
+        self._lock = threading.Lock()
+
+    def estimate(self, tx):
+        data = tx.get("data") or "0x"
+        if isinstance(data, bytes):
+            data = "0x" + data.hex()
+
+        # Transfers to an address without code are always the same price
+        if data == "0x" and tx.get("to") in self._plain_accounts:
+            return TRANSFER_GAS
+
+        shape = (tx.get("from"), tx.get("to"), data[:10], len(data))
+        with self._lock:
+            if shape in self._estimates:
+                self._estimates.move_to_end(shape)
+                return self._estimates[shape]
+
+        estimate = self.w3.eth.estimate_gas(tx)
+        if data == "0x" and estimate == TRANSFER_GAS:
+            self._plain_accounts.add(tx.get("to"))
+        elif data != "0x":
+            estimate = int(estimate * GAS_MARGIN)
+
+        with self._lock:
+            self._estimates[shape] = estimate
+            while len(self._estimates) > self.max_entries:
+                self._estimates.popitem(last=False)
+        return estimate
+
+################################################################################
+# Receipt tracking
+
+class ReceiptTracker:
+    """Background thread that resolves transaction futures once their receipts are mined."""
+
+    def __init__(self, w3, poll_interval=RECEIPT_POLL_INTERVAL, timeout=RECEIPT_TIMEOUT):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def track(self, tx_hash, future=None):
+        future = future or Future()
+        tx_hash = tx_hash.hex() if hasattr(tx_hash, "hex") and not isinstance(tx_hash, str) else tx_hash
+        with self._lock:
+            self._pending[tx_hash] = (future, time.monotonic())
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return future
+
+    def _run(self):
+        while True:
+            with self._lock:
+                pending = dict(self._pending)
+            if not pending:
+                self._wakeup.wait(self.poll_interval * 10)
+                self._wakeup.clear()
+                continue
+
+            hashes = list(pending)
+            try:
+                # One round trip for every transaction still waiting on a receipt
+                receipts = batch_request(self.w3, [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in hashes])
+            except Exception:
+                receipts = [None] * len(hashes)
+
+            now = time.monotonic()
+            for tx_hash, receipt in zip(hashes, receipts):
+                future, submitted_at = pending[tx_hash]
+                if receipt is not None:
+                    self._resolve(tx_hash, future)
+                elif now - submitted_at > self.timeout:
+                    self._finish(tx_hash)
+                    future.set_exception(TimeoutError(f"Transaction {tx_hash} was not mined within {self.timeout}s"))
+            time.sleep(self.poll_interval)
+
+    def _resolve(self, tx_hash, future):
+        self._finish(tx_hash)
+        try:
+            # Fetched through web3 once, so callers get the usual formatted receipt
+            future.set_result(self.w3.eth.get_transaction_receipt(tx_hash))
+        except Exception as error:
+            future.set_exception(error)
+
+    def _finish(self, tx_hash):
+        with self._lock:
+            self._pending.pop(tx_hash, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._pending)
+
+################################################################################
+# Pipeline
+
+class PendingTransaction:
+    """Handle to a submitted transaction: its hash once sent, and its receipt once mined."""
+
+    def __init__(self):
+        self.sent = Future()
+        self.mined = Future()
+
+    @property
+    def tx_hash(self):
+        """Block until the transaction has been sent and return its hash."""
+        return self.sent.result()
+
+    def receipt(self, timeout=None):
+        return self.mined.result(timeout)
+
+    def add_done_callback(self, callback):
+        """`callback(future)` runs once the receipt (or an error) is available."""
+        self.mined.add_done_callback(callback)
+
+    def __await__(self):
+        return asyncio.wrap_future(self.mined).__await__()
+
+
+class TransactionPipeline:
+    """Signs, sends and tracks transactions concurrently for one web3 connection."""
+
+    def __init__(self, w3, max_workers=SUBMIT_WORKERS):
+        self.w3 = w3
+        self.nonces = NonceManager(w3)
+        self.gas = GasEstimateCache(w3)
+        self.receipts = ReceiptTracker(w3)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tx-submit")
+
+    def _chain(self, pending, send):
+        def run():
+            try:
+                tx_hash = send()
+            except Exception as error:
+                pending.sent.set_exception(error)
+                pending.mined.set_exception(error)
+                return
+            pending.sent.set_result(tx_hash)
+            self.receipts.track(tx_hash, pending.mined)
+        self._executor.submit(run)
+        return pending
+
+    def sign_and_send(self, account, tx):
+        """Fill in nonce and gas, sign locally and send; returns the transaction hash."""
+        tx = dict(tx)
+        tx.setdefault("from", account.address)
+        tx.setdefault("gasPrice", 0)
+        if "gas" not in tx:
+            tx["gas"] = self.gas.estimate({key: tx[key] for key in ("from", "to", "value", "data") if key in tx})
+        with self.nonces.reserve(account.address) as nonce:
+            tx["nonce"] = nonce
+            signed_tx = account.signTransaction(tx)
+            return self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+
+    def submit(self, account, tx):
+        """Send a locally signed transaction without blocking; returns a `PendingTransaction`."""
+        return self._chain(PendingTransaction(), lambda: self.sign_and_send(account, tx))
+
+    def submit_payment(self, account, to, amount_ether):
+        return self.submit(account, {"to": to, "value": self.w3.toWei(amount_ether, "ether")})
+
+    def submit_transact(self, contract_function, tx_params):
+        """Send a contract transaction from a node-managed account without blocking."""
+        return self._chain(PendingTransaction(), lambda: contract_function.transact(tx_params))
+
+    def track(self, tx_hash):
+        """Track a transaction that was sent elsewhere."""
+        pending = PendingTransaction()
+        pending.sent.set_result(tx_hash)
+        self.receipts.track(tx_hash, pending.mined)
+        return pending
+
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(w3):
+    """Return the shared pipeline for a web3 instance, so every caller shares its nonce counters."""
+    with _pipelines_lock:
+        if id(w3) not in _pipelines:
+            _pipelines[id(w3)] = TransactionPipeline(w3)
+        return _pipelines[id(w3)]
@@ -0,0 +1,87 @@
+# Wallet Keyring
+################################################################################
+
+# This file derives Ethereum accounts from the MNEMONIC seed phrase once per process and keeps them in memory.
+# Every Streamlit session and worker thread shares the same keyring, so a rerun looks an account up instead of
+# repeating the full BIP44 derivation.
+
+################################################################################
+# Imports
+import os
+import hashlib
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+################################################################################
+# Keyring
+
+class Keyring:
+    """Thread-safe cache of accounts derived from one mnemonic, by BIP44 address index and by address."""
+
+    def __init__(self, mnemonic):
+        if not mnemonic:
+            raise ValueError("A mnemonic seed phrase is required to derive accounts")
+        self._mnemonic = mnemonic
+        self._wallet = None
+        self._by_index = {}
+        self._by_address = {}
+        self._lock = threading.RLock()
+
+    def _get_wallet(self):
+        # Deferred so that importing this module does not pull in bip44
+        if self._wallet is None:
+            from bip44 import Wallet
+            self._wallet = Wallet(self._mnemonic)
+        return self._wallet
+
+    def account(self, index=0):
+        """Return the account at m/44'/60'/0'/0/index, deriving it only the first time."""
+        account = self._by_index.get(index)
+        if account is not None:
+            return account
+
+        with self._lock:
+            account = self._by_index.get(index)
+            if account is None:
+                from web3 import Account
+
+                # Derive Ethereum Private Key
+                private, public = self._get_wallet().derive_account("eth", address_index=index)
+
+                # Convert private key into an Ethereum account
+                account = Account.privateKeyToAccount(private)
+                self._by_index[index] = account
+                self._by_address[account.address.lower()] = account
+        return account
+
+    def derive_many(self, count, start=0):
+        """Derive (or fetch) `count` consecutive accounts starting at `start` and return them in order."""
+        with self._lock:
+            return [self.account(index) for index in range(start, start + count)]
+
+    def by_address(self, address):
+        """Return a previously derived account for this address, or None."""
+        return self._by_address.get(address.lower())
+
+    def addresses(self):
+        with self._lock:
+            return [self._by_index[index].address for index in sorted(self._by_index)]
+
+    def __len__(self):
+        return len(self._by_index)
+
+
+_keyrings = {}
+_keyrings_lock = threading.Lock()
+
+
+def get_keyring(mnemonic=None):
+    """Return the process-wide keyring for a mnemonic (MNEMONIC from the environment by default)."""
+    mnemonic = mnemonic or os.getenv("MNEMONIC")
+    # Keyed by a digest so the seed phrase itself is not used as a dictionary key
+    key = hashlib.sha256((mnemonic or "").encode("utf-8")).hexdigest()
+    with _keyrings_lock:
+        if key not in _keyrings:
+            _keyrings[key] = Keyring(mnemonic)
+        return _keyrings[key]